@@ -33,8 +33,8 @@ class RegisterView(CreateView):
         context = super().get_context_data(**kwargs)
         # Handle cities - don't break if City model isn't available
         try:
-            from trainers.models import City
-            context['cities'] = City.objects.all()
+            from trainers.reference import ReferenceData
+            context['cities'] = ReferenceData.cities()
         except Exception as e:
             logger.warning(f"Could not load City objects: {e}")
             context['cities'] = []
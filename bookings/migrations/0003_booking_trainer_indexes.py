@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_commission_amount_booking_commission_rate_and_more'),
+        ('payments', '0002_subscriptionplan_paymentgatewayconfig_secret_key_and_more'),
+        ('trainers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['trainer', 'status', 'booking_date'], name='booking_trainer_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['trainer', 'status', 'updated_at'], name='booking_trainer_status_upd'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['trainer', 'created_at'], name='booking_trainer_created'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_booking_trainer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='active_slot',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(status='cancelled', then=models.Value(None)), default=models.Value(1), output_field=models.SmallIntegerField(null=True)), output_field=models.SmallIntegerField(null=True)),
+        ),
+        # The new unique index leads with (trainer, ...), so the FK keeps an index throughout
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('trainer', 'booking_date', 'start_time', 'active_slot'), name='booking_trainer_active_slot'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='booking',
+            unique_together=set(),
+        ),
+    ]
@@ -27,6 +27,16 @@ class Booking(models.Model):
     notes = models.TextField(blank=True)
     cancelled_by = models.CharField(max_length=20, choices=[('client', 'عميل'), ('trainer', 'مدرب')], blank=True)
     cancelled_reason = models.TextField(blank=True)
+    # 1 while the booking holds its slot, NULL once cancelled; NULLs never collide in a unique index
+    active_slot = models.GeneratedField(
+        expression=models.Case(
+            models.When(status='cancelled', then=models.Value(None)),
+            default=models.Value(1),
+            output_field=models.SmallIntegerField(null=True),
+        ),
+        output_field=models.SmallIntegerField(null=True),
+        db_persist=True,
+    )
     
     # Commission tracking
     commission_rate = models.DecimalField(max_digits=5, decimal_places=2, default=20)  # Percentage (20 = 20%)
@@ -43,7 +53,19 @@ class Booking(models.Model):
         verbose_name = 'الحجز'
         verbose_name_plural = 'الحجوزات'
         ordering = ['-booking_date']
-        unique_together = ('trainer', 'booking_date', 'start_time')
+        constraints = [
+            # Cancelled bookings free their start time for a new booking. A plain unique
+            # index over the generated column, so MySQL enforces it too.
+            models.UniqueConstraint(
+                fields=['trainer', 'booking_date', 'start_time', 'active_slot'],
+                name='booking_trainer_active_slot',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['trainer', 'status', 'booking_date'], name='booking_trainer_status_date'),
+            models.Index(fields=['trainer', 'status', 'updated_at'], name='booking_trainer_status_upd'),
+            models.Index(fields=['trainer', 'created_at'], name='booking_trainer_created'),
+        ]
     
     def __str__(self):
         return f"{self.client.get_full_name()} مع {self.trainer.user.get_full_name()}"
@@ -0,0 +1,329 @@
+"""
+Booking aggregation services
+"""
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from django.utils import timezone
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, Case, When, Value, FloatField, OuterRef, Subquery
+from django.db.models.functions import TruncMonth, Cast
+from django.dispatch import Signal
+from dashboard.models import TrainerDailyStats
+from trainers.models import Trainer, TrainerRatingHistogram, TrainerSearchIndex
+from trainers.services import TrainerFacetService
+from .models import Booking, Review
+
+# Sent by RatingService once Trainer.rating has moved (inside its transaction)
+ratings_changed = Signal()
+
+
+class BookingStatusService:
+    """Service for per-status booking counters"""
+
+    @staticmethod
+    def get_status_counts(trainer):
+        """Booking count for every status of a trainer in one GROUP BY query"""
+        counts = {status: 0 for status, _ in Booking.BOOKING_STATUSES}
+        rows = Booking.objects.filter(trainer=trainer).values('status').annotate(
+            total=Count('id')
+        ).order_by()
+        for row in rows:
+            counts[row['status']] = row['total']
+        return counts
+
+
+class EarningsService:
+    """Service for computing trainer earnings figures in grouped queries"""
+
+    @staticmethod
+    def booking_total_aggregates():
+        """Aggregate expressions shared by the plain and grouped booking totals"""
+        return {
+            'total_bookings': Count('id'),
+            'total_revenue': Sum('total_price'),
+            'total_earnings': Sum('trainer_earnings'),
+            'total_commission': Sum('commission_amount'),
+        }
+
+    @staticmethod
+    def get_booking_totals(bookings):
+        """Count, revenue, trainer earnings and commission for a queryset in one aggregate"""
+        totals = bookings.aggregate(**EarningsService.booking_total_aggregates())
+        for key in ('total_revenue', 'total_earnings', 'total_commission'):
+            totals[key] = totals[key] or Decimal('0')
+        return totals
+
+    @staticmethod
+    def get_trainer_stats(trainer, today=None):
+        """Total, 30-day and 7-day earnings and session counts for a trainer in one query
+
+        Reads the TrainerDailyStats rollup, so the cost grows with active days
+        rather than lifetime bookings.
+        """
+        today = today or timezone.now().date()
+        last_month = Q(date__gte=today - timedelta(days=30))
+        last_week = Q(date__gte=today - timedelta(days=7))
+
+        stats = TrainerDailyStats.objects.filter(trainer=trainer).aggregate(
+            total_earnings=Sum('revenue'),
+            monthly_earnings=Sum('revenue', filter=last_month),
+            weekly_earnings=Sum('revenue', filter=last_week),
+            total_sessions=Sum('sessions'),
+            monthly_sessions=Sum('sessions', filter=last_month),
+        )
+        for key in ('total_earnings', 'monthly_earnings', 'weekly_earnings'):
+            stats[key] = stats[key] or Decimal('0')
+        for key in ('total_sessions', 'monthly_sessions'):
+            stats[key] = stats[key] or 0
+        return stats
+
+    @staticmethod
+    def get_monthly_breakdown(trainer, months=6, today=None):
+        """Completed earnings and sessions per calendar month, oldest first, in one grouped query"""
+        today = today or timezone.now().date()
+
+        # First day of each month in the window, oldest first
+        month_starts = []
+        year, month = today.year, today.month
+        for _ in range(months):
+            month_starts.append(date(year, month, 1))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        month_starts.reverse()
+
+        rows = TrainerDailyStats.objects.filter(
+            trainer=trainer,
+            date__gte=month_starts[0]
+        ).annotate(
+            month=TruncMonth('date')
+        ).values('month').annotate(
+            earnings=Sum('revenue'),
+            sessions=Sum('sessions')
+        ).order_by('month')
+
+        by_month = {(row['month'].year, row['month'].month): row for row in rows}
+
+        monthly_data = []
+        for month_start in month_starts:
+            row = by_month.get((month_start.year, month_start.month), {})
+            monthly_data.append({
+                'month': month_start.strftime('%B'),
+                'earnings': float(row.get('earnings') or 0),
+                'sessions': row.get('sessions') or 0,
+            })
+        return monthly_data
+
+
+class RatingService:
+    """Service for keeping Trainer.rating/total_reviews in step with reviews using running sums"""
+
+    @staticmethod
+    def apply_delta(trainer_id, rating_delta, count_delta):
+        """Shift a trainer's running sum/count and recompute the average, atomically"""
+        if not rating_delta and not count_delta:
+            return
+        trainers = Trainer.objects.filter(pk=trainer_id)
+        with transaction.atomic():
+            # The first UPDATE locks the row; the second reads the committed sum/count
+            trainers.update(
+                rating_sum=F('rating_sum') + rating_delta,
+                total_reviews=F('total_reviews') + count_delta,
+            )
+            trainers.update(rating=Case(
+                When(total_reviews__gt=0, then=Cast('rating_sum', FloatField()) / F('total_reviews')),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ))
+            RatingService.refresh_search_index(TrainerSearchIndex.objects.filter(trainer_id=trainer_id))
+            ratings_changed.send(sender=RatingService)
+
+    @staticmethod
+    def refresh_search_index(entries):
+        """Copy rating/total_reviews from Trainer into search index rows in one UPDATE"""
+        trainer = Trainer.objects.filter(pk=OuterRef('trainer_id'))
+        if entries.update(
+            rating=Subquery(trainer.values('rating')[:1]),
+            total_reviews=Subquery(trainer.values('total_reviews')[:1]),
+        ):
+            TrainerFacetService.index_changed()
+
+    @staticmethod
+    def shift_histogram(trainer_id, stars, delta):
+        """Move one review in or out of a trainer's star bucket"""
+        field = TrainerRatingHistogram.field_for(stars)
+        if delta > 0:
+            TrainerRatingHistogram.objects.get_or_create(trainer_id=trainer_id)
+        TrainerRatingHistogram.objects.filter(trainer_id=trainer_id).update(**{field: F(field) + delta})
+
+    @staticmethod
+    def review_saved(review, old=None):
+        """Apply a created (old is None) or edited review; old is (trainer_id, rating)"""
+        with transaction.atomic():
+            if old is None:
+                RatingService.apply_delta(review.trainer_id, review.rating, 1)
+            elif old[0] != review.trainer_id:
+                RatingService.apply_delta(old[0], -old[1], -1)
+                RatingService.apply_delta(review.trainer_id, review.rating, 1)
+            else:
+                RatingService.apply_delta(review.trainer_id, review.rating - old[1], 0)
+
+            if old != (review.trainer_id, review.rating):
+                if old is not None:
+                    RatingService.shift_histogram(old[0], old[1], -1)
+                RatingService.shift_histogram(review.trainer_id, review.rating, 1)
+
+    @staticmethod
+    def review_deleted(review):
+        with transaction.atomic():
+            RatingService.apply_delta(review.trainer_id, -review.rating, -1)
+            RatingService.shift_histogram(review.trainer_id, review.rating, -1)
+
+    @staticmethod
+    def rebuild_all(batch_size=500):
+        """Recompute ratings and star histograms for every trainer from one grouped query"""
+        rows = Review.objects.values('trainer', 'rating').annotate(count=Count('id')).order_by()
+
+        trainers = {}
+        histograms = {}
+        for row in rows:
+            trainer_id, stars, count = row['trainer'], row['rating'], row['count']
+            trainer = trainers.setdefault(trainer_id, Trainer(pk=trainer_id, rating_sum=0, total_reviews=0))
+            trainer.rating_sum += stars * count
+            trainer.total_reviews += count
+            histogram = histograms.setdefault(trainer_id, TrainerRatingHistogram(trainer_id=trainer_id))
+            setattr(histogram, TrainerRatingHistogram.field_for(stars), count)
+
+        for trainer in trainers.values():
+            trainer.rating = trainer.rating_sum / trainer.total_reviews
+
+        with transaction.atomic():
+            Trainer.objects.update(rating=0.0, rating_sum=0, total_reviews=0)
+            Trainer.objects.bulk_update(
+                list(trainers.values()), ['rating', 'rating_sum', 'total_reviews'], batch_size=batch_size
+            )
+            TrainerRatingHistogram.objects.all().delete()
+            TrainerRatingHistogram.objects.bulk_create(list(histograms.values()), batch_size=batch_size)
+            RatingService.refresh_search_index(TrainerSearchIndex.objects.all())
+            ratings_changed.send(sender=RatingService)
+        return len(trainers)
+
+
+class AvailabilityService:
+    """Service for turning weekly availability windows into concrete free booking slots"""
+
+    BLOCKING_STATUSES = ('pending', 'confirmed', 'completed')
+
+    @staticmethod
+    def merge_windows(windows):
+        """Merge overlapping (start, end) pairs; input need not be sorted"""
+        merged = []
+        for start, end in sorted(windows):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def expand_windows(weekly, start_date, end_date, duration, step):
+        """Candidate (start, end) datetimes, in start order, for each day in [start_date, end_date]
+
+        ``weekly`` maps a weekday (0 = Monday) to merged (start_time, end_time) windows.
+        """
+        slots = []
+        day = start_date
+        while day <= end_date:
+            for window_start, window_end in weekly.get(day.weekday(), ()):
+                slot_start = datetime.combine(day, window_start)
+                window_close = datetime.combine(day, window_end)
+                while slot_start + duration <= window_close:
+                    slots.append((slot_start, slot_start + duration))
+                    slot_start += step
+            day += timedelta(days=1)
+        return slots
+
+    @staticmethod
+    def subtract_busy(slots, busy):
+        """Slots overlapping no busy interval; both lists sorted by start, O(slots + busy)"""
+        free = []
+        j = 0
+        for slot_start, slot_end in slots:
+            # Busy intervals ending before this slot can never overlap a later slot either
+            while j < len(busy) and busy[j][1] <= slot_start:
+                j += 1
+            if j < len(busy) and busy[j][0] < slot_end:
+                continue
+            free.append((slot_start, slot_end))
+        return free
+
+    @staticmethod
+    def get_free_slots(trainer, start_date, end_date, duration_minutes=60, step_minutes=30, now=None):
+        """Free slots of ``duration_minutes`` for a trainer between two dates, inclusive, in two queries"""
+        now = now or timezone.localtime().replace(tzinfo=None)
+
+        weekly = {}
+        for day, start, end in trainer.availability_slots.values_list('day_of_week', 'start_time', 'end_time'):
+            if start < end:
+                weekly.setdefault(int(day), []).append((start, end))
+        weekly = {day: AvailabilityService.merge_windows(windows) for day, windows in weekly.items()}
+
+        bookings = Booking.objects.filter(
+            trainer=trainer,
+            status__in=AvailabilityService.BLOCKING_STATUSES,
+            booking_date__range=(start_date, end_date),
+        ).order_by('booking_date', 'start_time').values_list('booking_date', 'start_time', 'duration_minutes')
+        busy = []
+        for booking_date, start, minutes in bookings:
+            booking_start = datetime.combine(booking_date, start)
+            busy.append((booking_start, booking_start + timedelta(minutes=minutes)))
+
+        slots = AvailabilityService.expand_windows(
+            weekly, start_date, end_date, timedelta(minutes=duration_minutes), timedelta(minutes=step_minutes)
+        )
+        return [slot for slot in AvailabilityService.subtract_busy(slots, busy) if slot[0] > now]
+
+
+class BookingConflictService:
+    """Service for detecting overlapping bookings of the same trainer"""
+
+    @staticmethod
+    def max_duration():
+        return max(minutes for minutes, _ in Booking._meta.get_field('duration_minutes').choices)
+
+    @staticmethod
+    def find_conflicts(trainer_id, booking_date, start_time, duration_minutes, exclude_id=None):
+        """Active bookings overlapping [start, start + duration) on the same day
+
+        Only bookings starting less than the longest session before the new
+        end can overlap, so the lookup is a range scan on the
+        (trainer, booking_date, start_time) index.
+        """
+        start = datetime.combine(booking_date, start_time)
+        end = start + timedelta(minutes=duration_minutes)
+        earliest = start - timedelta(minutes=BookingConflictService.max_duration())
+
+        candidates = Booking.objects.filter(
+            trainer_id=trainer_id,
+            booking_date=booking_date,
+            status__in=AvailabilityService.BLOCKING_STATUSES,
+        )
+        if earliest.date() == booking_date:
+            candidates = candidates.filter(start_time__gt=earliest.time())
+        if end.date() == booking_date:
+            candidates = candidates.filter(start_time__lt=end.time())
+        if exclude_id is not None:
+            candidates = candidates.exclude(pk=exclude_id)
+
+        conflicts = []
+        for booking in candidates.order_by('start_time'):
+            other_start = datetime.combine(booking_date, booking.start_time)
+            if other_start < end and other_start + timedelta(minutes=booking.duration_minutes) > start:
+                conflicts.append(booking)
+        return conflicts
+
+    @staticmethod
+    def lock_trainer(trainer_id):
+        """Row-lock the trainer so concurrent bookings for them are checked one at a time
+
+        Must be called inside transaction.atomic().
+        """
+        return Trainer.objects.select_for_update().only('id').get(pk=trainer_id)
@@ -0,0 +1,34 @@
+"""
+Signal handlers keeping trainer ratings in sync with reviews
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Review
+from .services import RatingService
+
+
+@receiver(pre_save, sender=Review)
+def capture_review_rating(sender, instance, raw=False, **kwargs):
+    """Remember the stored trainer/rating so edits apply only the difference"""
+    if raw:
+        return
+    instance._rating_snapshot = None
+    if instance.pk:
+        instance._rating_snapshot = Review.objects.filter(pk=instance.pk).values_list(
+            'trainer_id', 'rating'
+        ).first()
+
+
+@receiver(post_save, sender=Review)
+def update_trainer_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_rating_snapshot', None)
+    if not created and old is None:
+        return
+    RatingService.review_saved(instance, old)
+
+
+@receiver(post_delete, sender=Review)
+def remove_trainer_rating(sender, instance, **kwargs):
+    RatingService.review_deleted(instance)
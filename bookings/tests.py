@@ -1,3 +1,235 @@
+import io
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from trainers.models import SessionType, Trainer, TrainerAvailability, TrainerRatingHistogram, TrainerSearchIndex
+from .models import Booking, Review
+from .services import AvailabilityService, BookingConflictService
 
-# Create your tests here.
+User = get_user_model()
+
+
+class BookingConflictTests(TestCase):
+    """Overlap checks and the active-slot constraint for new and revived bookings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer_user = User.objects.create_user(username='coach', password='pass12345', user_type='trainer')
+        cls.trainer = Trainer.objects.create(user=cls.trainer_user, price_per_hour=Decimal('200'))
+        cls.client_user = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        cls.session_type = SessionType.objects.create(name='Yoga')
+        cls.day = timezone.now().date() + timedelta(days=3)
+
+    def book(self, start, minutes=60, status='pending'):
+        return Booking.objects.create(
+            client=self.client_user, trainer=self.trainer, booking_date=self.day, start_time=start,
+            duration_minutes=minutes, status=status, total_price=Decimal('200'),
+        )
+
+    def post_booking(self, start, minutes=60):
+        self.client.force_login(self.client_user)
+        return self.client.post(reverse('booking', args=[self.trainer.id]), {
+            'session_type': self.session_type.id,
+            'booking_date': self.day.isoformat(),
+            'start_time': start,
+            'duration_minutes': minutes,
+            'notes': '',
+        })
+
+    def test_find_conflicts_detects_overlap_only(self):
+        existing = self.book(time(10, 0), minutes=90)
+        find = BookingConflictService.find_conflicts
+        self.assertEqual(find(self.trainer.id, self.day, time(11, 0), 60), [existing])
+        self.assertEqual(find(self.trainer.id, self.day, time(9, 0), 120), [existing])
+        self.assertEqual(find(self.trainer.id, self.day, time(11, 30), 60), [])  # starts as it ends
+        self.assertEqual(find(self.trainer.id, self.day, time(9, 0), 60), [])  # ends as it starts
+        self.assertEqual(find(self.trainer.id, self.day, time(10, 0), 60, exclude_id=existing.id), [])
+
+    def test_overlapping_booking_rejected_with_form_error(self):
+        self.book(time(10, 0))
+        response = self.post_booking('10:30')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('start_time', response.context['form'].errors)
+        self.assertEqual(Booking.objects.count(), 1)
+
+        self.assertEqual(self.post_booking('11:00').status_code, 302)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        self.book(time(10, 0), status='cancelled')
+        response = self.post_booking('10:00')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Booking.objects.filter(start_time=time(10, 0)).count(), 2)
+
+    def test_database_rejects_second_active_booking_in_a_slot(self):
+        self.book(time(10, 0), status='cancelled')
+        self.book(time(10, 0), status='cancelled')
+        self.book(time(10, 0))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.book(time(10, 0), status='confirmed')
+
+    def test_reviving_cancelled_booking_into_taken_slot_refused(self):
+        cancelled = self.book(time(10, 0), status='cancelled')
+        self.book(time(10, 0))
+        self.client.force_login(self.trainer_user)
+        self.client.post(reverse('update_booking_status', args=[cancelled.id]), {'status': 'confirmed'})
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+
+
+class ReviewTestCase(TestCase):
+    """Two approved trainers and a helper creating a completed booking with its review"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        cls.trainers = []
+        for i in range(2):
+            user = User.objects.create_user(username=f'coach{i}', password='pass12345', user_type='trainer')
+            cls.trainers.append(Trainer.objects.create(user=user, price_per_hour=Decimal('200'), is_approved=True))
+
+    def review(self, trainer, rating, hour=10):
+        booking = Booking.objects.create(
+            client=self.client_user, trainer=trainer, booking_date=timezone.now().date() - timedelta(days=1),
+            start_time=time(hour), duration_minutes=60, status='completed', total_price=Decimal('200'),
+        )
+        return Review.objects.create(booking=booking, trainer=trainer, client=self.client_user,
+                                     rating=rating, comment='ok')
+
+
+class RatingServiceTests(ReviewTestCase):
+    """Running rating sums follow review creates, edits and deletes"""
+
+    def assertRating(self, trainer, rating, total):
+        trainer.refresh_from_db()
+        self.assertEqual((trainer.rating, trainer.total_reviews), (rating, total))
+        entry = TrainerSearchIndex.objects.get(trainer=trainer)
+        self.assertEqual((entry.rating, entry.total_reviews), (rating, total))
+
+    def test_create_edit_delete(self):
+        trainer = self.trainers[0]
+        first = self.review(trainer, 5)
+        self.review(trainer, 2, hour=12)
+        self.assertRating(trainer, 3.5, 2)
+
+        first.rating = 3
+        first.save()
+        self.assertRating(trainer, 2.5, 2)
+
+        first.delete()
+        self.assertRating(trainer, 2.0, 1)
+
+    def test_review_moved_to_another_trainer(self):
+        review = self.review(self.trainers[0], 4)
+        review.trainer = self.trainers[1]
+        review.save()
+        self.assertRating(self.trainers[0], 0.0, 0)
+        self.assertRating(self.trainers[1], 4.0, 1)
+
+    def test_rebuild_command_reconciles_drift(self):
+        self.review(self.trainers[0], 5)
+        self.review(self.trainers[0], 4, hour=12)
+        Trainer.objects.update(rating=1.0, rating_sum=99, total_reviews=7)  # skips the signals
+        call_command('rebuild_trainer_ratings', stdout=io.StringIO())
+        self.assertRating(self.trainers[0], 4.5, 2)
+        self.assertRating(self.trainers[1], 0.0, 0)
+
+
+class RatingHistogramTests(ReviewTestCase):
+    """Star buckets move with reviews and back the trainer page distribution"""
+
+    def counts(self, trainer):
+        return TrainerRatingHistogram.objects.get(trainer=trainer).counts()
+
+    def test_buckets_follow_create_edit_delete(self):
+        trainer = self.trainers[0]
+        first = self.review(trainer, 5)
+        self.review(trainer, 5, hour=12)
+        self.assertEqual(self.counts(trainer), {5: 2, 4: 0, 3: 0, 2: 0, 1: 0})
+
+        first.rating = 1
+        first.save()
+        self.assertEqual(self.counts(trainer), {5: 1, 4: 0, 3: 0, 2: 0, 1: 1})
+
+        first.delete()
+        self.assertEqual(self.counts(trainer), {5: 1, 4: 0, 3: 0, 2: 0, 1: 0})
+
+    def test_rebuild_command_rebuilds_buckets(self):
+        self.review(self.trainers[0], 4)
+        self.review(self.trainers[0], 2, hour=12)
+        TrainerRatingHistogram.objects.update(stars_4=9, stars_2=0)
+        call_command('rebuild_trainer_ratings', stdout=io.StringIO())
+        self.assertEqual(self.counts(self.trainers[0]), {5: 0, 4: 1, 3: 0, 2: 1, 1: 0})
+
+    def test_detail_page_distribution_and_review_pages(self):
+        trainer = self.trainers[0]
+        for i in range(12):
+            self.review(trainer, 5 if i % 3 else 3, hour=8 + i)
+        url = reverse('trainer_detail', args=[trainer.id])
+        response = self.client.get(url)
+        distribution = {row['stars']: (row['count'], row['percent']) for row in response.context['rating_distribution']}
+        self.assertEqual(distribution[5], (8, 67))
+        self.assertEqual(distribution[3], (4, 33))
+        self.assertEqual(len(response.context['reviews']), 10)
+
+        rest = self.client.get(url, {'reviews_cursor': response.context['reviews_next_cursor']})
+        self.assertEqual(len(rest.context['reviews']), 2)
+        self.assertIsNone(rest.context['reviews_next_cursor'])
+
+
+class AvailabilitySlotTests(TestCase):
+    """Weekly windows expanded into dated slots, minus blocking bookings"""
+
+    MONDAY = date(2030, 1, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='coach', password='pass12345', user_type='trainer')
+        cls.trainer = Trainer.objects.create(user=user, price_per_hour=Decimal('200'), is_approved=True)
+        cls.client_user = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        for day, start, end in (('0', time(9), time(11)), ('0', time(10), time(12)), ('2', time(18), time(19, 30))):
+            TrainerAvailability.objects.create(trainer=cls.trainer, day_of_week=day, start_time=start, end_time=end)
+
+    def book(self, day, start, minutes=60, status='confirmed'):
+        Booking.objects.create(
+            client=self.client_user, trainer=self.trainer, booking_date=day, start_time=start,
+            duration_minutes=minutes, status=status, total_price=Decimal('200'),
+        )
+
+    def starts(self, start_date, end_date, duration=60, now=None):
+        slots = AvailabilityService.get_free_slots(
+            self.trainer, start_date, end_date, duration, now=now or datetime(2030, 1, 1)
+        )
+        return [slot_start.strftime('%a %H:%M') for slot_start, _ in slots]
+
+    def test_overlapping_windows_merge(self):
+        self.assertEqual(self.starts(self.MONDAY, self.MONDAY),
+                         ['Mon 09:00', 'Mon 09:30', 'Mon 10:00', 'Mon 10:30', 'Mon 11:00'])
+        self.assertEqual(self.starts(self.MONDAY, self.MONDAY + timedelta(days=6), duration=90),
+                         ['Mon 09:00', 'Mon 09:30', 'Mon 10:00', 'Mon 10:30', 'Wed 18:00'])
+
+    def test_bookings_block_overlapping_slots(self):
+        self.book(self.MONDAY, time(10), minutes=60)
+        self.book(self.MONDAY, time(11), status='cancelled')
+        self.assertEqual(self.starts(self.MONDAY, self.MONDAY), ['Mon 09:00', 'Mon 11:00'])
+
+    def test_past_slots_dropped(self):
+        now = datetime.combine(self.MONDAY, time(10, 15))
+        self.assertEqual(self.starts(self.MONDAY, self.MONDAY, now=now), ['Mon 10:30', 'Mon 11:00'])
+
+    def test_two_queries(self):
+        with self.assertNumQueries(2):
+            AvailabilityService.get_free_slots(self.trainer, self.MONDAY, self.MONDAY + timedelta(days=30))
+
+    def test_slots_endpoint(self):
+        url = reverse('booking_slots', args=[self.trainer.id])
+        response = self.client.get(url, {'start': self.MONDAY.isoformat(), 'days': 3, 'duration': 90})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slots'][-1], {'date': '2030-01-09', 'start': '18:00', 'end': '19:30'})
+        self.assertEqual(self.client.get(url, {'duration': 45}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'soon'}).status_code, 400)
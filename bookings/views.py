@@ -3,9 +3,13 @@ from django.contrib.auth.decorators import login_required
 from django.views.generic import CreateView, ListView, DetailView
 from django.urls import reverse_lazy
 from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from datetime import date, timedelta
 from decimal import Decimal
 from .models import Booking, Review, Payment
 from .forms import BookingForm, ReviewForm, PaymentForm
+from .services import AvailabilityService, BookingConflictService
 from trainers.models import Trainer
 
 
@@ -25,8 +29,23 @@ def booking_view(request, trainer_id):
             # Calculate price
             duration_hours = booking.duration_minutes / 60
             booking.total_price = trainer.price_per_hour * Decimal(duration_hours)
-            booking.save()
-            return redirect('booking_confirmation', booking_id=booking.id)
+            
+            # Lock the trainer row so two overlapping requests cannot both pass the check
+            try:
+                with transaction.atomic():
+                    BookingConflictService.lock_trainer(trainer.id)
+                    conflicts = BookingConflictService.find_conflicts(
+                        trainer.id, booking.booking_date, booking.start_time, booking.duration_minutes
+                    )
+                    if not conflicts:
+                        booking.save()
+            except IntegrityError:
+                # Same start as an active booking that the overlap check did not see
+                conflicts = True
+            
+            if not conflicts:
+                return redirect('booking_confirmation', booking_id=booking.id)
+            form.add_error('start_time', 'هذا الوقت يتعارض مع حجز آخر للمدرب، يرجى اختيار وقت آخر')
     else:
         form = BookingForm()
     
@@ -36,6 +55,34 @@ def booking_view(request, trainer_id):
     })
 
 
+def booking_slots_view(request, trainer_id):
+    """Free slots for a trainer as JSON: ?start=YYYY-MM-DD&days=7&duration=60"""
+    try:
+        trainer = Trainer.objects.get(id=trainer_id, is_approved=True)
+    except Trainer.DoesNotExist:
+        return JsonResponse({'error': 'Trainer not found'}, status=404)
+    
+    durations = {minutes for minutes, _ in Booking._meta.get_field('duration_minutes').choices}
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+        days = min(max(int(request.GET.get('days', 7)), 1), 31)
+        duration = int(request.GET.get('duration', 60))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    if duration not in durations:
+        return JsonResponse({'error': 'Invalid duration'}, status=400)
+    
+    slots = AvailabilityService.get_free_slots(trainer, start, start + timedelta(days=days - 1), duration)
+    return JsonResponse({
+        'trainer': trainer.id,
+        'duration_minutes': duration,
+        'slots': [
+            {'date': slot_start.date().isoformat(), 'start': slot_start.strftime('%H:%M'), 'end': slot_end.strftime('%H:%M')}
+            for slot_start, slot_end in slots
+        ],
+    })
+
+
 @login_required
 def booking_confirmation_view(request, booking_id):
     try:
@@ -106,15 +153,7 @@ def add_review_view(request, booking_id):
             review.booking = booking
             review.trainer = booking.trainer
             review.client = request.user
-            review.save()
-            
-            # Update trainer rating
-            trainer = booking.trainer
-            reviews = trainer.reviews.all()
-            avg_rating = sum(r.rating for r in reviews) / reviews.count() if reviews.exists() else 0
-            trainer.rating = avg_rating
-            trainer.total_reviews = reviews.count()
-            trainer.save()
+            review.save()  # Trainer rating is updated incrementally by bookings.signals
             
             return redirect('booking_list')
     else:
@@ -0,0 +1,191 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded for the current ordering"""
+
+
+def encode_cursor(values):
+    """Encode ordering values as an opaque, URL-safe cursor"""
+    payload = []
+    for value in values:
+        if isinstance(value, (datetime, date, time)):
+            payload.append(value.isoformat())
+        elif isinstance(value, (Decimal, UUID)):
+            payload.append(str(value))
+        else:
+            payload.append(value)
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by encode_cursor; values stay in their JSON form"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Cursor does not match ordering')
+    return values
+
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, object_list, next_cursor, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.count = count
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate a queryset by seeking past the last row instead of using OFFSET
+
+    ``ordering`` lists non-null model fields, each optionally prefixed with
+    ``-``, and must end with a unique column (normally ``id``) so every row
+    has a distinct position. COUNT(*) is only issued when asked for.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    def get_page(self, cursor=None, with_count=False):
+        """Return the page after cursor; an invalid or missing cursor gives the first page
+
+        With ``with_count`` the page also carries the total row count of the
+        unpaginated queryset, at the cost of one extra query.
+        """
+        queryset = self.queryset
+        if cursor:
+            try:
+                queryset = queryset.filter(self._after(self._clean(decode_cursor(cursor, len(self.ordering)))))
+            except (InvalidCursor, ValidationError, TypeError, ValueError):
+                pass
+
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor(self._position(rows[-1]))
+        count = self.queryset.count() if with_count else None
+        return KeysetPage(rows, next_cursor, count)
+
+    def _clean(self, values):
+        """Cursor values converted by their model fields; anything they reject is an InvalidCursor
+
+        Ordering names that are not model fields (annotations) are only
+        checked to be scalars.
+        """
+        cleaned = []
+        for field_name, value in zip(self.ordering, values):
+            if value is None or isinstance(value, (list, dict)):
+                raise InvalidCursor('Cursor value has the wrong type')
+            try:
+                field = self.queryset.model._meta.get_field(field_name.lstrip('-'))
+            except FieldDoesNotExist:
+                cleaned.append(value)
+                continue
+            try:
+                cleaned.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor('Cursor value has the wrong type')
+        return cleaned
+
+    def _position(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _after(self, values):
+        """(a, b, c) > (x, y, z) expanded per column so each ordering direction is honoured"""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_field, prev_value in zip(self.ordering[:i], values[:i]):
+                clause &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= clause
+        return condition
+
+
+class KeysetPagination(PageNumberPagination):
+    """DRF pagination that switches to KeysetPaginator when the client asks for it
+
+    Without a ``cursor`` parameter responses keep the page-number shape
+    (count, next, previous, results), so existing clients are unaffected.
+    Passing ``?cursor=`` (empty for the first page) opts in to keyset pages
+    with only next and results; ``?count=1`` adds the total.
+
+    Views may set ``keyset_ordering`` to override the default ordering,
+    which both modes use.
+    """
+    page_size = 20
+    ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', None) or self.ordering
+        self.request = request
+        self.keyset_page = None
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset.order_by(*ordering), request, view)
+
+        with_count = request.query_params.get(self.count_query_param) in ('1', 'true')
+        self.keyset_page = KeysetPaginator(queryset, ordering, self.page_size).get_page(
+            request.query_params.get(self.cursor_query_param), with_count=with_count
+        )
+        return list(self.keyset_page)
+
+    def get_next_link(self):
+        if self.keyset_page is None:
+            return super().get_next_link()
+        if not self.keyset_page.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.keyset_page.next_cursor)
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.keyset_page.count is not None:
+            payload['count'] = self.keyset_page.count
+        return Response(payload)
+
+
+def cursor_query(request, cursor, param='cursor'):
+    """Current query string with the cursor parameter replaced (or dropped when cursor is None)"""
+    params = request.GET.copy()
+    params.pop(param, None)
+    if cursor:
+        params[param] = cursor
+    return params.urlencode()
@@ -0,0 +1,127 @@
+"""
+Landing and club page caching services
+"""
+import hashlib
+from django.core.cache import cache
+from django.db.models import Avg, Count
+from django.utils import timezone
+from bookings.models import Booking
+from payments.models import TrainerSubscription
+from trainers.models import Trainer
+from trainers.reference import ReferenceData
+
+
+class LandingPageCache:
+    """Short-lived cache for the HomeView context and its anonymous HTML
+
+    Both entries are dropped by invalidate(), which signal handlers call
+    when featured trainers, cities or session types change.
+    """
+
+    CONTEXT_KEY = 'landing:context'
+    HTML_KEY = 'landing:html'
+    TTL = 120  # seconds
+
+    @staticmethod
+    def build_context():
+        return {
+            'cities': ReferenceData.cities()[:6],
+            'session_types': ReferenceData.session_types(),
+            'featured_trainers': list(
+                Trainer.objects.filter(is_approved=True).select_related('user').order_by('-rating')[:6]
+            ),
+        }
+
+    @staticmethod
+    def get_context():
+        """Cities, session types and featured trainers, computed at most once per TTL"""
+        context = cache.get(LandingPageCache.CONTEXT_KEY)
+        if context is None:
+            context = LandingPageCache.build_context()
+            cache.set(LandingPageCache.CONTEXT_KEY, context, LandingPageCache.TTL)
+        return context
+
+    @staticmethod
+    def get_page():
+        """Cached {'html', 'etag', 'last_modified'} for anonymous visitors, or None"""
+        return cache.get(LandingPageCache.HTML_KEY)
+
+    @staticmethod
+    def set_page(html):
+        page = {
+            'html': html,
+            'etag': '"%s"' % hashlib.md5(html.encode()).hexdigest(),
+            'last_modified': timezone.now().replace(microsecond=0),
+        }
+        cache.set(LandingPageCache.HTML_KEY, page, LandingPageCache.TTL)
+        return page
+
+    @staticmethod
+    def invalidate():
+        cache.delete_many([LandingPageCache.CONTEXT_KEY, LandingPageCache.HTML_KEY])
+
+
+class ClubPageCache:
+    """Per-club cache of the trainer roster shown on the club detail page
+
+    The roster comes from one Trainer query annotated with review averages
+    and counts (plus a prefetch of specialties), instead of two queries per
+    seat. Signal handlers drop a club's entry when a trainer joins or
+    leaves it, or when one of its trainers or their reviews change.
+    """
+
+    TTL = 300  # seconds
+
+    @staticmethod
+    def key(club_id):
+        return f"club_page:{club_id}"
+
+    @staticmethod
+    def build_context(club):
+        trainers = list(
+            Trainer.objects.filter(
+                user__trainer_subscription__organization=club,
+                user__trainer_subscription__is_active=True,
+            ).select_related('user').prefetch_related('specialties').annotate(
+                avg_rating=Avg('reviews__rating'),
+                review_count=Count('reviews'),
+            ).order_by('id')
+        )
+        return {
+            'trainers': [
+                {
+                    'profile': trainer,
+                    'user': trainer.user,
+                    'avg_rating': trainer.avg_rating or 0,
+                    'review_count': trainer.review_count,
+                }
+                for trainer in trainers
+            ],
+            'total_trainers': len(trainers),
+            'club_bookings_count': Booking.objects.filter(
+                trainer__in=trainers, status='completed'
+            ).count() if trainers else 0,
+        }
+
+    @staticmethod
+    def get_context(club):
+        """Trainers with ratings, trainer count and completed bookings for a club, cached per TTL"""
+        key = ClubPageCache.key(club.pk)
+        context = cache.get(key)
+        if context is None:
+            context = ClubPageCache.build_context(club)
+            cache.set(key, context, ClubPageCache.TTL)
+        return context
+
+    @staticmethod
+    def invalidate(club_ids):
+        cache.delete_many([ClubPageCache.key(club_id) for club_id in club_ids if club_id])
+
+    @staticmethod
+    def invalidate_for_trainers(trainer_ids):
+        """Drop the pages of the clubs the given Trainer profiles belong to"""
+        ClubPageCache.invalidate(
+            TrainerSubscription.objects.filter(
+                trainer__trainer_profile__in=trainer_ids, organization__isnull=False
+            ).values_list('organization_id', flat=True)
+        )
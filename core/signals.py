@@ -0,0 +1,80 @@
+"""
+Signal handlers invalidating the cached landing and club pages
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from bookings.models import Review
+from bookings.services import ratings_changed
+from payments.models import TrainerSubscription
+from trainers.models import City, SessionType, Trainer
+from .services import ClubPageCache, LandingPageCache
+
+LANDING_TRAINER_FIELDS = ('rating', 'is_approved')
+
+
+@receiver(pre_save, sender=Trainer)
+def capture_landing_fields(sender, instance, raw=False, **kwargs):
+    """Remember the stored rating/approval so post_save can tell whether they changed"""
+    if raw or not instance.pk:
+        instance._landing_snapshot = None
+        return
+    instance._landing_snapshot = Trainer.objects.filter(pk=instance.pk).values_list(
+        *LANDING_TRAINER_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=Trainer)
+def invalidate_landing_for_trainer(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = tuple(getattr(instance, field) for field in LANDING_TRAINER_FIELDS)
+    if created or getattr(instance, '_landing_snapshot', None) != current:
+        LandingPageCache.invalidate()
+
+
+@receiver(ratings_changed)
+def invalidate_landing_for_ratings(sender, **kwargs):
+    """Featured trainers are ordered by rating, which RatingService moves with UPDATE queries"""
+    LandingPageCache.invalidate()
+    # Again after commit, so a read racing the transaction cannot re-cache the old ordering
+    transaction.on_commit(LandingPageCache.invalidate)
+
+
+@receiver(post_delete, sender=Trainer)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=SessionType)
+@receiver(post_delete, sender=SessionType)
+def invalidate_landing(sender, raw=False, **kwargs):
+    if raw:
+        return
+    LandingPageCache.invalidate()
+
+
+@receiver(pre_save, sender=TrainerSubscription)
+def capture_club_seat(sender, instance, raw=False, **kwargs):
+    """Remember the stored organization so a trainer moving clubs refreshes both pages"""
+    if raw or instance._state.adding:
+        instance._club_snapshot = None
+        return
+    instance._club_snapshot = TrainerSubscription.objects.filter(pk=instance.pk).values_list(
+        'organization_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=TrainerSubscription)
+@receiver(post_delete, sender=TrainerSubscription)
+def invalidate_club_seat(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ClubPageCache.invalidate({instance.organization_id, getattr(instance, '_club_snapshot', None)})
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Trainer)
+def invalidate_club_for_trainer(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ClubPageCache.invalidate_for_trainers([instance.trainer_id if sender is Review else instance.pk])
@@ -1,3 +1,160 @@
+from datetime import time, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from bookings.models import Booking, Review
+from core.pagination import KeysetPaginator, encode_cursor
+from core.services import LandingPageCache
+from payments.models import Organization, SubscriptionPlan, TrainerSubscription
+from trainers.models import Trainer
 
-# Create your tests here.
+User = get_user_model()
+
+
+class ClubDetailQueryTests(TestCase):
+    """The club page cost must not grow with the number of seats"""
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username='owner', password='pass12345', user_type='client')
+        plan = SubscriptionPlan.objects.create(
+            key='gold_club', name='Gold Club', price_monthly=Decimal('999'), is_org_plan=True, included_seats=50
+        )
+        self.club = Organization.objects.create(name='Atlas Gym', owner=owner, email='gym@example.com',
+                                                subscription_plan=plan)
+        client = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        self.trainers = []
+        for i in range(10):
+            user = User.objects.create_user(username=f'coach{i}', password='pass12345', user_type='trainer')
+            trainer = Trainer.objects.create(user=user, price_per_hour=Decimal('200'))
+            TrainerSubscription.objects.create(trainer=user, plan=plan, organization=self.club)
+            for j in range(2):
+                booking = Booking.objects.create(
+                    client=client, trainer=trainer, booking_date=timezone.now().date() - timedelta(days=1),
+                    start_time=time(8 + j), duration_minutes=60, status='completed', total_price=Decimal('200'),
+                )
+                Review.objects.create(booking=booking, trainer=trainer, client=client, rating=3 + j, comment='ok')
+            self.trainers.append(trainer)
+
+    def test_club_page_query_count(self):
+        url = reverse('club_detail', args=[self.club.id])
+        # club + annotated trainers + specialties prefetch + completed bookings count
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_trainers'], 10)
+        self.assertEqual(response.context['club_bookings_count'], 20)
+        self.assertEqual(response.context['trainers'][0]['avg_rating'], 3.5)
+        self.assertEqual(response.context['trainers'][0]['review_count'], 2)
+
+        # Cached: only the club itself is read
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_seat_and_review_changes_invalidate(self):
+        url = reverse('club_detail', args=[self.club.id])
+        self.client.get(url)
+
+        TrainerSubscription.objects.filter(trainer=self.trainers[0].user).first().delete()
+        self.assertEqual(self.client.get(url).context['total_trainers'], 9)
+
+        Review.objects.filter(trainer=self.trainers[1]).first().delete()
+        rows = {row['profile'].id: row for row in self.client.get(url).context['trainers']}
+        self.assertEqual(rows[self.trainers[1].id]['review_count'], 1)
+
+
+class KeysetPaginatorTests(TestCase):
+    """Cursors are client input: anything undecodable falls back to the first page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer_user = User.objects.create_user(username='coach', password='pass12345', user_type='trainer')
+        cls.trainer = Trainer.objects.create(user=cls.trainer_user, price_per_hour=Decimal('200'))
+        client = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        today = timezone.now().date()
+        for i in range(5):
+            Booking.objects.create(
+                client=client, trainer=cls.trainer, booking_date=today + timedelta(days=i),
+                start_time=time(9), duration_minutes=60, status='pending', total_price=Decimal('200'),
+            )
+
+    def paginator(self):
+        return KeysetPaginator(Booking.objects.all(), ('booking_date', 'id'), per_page=2)
+
+    def test_cursor_walks_all_rows(self):
+        seen = []
+        cursor = None
+        while True:
+            page = self.paginator().get_page(cursor)
+            seen.extend(booking.id for booking in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(Booking.objects.order_by('booking_date', 'id').values_list('id', flat=True)))
+
+    def test_malformed_cursors_give_first_page(self):
+        first = [booking.id for booking in self.paginator().get_page()]
+        for cursor in ('not base64!', encode_cursor(['garbage', 1]), encode_cursor([{'a': 1}, 1]),
+                       encode_cursor(['2026-01-01', [1]]), encode_cursor([None, 1]), encode_cursor([1])):
+            with self.subTest(cursor=cursor):
+                self.assertEqual([booking.id for booking in self.paginator().get_page(cursor)], first)
+
+    def test_views_ignore_malformed_cursors(self):
+        self.client.force_login(self.trainer_user)
+        response = self.client.get(reverse('trainer_bookings'), {'cursor': encode_cursor([{'a': 1}, 'x'])})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('trainer_bookings'), {'status': 'pending',
+                                                                 'cursor': encode_cursor(['garbage', 1])})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('clubs_directory'), {'cursor': encode_cursor(['garbage', 'x'])})
+        self.assertEqual(response.status_code, 200)
+
+
+class LandingPageTests(TestCase):
+    """Anonymous landing HTML is cached, honours conditional GET and follows rating changes"""
+
+    def setUp(self):
+        cache.clear()
+        client = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        self.trainers = []
+        for i in range(2):
+            user = User.objects.create_user(username=f'coach{i}', password='pass12345', user_type='trainer')
+            self.trainers.append(Trainer.objects.create(user=user, price_per_hour=Decimal('200'), is_approved=True))
+        self.booking = Booking.objects.create(
+            client=client, trainer=self.trainers[1], booking_date=timezone.now().date() - timedelta(days=1),
+            start_time=time(8), duration_minutes=60, status='completed', total_price=Decimal('200'),
+        )
+        self.url = reverse('home')
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_review_reorders_featured_trainers(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.context['featured_trainers'][0], self.trainers[0])
+
+        Review.objects.create(booking=self.booking, trainer=self.trainers[1], client=self.booking.client,
+                              rating=5, comment='great')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.context['featured_trainers'][0], self.trainers[1])
+
+    def test_page_cached_during_the_review_transaction_is_dropped_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(booking=self.booking, trainer=self.trainers[1], client=self.booking.client,
+                                  rating=5, comment='great')
+            # A concurrent request still reading the pre-commit ratings
+            LandingPageCache.set_page('stale')
+        self.assertIsNone(LandingPageCache.get_page())
@@ -1,8 +1,16 @@
 from django.shortcuts import render, redirect
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from django.views.generic import TemplateView, ListView
+from django.db.models import prefetch_related_objects
 from django.contrib.auth.decorators import login_required
-from trainers.models import City, SessionType, Trainer, SubscriptionPlan
+from trainers.models import Trainer, TrainerAvailability, TrainerRatingHistogram, SubscriptionPlan
+from trainers.reference import ReferenceData
+from trainers.services import TrainerSearchService, TrainerFacetService
 from .models import ContactMessage
+from .pagination import KeysetPaginator, cursor_query
+from .services import LandingPageCache
 from clients.models import ClientProgress, ClientProfile
 from django.contrib import messages
 
@@ -10,13 +18,30 @@ from django.contrib import messages
 class HomeView(TemplateView):
     template_name = 'index.html'
     
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+        
+        # Anonymous visitors all see the same page: serve cached HTML and honour conditional GET
+        page = LandingPageCache.get_page()
+        if page is None:
+            response = super().get(request, *args, **kwargs)
+            response.render()
+            page = LandingPageCache.set_page(response.content.decode(response.charset))
+        
+        last_modified = page['last_modified'].timestamp()
+        response = get_conditional_response(request, etag=page['etag'], last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(page['html'])
+        response['ETag'] = page['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cities'] = City.objects.all()[:6]
-        context['session_types'] = SessionType.objects.all()
-        context['featured_trainers'] = Trainer.objects.filter(
-            is_approved=True
-        ).order_by('-rating')[:6]
+        context.update(LandingPageCache.get_context())
         return context
 
 
@@ -24,53 +49,74 @@ class TrainerListView(ListView):
     model = Trainer
     template_name = 'trainers.html'
     context_object_name = 'trainers'
-    paginate_by = 12
+    paginate_by = None  # keyset pagination, see get_context_data
+    per_page = 12
     
     def get_queryset(self):
-        queryset = Trainer.objects.filter(is_approved=True).order_by('-rating')
-        
-        # Filter by city (by name or code)
-        city = self.request.GET.get('city')
-        if city:
-            queryset = queryset.filter(user__city__icontains=city)
-        
-        # Filter by specialty
-        specialty = self.request.GET.get('specialty')
-        if specialty:
-            queryset = queryset.filter(specialties__id=specialty).distinct()
-        
-        # Filter by price range
-        min_price = self.request.GET.get('min_price')
-        max_price = self.request.GET.get('max_price')
-        
-        if min_price:
-            try:
-                queryset = queryset.filter(price_per_hour__gte=float(min_price))
-            except (ValueError, TypeError):
-                pass
-                
-        if max_price:
-            try:
-                queryset = queryset.filter(price_per_hour__lte=float(max_price))
-            except (ValueError, TypeError):
-                pass
-        
-        # Sort
-        sort_by = self.request.GET.get('sort', '-rating')
-        if sort_by in ['-rating', 'price_per_hour', '-price_per_hour', '-experience_years']:
-            queryset = queryset.order_by(sort_by)
-        else:
-            queryset = queryset.order_by('-rating')
-        
-        return queryset
+        # Filter and sort on the denormalized search index instead of joining users
+        params = self.request.GET
+        return TrainerSearchService.search(
+            city=params.get('city'),
+            specialty=params.get('specialty'),
+            min_price=params.get('min_price'),
+            max_price=params.get('max_price'),
+            sort=params.get('sort', TrainerSearchService.DEFAULT_SORT),
+            day=params.get('day'),
+            start_time=params.get('from'),
+            end_time=params.get('to'),
+        ).select_related('trainer__user')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cities'] = City.objects.all()
-        context['session_types'] = SessionType.objects.all()
+        ordering = TrainerSearchService.ordering_for(
+            self.request.GET.get('sort', TrainerSearchService.DEFAULT_SORT)
+        )
+        page = KeysetPaginator(context['object_list'], ordering, self.per_page).get_page(
+            self.request.GET.get('cursor')
+        )
+        trainers = [entry.trainer for entry in page]
+        prefetch_related_objects(trainers, 'specialties')
+        context['trainers'] = trainers
+        context['next_cursor'] = page.next_cursor
+        context['next_query'] = cursor_query(self.request, page.next_cursor)
+        context['first_query'] = cursor_query(self.request, None)
+        context['cities'] = ReferenceData.cities()
+        context['session_types'] = ReferenceData.session_types()
+        context['days_of_week'] = TrainerAvailability.DAYS_OF_WEEK
+        
+        # The facet total doubles as the result count, so no separate COUNT(*) is needed
+        facets = TrainerFacetService.get_facets(**_facet_params(self.request))
+        context['facets'] = facets
+        context['total_trainers'] = facets['total']
+        context['city_facets'] = [
+            {'name': city.name, 'count': facets['cities'].get(city.code.casefold(), 0)}
+            for city in context['cities']
+        ]
+        context['specialty_facets'] = [
+            {'id': session_type.id, 'name': session_type.name,
+             'count': facets['specialties'].get(str(session_type.id), 0)}
+            for session_type in context['session_types']
+        ]
         return context
 
 
+def _facet_params(request):
+    return {
+        'city': request.GET.get('city'),
+        'specialty': request.GET.get('specialty'),
+        'min_price': request.GET.get('min_price'),
+        'max_price': request.GET.get('max_price'),
+        'day': request.GET.get('day'),
+        'start_time': request.GET.get('from'),
+        'end_time': request.GET.get('to'),
+    }
+
+
+def trainer_facets_view(request):
+    """Facet counts for the trainer directory as JSON"""
+    return JsonResponse(TrainerFacetService.get_facets(**_facet_params(request)))
+
+
 class TrainerDetailView(TemplateView):
     template_name = 'trainer_detail.html'
     
@@ -78,11 +124,26 @@ class TrainerDetailView(TemplateView):
         context = super().get_context_data(**kwargs)
         trainer_id = self.kwargs.get('trainer_id')
         try:
-            context['trainer'] = Trainer.objects.get(id=trainer_id)
-            context['reviews'] = context['trainer'].reviews.all()
-            context['certificates'] = context['trainer'].user.certificates.all()
+            trainer = Trainer.objects.select_related('user', 'rating_histogram').get(id=trainer_id)
         except Trainer.DoesNotExist:
             context['trainer'] = None
+            return context
+        
+        # Reviews paged by keyset on created_at so popular trainers render in constant time
+        reviews_page = KeysetPaginator(
+            trainer.reviews.select_related('client'), ('-created_at', '-id'), per_page=10
+        ).get_page(self.request.GET.get('reviews_cursor'))
+        
+        try:
+            histogram = trainer.rating_histogram
+        except TrainerRatingHistogram.DoesNotExist:
+            histogram = TrainerRatingHistogram(trainer=trainer)
+        
+        context['trainer'] = trainer
+        context['reviews'] = reviews_page
+        context['reviews_next_cursor'] = reviews_page.next_cursor
+        context['rating_distribution'] = histogram.distribution()
+        context['certificates'] = trainer.user.certificates.all()
         return context
 
 
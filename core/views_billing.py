@@ -1,14 +1,16 @@
 """
 Views for subscription pricing page and club/gym organization pages
 """
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, TemplateView
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
 from payments.models import SubscriptionPlan, Organization
+from payments.search import OrganizationSearchService
 from trainers.models import Trainer
-from bookings.models import Booking, Review
 from decimal import Decimal
+from .pagination import KeysetPaginator, cursor_query
+from .services import ClubPageCache
 
 
 class SubscriptionPricingView(TemplateView):
@@ -53,20 +55,18 @@ class ClubListView(ListView):
     def get_queryset(self):
         queryset = Organization.objects.filter(is_active=True).select_related('owner')
         
-        # Search functionality
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(city__icontains=search) |
-                Q(description__icontains=search)
-            )
-        
         # City filter
         city = self.request.GET.get('city')
         if city:
             queryset = queryset.filter(city=city)
         
+        # Ranked token search
+        search = self.request.GET.get('search')
+        if search:
+            return OrganizationSearchService.search(queryset, search).order_by(
+                *OrganizationSearchService.RANKED_ORDERING
+            )
+        
         return queryset.order_by('-created_at')
     
     def get_context_data(self, **kwargs):
@@ -99,47 +99,11 @@ class ClubDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        club = self.get_object()
+        club = self.object
         
-        # Get trainers in this club via OrganizationInvitation acceptance
-        club_trainers = club.trainer_subscriptions.filter(
-            organization=club, trainer_subscription__is_active=True
-        ).select_related(
-            'trainer', 'trainer__trainer_profile'
-        )
-        
-        # Get trainer profiles with ratings and reviews
-        trainer_profiles = []
-        for sub in club_trainers:
-            try:
-                profile = sub.trainer.trainer_profile
-                # Get average rating and review count
-                reviews = Review.objects.filter(trainer=profile)
-                avg_rating = reviews.aggregate(models.Avg('rating'))['rating__avg'] or 0
-                review_count = reviews.count()
-                
-                trainer_profiles.append({
-                    'profile': profile,
-                    'user': sub.trainer,
-                    'subscription': sub,
-                    'avg_rating': avg_rating,
-                    'review_count': review_count,
-                })
-            except:
-                continue
-        
-        # Get club reviews/ratings
-        club_bookings = Booking.objects.filter(
-            trainer__trainers__in=[p['profile'] for p in trainer_profiles],
-            status='completed'
-        )
-        
-        context.update({
-            'trainers': trainer_profiles,
-            'club_bookings_count': club_bookings.count(),
-            'total_trainers': len(trainer_profiles),
-            'page_title': f'{club.name} - نادي',
-        })
+        # Trainers with ratings come from one annotated query, cached per club
+        context.update(ClubPageCache.get_context(club))
+        context['page_title'] = f'{club.name} - نادي'
         
         return context
     
@@ -193,75 +157,56 @@ def clubs_directory_view(request):
     """Display clubs directory with search and filter"""
     clubs = Organization.objects.filter(is_active=True).select_related('owner')
     
-    # Search
-    search = request.GET.get('search', '')
-    if search:
-        clubs = clubs.filter(
-            Q(name__icontains=search) | 
-            Q(city__icontains=search) |
-            Q(description__icontains=search)
-        )
-    
     # City filter
     city = request.GET.get('city', '')
     if city:
         clubs = clubs.filter(city=city)
     
+    # Ranked token search; best matches first, newest first among equal ranks
+    search = request.GET.get('search', '')
+    ordering = ('-created_at', '-id')
+    if search:
+        clubs = OrganizationSearchService.search(clubs, search)
+        ordering = OrganizationSearchService.RANKED_ORDERING
+    
     # Get unique cities
     cities = Organization.objects.filter(is_active=True).values_list(
         'city', flat=True
     ).distinct().exclude(city='')
     
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(clubs, 12)
-    page_number = request.GET.get('page', 1)
-    clubs_page = paginator.get_page(page_number)
+    # Keyset pagination: seeks past the last club instead of OFFSET + COUNT(*)
+    clubs_page = KeysetPaginator(clubs, ordering, per_page=12).get_page(
+        request.GET.get('cursor'), with_count=request.GET.get('count') == '1'
+    )
     
     context = {
         'clubs': clubs_page,
         'cities': sorted(cities),
         'search_query': search,
         'selected_city': city,
+        'next_cursor': clubs_page.next_cursor,
+        'next_query': cursor_query(request, clubs_page.next_cursor),
+        'first_query': cursor_query(request, None),
+        'total_clubs': clubs_page.count,
     }
     
     return render(request, 'clubs_directory.html', context)
 
 
+def club_autocomplete_view(request):
+    """Club name suggestions for the directory search box as JSON"""
+    return JsonResponse({'results': OrganizationSearchService.autocomplete(request.GET.get('q', ''))})
+
+
 def club_detail_view(request, club_id):
     """Display detailed club/gym page"""
-    club = get_object_or_404(Organization, id=club_id, is_active=True)
-    
-    # Get trainers in club
-    from django.db import models
-    club_trainers = club.trainer_subscriptions.filter(
-        is_active=True
-    ).select_related('trainer', 'trainer__trainer_profile')
-    
-    trainer_profiles = []
-    for sub in club_trainers:
-        try:
-            profile = sub.trainer.trainer_profile
-            reviews = Review.objects.filter(trainer=profile)
-            avg_rating = reviews.aggregate(models.Avg('rating'))['rating__avg'] or 0
-            
-            trainer_profiles.append({
-                'profile': profile,
-                'user': sub.trainer,
-                'avg_rating': avg_rating,
-                'review_count': reviews.count(),
-            })
-        except:
-            continue
+    club = get_object_or_404(
+        Organization.objects.select_related('subscription_plan'), id=club_id, is_active=True
+    )
     
     context = {
         'club': club,
-        'trainers': trainer_profiles,
-        'total_trainers': len(trainer_profiles),
+        **ClubPageCache.get_context(club),
     }
     
     return render(request, 'club_detail.html', context)
-
-
-# Import models at end to avoid circular imports
-from django.db import models
@@ -0,0 +1,67 @@
+"""
+Django management command to rebuild the daily trainer/organization rollups from booking history
+Usage: python manage.py backfill_daily_stats [--batch-size 1000]
+"""
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, Count, F, Q
+from bookings.models import Booking
+from dashboard.models import TrainerDailyStats, OrganizationDailyStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild TrainerDailyStats and OrganizationDailyStats from booking history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            TrainerDailyStats.objects.all().delete()
+            OrganizationDailyStats.objects.all().delete()
+
+            trainer_rows = [
+                TrainerDailyStats(trainer_id=row['trainer'], date=row['day'], **self._values(row))
+                for row in self._grouped('trainer')
+            ]
+            TrainerDailyStats.objects.bulk_create(trainer_rows, batch_size=batch_size)
+
+            org_rows = [
+                OrganizationDailyStats(organization_id=row['organization'], date=row['day'], **self._values(row))
+                for row in self._grouped('organization')
+            ]
+            OrganizationDailyStats.objects.bulk_create(org_rows, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rebuilt {len(trainer_rows)} trainer and {len(org_rows)} organization daily rows'
+        ))
+
+    @staticmethod
+    def _grouped(key):
+        """Completed/cancelled bookings grouped by key and booking date, matching DailyStatsService"""
+        completed = Q(status='completed')
+        return Booking.objects.filter(
+            status__in=('completed', 'cancelled'),
+            **{f'{key}__isnull': False}
+        ).annotate(
+            day=F('booking_date')
+        ).values(key, 'day').annotate(
+            sessions=Count('id', filter=completed),
+            cancellations=Count('id', filter=Q(status='cancelled')),
+            revenue=Sum('total_price', filter=completed),
+            commission=Sum('commission_amount', filter=completed),
+            trainer_earnings=Sum('trainer_earnings', filter=completed),
+        ).order_by()
+
+    @staticmethod
+    def _values(row):
+        return {
+            'sessions': row['sessions'],
+            'cancellations': row['cancellations'],
+            'revenue': row['revenue'] or Decimal('0'),
+            'commission': row['commission'] or Decimal('0'),
+            'trainer_earnings': row['trainer_earnings'] or Decimal('0'),
+        }
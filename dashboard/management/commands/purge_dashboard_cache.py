@@ -0,0 +1,23 @@
+"""
+Django management command to delete expired dashboard cache rows
+Usage: python manage.py purge_dashboard_cache [--all]
+"""
+from django.core.management.base import BaseCommand
+from dashboard.models import DashboardCache
+from dashboard.services import DashboardCacheService
+
+
+class Command(BaseCommand):
+    help = 'Delete expired DashboardCache rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Delete every row, not only expired ones')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            deleted = DashboardCache.objects.count()
+            DashboardCacheService.invalidate_prefix('')
+        else:
+            deleted = DashboardCacheService.purge_expired()
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Deleted {deleted} dashboard cache rows'))
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('payments', '0002_subscriptionplan_paymentgatewayconfig_secret_key_and_more'),
+        ('trainers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sessions', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('commission', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('trainer_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='payments.organization')),
+            ],
+            options={
+                'verbose_name': 'إحصائيات المنظمة اليومية',
+                'verbose_name_plural': 'إحصائيات المنظمات اليومية',
+                'ordering': ['-date'],
+                'unique_together': {('organization', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TrainerDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sessions', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('commission', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('trainer_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='trainers.trainer')),
+            ],
+            options={
+                'verbose_name': 'إحصائيات المدرب اليومية',
+                'verbose_name_plural': 'إحصائيات المدربين اليومية',
+                'ordering': ['-date'],
+                'unique_together': {('trainer', 'date')},
+            },
+        ),
+    ]
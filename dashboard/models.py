@@ -16,3 +16,45 @@ class DashboardCache(models.Model):
     
     def __str__(self):
         return self.cache_key
+
+
+class TrainerDailyStats(models.Model):
+    """Daily rollup of completed/cancelled sessions and earnings per trainer"""
+    trainer = models.ForeignKey('trainers.Trainer', on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    sessions = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    commission = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    trainer_earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'إحصائيات المدرب اليومية'
+        verbose_name_plural = 'إحصائيات المدربين اليومية'
+        unique_together = ('trainer', 'date')
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.trainer_id} - {self.date}"
+
+
+class OrganizationDailyStats(models.Model):
+    """Daily rollup of completed/cancelled sessions and earnings per organization"""
+    organization = models.ForeignKey('payments.Organization', on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    sessions = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    commission = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    trainer_earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'إحصائيات المنظمة اليومية'
+        verbose_name_plural = 'إحصائيات المنظمات اليومية'
+        unique_together = ('organization', 'date')
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.organization_id} - {self.date}"
@@ -0,0 +1,248 @@
+"""
+Dashboard analytics services
+"""
+import threading
+import time
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import DashboardCache, TrainerDailyStats, OrganizationDailyStats
+
+
+class DailyStatsService:
+    """Service for keeping the daily trainer/organization rollups up to date
+
+    A booking always counts on its booking_date, which later saves do not
+    move, so a contribution is removed from the same row it was added to.
+    """
+
+    TRACKED_STATUSES = ('completed', 'cancelled')
+
+    @staticmethod
+    def snapshot(booking):
+        """Rollup contribution of a booking, or None if its status is not tracked"""
+        if booking.status not in DailyStatsService.TRACKED_STATUSES:
+            return None
+        return {
+            'status': booking.status,
+            'trainer_id': booking.trainer_id,
+            'organization_id': booking.organization_id,
+            'date': booking.booking_date,
+            'total_price': booking.total_price or Decimal('0'),
+            'commission_amount': booking.commission_amount or Decimal('0'),
+            'trainer_earnings': booking.trainer_earnings or Decimal('0'),
+        }
+
+    @staticmethod
+    def load_snapshot(booking_id):
+        """Rollup contribution of a booking as currently stored in the database"""
+        from bookings.models import Booking
+
+        booking = Booking.objects.filter(pk=booking_id).only(
+            'status', 'trainer_id', 'organization_id', 'booking_date',
+            'total_price', 'commission_amount', 'trainer_earnings'
+        ).first()
+        return DailyStatsService.snapshot(booking) if booking else None
+
+    @staticmethod
+    def record_transition(old, new):
+        """Apply the difference between two booking snapshots to the rollups"""
+        if old is None and new is None:
+            return
+
+        with transaction.atomic():
+            same_row = (
+                old is not None and new is not None
+                and old['status'] == new['status']
+                and old['trainer_id'] == new['trainer_id']
+                and old['organization_id'] == new['organization_id']
+                and old['date'] == new['date']
+            )
+            if same_row:
+                # Still completed/cancelled on the same row: only amounts may move
+                if old['status'] == 'completed':
+                    DailyStatsService._apply(old['trainer_id'], old['organization_id'], old['date'], {
+                        'revenue': new['total_price'] - old['total_price'],
+                        'commission': new['commission_amount'] - old['commission_amount'],
+                        'trainer_earnings': new['trainer_earnings'] - old['trainer_earnings'],
+                    }, create=False)
+                return
+
+            if old is not None:
+                DailyStatsService._apply_snapshot(old, sign=-1)
+            if new is not None:
+                DailyStatsService._apply_snapshot(new, sign=1)
+
+    @staticmethod
+    def _apply_snapshot(snapshot, sign):
+        if snapshot['status'] == 'completed':
+            deltas = {
+                'sessions': sign,
+                'revenue': sign * snapshot['total_price'],
+                'commission': sign * snapshot['commission_amount'],
+                'trainer_earnings': sign * snapshot['trainer_earnings'],
+            }
+        else:
+            deltas = {'cancellations': sign}
+        DailyStatsService._apply(
+            snapshot['trainer_id'], snapshot['organization_id'], snapshot['date'], deltas, create=sign > 0
+        )
+
+    @staticmethod
+    def _apply(trainer_id, organization_id, date, deltas, create=True):
+        """Add deltas to the trainer (and organization) rows for a day using F() expressions
+
+        Rows are only created when adding a contribution; removals touch existing rows
+        so cascading deletes never resurrect stats for a trainer being deleted.
+        """
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
+        updates = {field: F(field) + value for field, value in deltas.items()}
+
+        targets = [(TrainerDailyStats, {'trainer_id': trainer_id, 'date': date})]
+        if organization_id:
+            targets.append((OrganizationDailyStats, {'organization_id': organization_id, 'date': date}))
+
+        for model, lookup in targets:
+            if create:
+                model.objects.get_or_create(**lookup)
+            model.objects.filter(**lookup).update(**updates)
+
+
+class DashboardCacheService:
+    """Read-through cache backed by DashboardCache, with an optional Django cache tier in front
+
+    Cached values must be JSON-serializable. Keys are namespaced by owner
+    (``trainer:<id>:...``, ``client:<id>:...``) so a booking or review change
+    can drop everything computed for the people involved.
+    """
+
+    # Striped so the pool stays a fixed size; unrelated keys may share a lock, so the
+    # locks are re-entrant in case a compute callback caches another key itself
+    _locks = tuple(threading.RLock() for _ in range(64))
+
+    @staticmethod
+    def _settings():
+        return getattr(settings, 'DASHBOARD_CACHE_SETTINGS', {})
+
+    @staticmethod
+    def _backend():
+        """Django cache used as the fast tier, or None when only the table is used"""
+        alias = DashboardCacheService._settings().get('CACHE_ALIAS')
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def default_ttl():
+        return DashboardCacheService._settings().get('DEFAULT_TTL', 300)
+
+    @staticmethod
+    def trainer_key(trainer_id, name):
+        return f"trainer:{trainer_id}:{name}"
+
+    @staticmethod
+    def client_key(user_id, name):
+        return f"client:{user_id}:{name}"
+
+    @staticmethod
+    def get(key):
+        """Return (hit, value) from the fastest tier holding a live entry"""
+        backend = DashboardCacheService._backend()
+        if backend is not None:
+            value = backend.get(key, DashboardCacheService)
+            if value is not DashboardCacheService:
+                return True, value
+
+        entry = DashboardCache.objects.filter(
+            cache_key=key, expires_at__gt=timezone.now()
+        ).values('cache_value', 'expires_at').first()
+        if entry is None:
+            return False, None
+
+        if backend is not None:
+            remaining = (entry['expires_at'] - timezone.now()).total_seconds()
+            if remaining > 0:
+                backend.set(key, entry['cache_value'], int(remaining))
+        return True, entry['cache_value']
+
+    @staticmethod
+    def set(key, value, ttl):
+        """Store a value in both tiers for ttl seconds"""
+        DashboardCache.objects.update_or_create(
+            cache_key=key,
+            defaults={'cache_value': value, 'expires_at': timezone.now() + timedelta(seconds=ttl)}
+        )
+        backend = DashboardCacheService._backend()
+        if backend is not None:
+            backend.set(key, value, ttl)
+
+    @staticmethod
+    def get_or_compute(key, ttl, fn):
+        """Return the cached value for key, computing and storing it with fn() on a miss
+
+        Only one caller per key recomputes at a time: threads in this process
+        share a per-key lock, and processes coordinate through an ``add()``
+        lock on the Django cache tier when one is configured.
+        """
+        hit, value = DashboardCacheService.get(key)
+        if hit:
+            return value
+
+        with DashboardCacheService._key_lock(key):
+            hit, value = DashboardCacheService.get(key)
+            if hit:
+                return value
+
+            backend = DashboardCacheService._backend()
+            lock_key = f"lock:{key}"
+            lock_timeout = DashboardCacheService._settings().get('LOCK_TIMEOUT', 30)
+            if backend is not None and not backend.add(lock_key, 1, lock_timeout):
+                # Another process is recomputing; wait for its result before giving up
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    hit, value = DashboardCacheService.get(key)
+                    if hit:
+                        return value
+                return fn()
+
+            try:
+                value = fn()
+                DashboardCacheService.set(key, value, ttl)
+            finally:
+                if backend is not None:
+                    backend.delete(lock_key)
+            return value
+
+    @staticmethod
+    def invalidate_prefix(prefix):
+        """Drop every entry whose key starts with prefix from both tiers"""
+        entries = DashboardCache.objects.filter(cache_key__startswith=prefix)
+        backend = DashboardCacheService._backend()
+        if backend is not None:
+            backend.delete_many(list(entries.values_list('cache_key', flat=True)))
+        entries.delete()
+
+    @staticmethod
+    def invalidate_trainer(trainer_id):
+        DashboardCacheService.invalidate_prefix(f"trainer:{trainer_id}:")
+
+    @staticmethod
+    def invalidate_client(user_id):
+        DashboardCacheService.invalidate_prefix(f"client:{user_id}:")
+
+    @staticmethod
+    def purge_expired():
+        """Delete expired rows; returns the number removed"""
+        deleted, _ = DashboardCache.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+    @staticmethod
+    def _key_lock(key):
+        locks = DashboardCacheService._locks
+        return locks[zlib.crc32(key.encode()) % len(locks)]
@@ -0,0 +1,43 @@
+"""
+Signal handlers keeping dashboard rollups and cached statistics in sync with bookings
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from bookings.models import Booking, Review
+from .services import DailyStatsService, DashboardCacheService
+
+
+@receiver(pre_save, sender=Booking)
+def capture_booking_stats(sender, instance, raw=False, **kwargs):
+    """Remember the stored contribution before the booking is overwritten"""
+    if raw:
+        return
+    instance._daily_stats_snapshot = DailyStatsService.load_snapshot(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_stats(sender, instance, raw=False, **kwargs):
+    """Move the booking's contribution between rollup rows on status changes"""
+    if raw:
+        return
+    old = getattr(instance, '_daily_stats_snapshot', None)
+    instance._daily_stats_snapshot = None
+    DailyStatsService.record_transition(old, DailyStatsService.snapshot(instance))
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_stats(sender, instance, **kwargs):
+    """Drop a deleted booking's contribution from the rollups"""
+    DailyStatsService.record_transition(DailyStatsService.snapshot(instance), None)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_dashboard_cache(sender, instance, raw=False, **kwargs):
+    """Drop cached dashboard statistics for the trainer and client involved"""
+    if raw:
+        return
+    DashboardCacheService.invalidate_trainer(instance.trainer_id)
+    DashboardCacheService.invalidate_client(instance.client_id)
@@ -1,3 +1,166 @@
-from django.test import TestCase
+import io
+from datetime import time, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from bookings.models import Booking
+from payments.models import Organization
+from trainers.models import Trainer
+from .models import DashboardCache, OrganizationDailyStats, TrainerDailyStats
+from .services import DashboardCacheService
 
-# Create your tests here.
+User = get_user_model()
+
+
+class DailyStatsTests(TestCase):
+    """Rollup rows follow booking status transitions and deletes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='coach', password='pass12345', user_type='trainer')
+        cls.trainer = Trainer.objects.create(user=user, price_per_hour=Decimal('200'))
+        cls.client_user = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        cls.organization = Organization.objects.create(name='Atlas Gym', owner=cls.client_user)
+
+    def book(self, status='pending', hour=10):
+        return Booking.objects.create(
+            client=self.client_user, trainer=self.trainer, organization=self.organization,
+            booking_date=timezone.now().date() - timedelta(days=1), start_time=time(hour), duration_minutes=60,
+            status=status, total_price=Decimal('200'), commission_amount=Decimal('30'),
+            trainer_earnings=Decimal('170'),
+        )
+
+    def stats(self, model=TrainerDailyStats):
+        row = model.objects.filter(date=timezone.now().date() - timedelta(days=1)).values(
+            'sessions', 'cancellations', 'revenue', 'commission', 'trainer_earnings'
+        ).first()
+        return row or {'sessions': 0, 'cancellations': 0, 'revenue': 0, 'commission': 0, 'trainer_earnings': 0}
+
+    def test_pending_bookings_are_not_counted(self):
+        self.book()
+        self.assertEqual(self.stats()['sessions'], 0)
+        self.assertFalse(TrainerDailyStats.objects.exists())
+
+    def test_completion_and_cancellation(self):
+        booking = self.book()
+        booking.status = 'completed'
+        booking.save()
+        for model in (TrainerDailyStats, OrganizationDailyStats):
+            self.assertEqual(self.stats(model), {
+                'sessions': 1, 'cancellations': 0, 'revenue': Decimal('200'),
+                'commission': Decimal('30'), 'trainer_earnings': Decimal('170'),
+            })
+
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(self.stats(), {
+            'sessions': 0, 'cancellations': 1, 'revenue': 0, 'commission': 0, 'trainer_earnings': 0,
+        })
+
+    def test_later_saves_keep_the_booking_on_its_row(self):
+        booking = self.book()
+        booking.status = 'completed'
+        booking.save()
+        later = timezone.now() + timedelta(days=3)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            booking.notes = 'Edited'
+            booking.save()
+            booking.status = 'cancelled'
+            booking.save()
+
+        rows = list(TrainerDailyStats.objects.values_list('date', 'sessions', 'cancellations', 'revenue'))
+        self.assertEqual(rows, [(booking.booking_date, 0, 1, Decimal('0'))])
+
+    def test_amount_edit_on_completed_booking(self):
+        booking = self.book(status='completed')
+        booking.commission_amount = Decimal('20')
+        booking.trainer_earnings = Decimal('180')
+        booking.save()
+        stats = self.stats()
+        self.assertEqual((stats['sessions'], stats['commission'], stats['trainer_earnings']),
+                         (1, Decimal('20'), Decimal('180')))
+
+    def test_delete_removes_contribution(self):
+        completed = self.book(status='completed')
+        cancelled = self.book(status='cancelled', hour=12)
+        completed.delete()
+        cancelled.delete()
+        self.assertEqual(self.stats(), {
+            'sessions': 0, 'cancellations': 0, 'revenue': 0, 'commission': 0, 'trainer_earnings': 0,
+        })
+
+    def test_backfill_matches_incremental_rows(self):
+        self.book(status='completed')
+        self.book(status='completed', hour=12)
+        self.book(status='cancelled', hour=14)
+        self.book(hour=16)
+        incremental = (self.stats(), self.stats(OrganizationDailyStats))
+
+        TrainerDailyStats.objects.all().delete()
+        OrganizationDailyStats.objects.all().delete()
+        call_command('backfill_daily_stats', stdout=io.StringIO())
+        self.assertEqual((self.stats(), self.stats(OrganizationDailyStats)), incremental)
+
+
+class DashboardCacheTests(TestCase):
+    """Read-through behaviour, expiry and invalidation of DashboardCacheService"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='coach', password='pass12345', user_type='trainer')
+        self.trainer = Trainer.objects.create(user=user, price_per_hour=Decimal('200'))
+        self.client_user = User.objects.create_user(username='client', password='pass12345', user_type='client')
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {'calls': self.calls}
+
+    def cached(self, key):
+        return DashboardCacheService.get_or_compute(key, 60, self.compute)
+
+    def test_computed_once_until_expiry(self):
+        key = DashboardCacheService.trainer_key(self.trainer.id, 'stats')
+        self.assertEqual(self.cached(key), {'calls': 1})
+        self.assertEqual(self.cached(key), {'calls': 1})
+
+        DashboardCache.objects.filter(cache_key=key).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.cached(key), {'calls': 2})
+
+    def test_purge_expired(self):
+        DashboardCacheService.set('trainer:1:old', 1, 60)
+        DashboardCacheService.set('trainer:1:new', 2, 60)
+        DashboardCache.objects.filter(cache_key='trainer:1:old').update(expires_at=timezone.now())
+        self.assertEqual(DashboardCacheService.purge_expired(), 1)
+        self.assertEqual(list(DashboardCache.objects.values_list('cache_key', flat=True)), ['trainer:1:new'])
+
+    def test_booking_change_drops_trainer_and_client_entries(self):
+        trainer_key = DashboardCacheService.trainer_key(self.trainer.id, 'stats')
+        client_key = DashboardCacheService.client_key(self.client_user.id, 'stats')
+        other_key = DashboardCacheService.trainer_key(self.trainer.id + 1, 'stats')
+        for key in (trainer_key, client_key, other_key):
+            self.cached(key)
+
+        Booking.objects.create(
+            client=self.client_user, trainer=self.trainer, booking_date=timezone.now().date(),
+            start_time=time(10), duration_minutes=60, total_price=Decimal('200'),
+        )
+        self.assertEqual(DashboardCacheService.get(trainer_key), (False, None))
+        self.assertEqual(DashboardCacheService.get(client_key), (False, None))
+        self.assertEqual(DashboardCacheService.get(other_key), (True, {'calls': 3}))
+
+    @override_settings(DASHBOARD_CACHE_SETTINGS={'CACHE_ALIAS': 'default', 'DEFAULT_TTL': 300, 'LOCK_TIMEOUT': 1})
+    def test_cache_tier_in_front_of_table(self):
+        key = DashboardCacheService.trainer_key(self.trainer.id, 'stats')
+        self.cached(key)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cached(key), {'calls': 1})
+
+        # Dropped from both tiers, not just the table
+        DashboardCacheService.invalidate_trainer(self.trainer.id)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(self.cached(key), {'calls': 2})
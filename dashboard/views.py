@@ -1,11 +1,35 @@
+from decimal import Decimal
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, Count, Q
-from datetime import timedelta
 from django.utils import timezone
 from bookings.models import Booking, Review
+from bookings.services import EarningsService
 from clients.models import ClientProfile, ClientProgress
 from trainers.models import Trainer
+from .services import DashboardCacheService
+
+
+def _client_dashboard_stats(user):
+    """JSON-serializable client statistics for the dashboard cache"""
+    stats = Booking.objects.filter(client=user).aggregate(
+        total_sessions=Count('id', filter=Q(status='completed')),
+        total_spent=Sum('total_price'),
+    )
+    return {
+        'total_sessions': stats['total_sessions'],
+        'total_spent': str(stats['total_spent'] or 0),
+    }
+
+
+def _trainer_dashboard_stats(trainer):
+    """JSON-serializable trainer statistics for the dashboard cache"""
+    stats = EarningsService.get_trainer_stats(trainer)
+    return {
+        'total_sessions': stats['total_sessions'],
+        'total_earnings': str(stats['total_earnings']),
+        'monthly_earnings': str(stats['monthly_earnings']),
+    }
 
 
 @login_required
@@ -30,11 +54,14 @@ def client_dashboard_view(request):
         status='completed'
     ).order_by('-booking_date')[:5]
     
-    # Statistics
-    total_sessions = Booking.objects.filter(client=request.user, status='completed').count()
-    total_spent = Booking.objects.filter(client=request.user).aggregate(
-        total=Sum('total_price')
-    )['total'] or 0
+    # Statistics (cached until the client's bookings or reviews change)
+    stats = DashboardCacheService.get_or_compute(
+        DashboardCacheService.client_key(request.user.id, 'dashboard_stats'),
+        DashboardCacheService.default_ttl(),
+        lambda: _client_dashboard_stats(request.user)
+    )
+    total_sessions = stats['total_sessions']
+    total_spent = Decimal(stats['total_spent'])
     
     # Progress
     progress_records = ClientProgress.objects.filter(client=client_profile).order_by('-date')[:10]
@@ -76,32 +103,25 @@ def trainer_dashboard_view(request):
         status='completed'
     ).order_by('-booking_date')[:5]
     
-    # Statistics
-    total_sessions = Booking.objects.filter(trainer=trainer, status='completed').count()
-    total_earnings = Booking.objects.filter(trainer=trainer, status='completed').aggregate(
-        total=Sum('total_price')
-    )['total'] or 0
+    # Statistics (cached until the trainer's bookings or reviews change)
+    stats = DashboardCacheService.get_or_compute(
+        DashboardCacheService.trainer_key(trainer.id, 'dashboard_stats'),
+        DashboardCacheService.default_ttl(),
+        lambda: _trainer_dashboard_stats(trainer)
+    )
     
     # Reviews
     reviews = Review.objects.filter(trainer=trainer).order_by('-created_at')[:5]
     avg_rating = trainer.rating
     total_reviews = trainer.total_reviews
     
-    # Monthly earnings (last 30 days)
-    thirty_days_ago = timezone.now().date() - timedelta(days=30)
-    monthly_earnings = Booking.objects.filter(
-        trainer=trainer,
-        status='completed',
-        updated_at__date__gte=thirty_days_ago
-    ).aggregate(total=Sum('total_price'))['total'] or 0
-    
     context = {
         'trainer': trainer,
         'upcoming_bookings': upcoming_bookings,
         'completed_bookings': completed_bookings,
-        'total_sessions': total_sessions,
-        'total_earnings': total_earnings,
-        'monthly_earnings': monthly_earnings,
+        'total_sessions': stats['total_sessions'],
+        'total_earnings': Decimal(stats['total_earnings']),
+        'monthly_earnings': Decimal(stats['monthly_earnings']),
         'reviews': reviews,
         'avg_rating': avg_rating,
         'total_reviews': total_reviews,
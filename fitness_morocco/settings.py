@@ -136,6 +136,7 @@ DATABASES = {
 }
 
 
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -178,6 +179,9 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rendered invoice PDFs (private, never served from MEDIA_URL)
+INVOICE_PDF_CACHE_DIR = os.environ.get('INVOICE_PDF_CACHE_DIR') or str(BASE_DIR / 'var' / 'invoice_pdfs')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -263,4 +267,31 @@ BILLING_SETTINGS = {
     'TRIAL_DAYS': 14,
     'INVOICE_DUE_DAYS': 30,
     'FAILED_PAYMENT_RETRIES': 3,
-}
\ No newline at end of file
+}
+
+# Shared cache. Version stamps, cached pages and commission rates are invalidated
+# through it, so production sets REDIS_URL to share it between workers. Without it
+# each process keeps its own LocMemCache and only entry TTLs bound staleness.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'fitmo',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fitness-cache',
+        }
+    }
+
+# Dashboard statistics cache (DashboardCache table, optionally fronted by a Django cache alias)
+DASHBOARD_CACHE_SETTINGS = {
+    'CACHE_ALIAS': os.environ.get('DASHBOARD_CACHE_ALIAS') or None,  # e.g. 'default'
+    'DEFAULT_TTL': 300,  # seconds
+    'LOCK_TIMEOUT': 30,  # seconds a recompute may hold the per-key lock
+}
@@ -144,6 +144,9 @@ else:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rendered invoice PDFs; the deployed bundle is read-only, /tmp is the writable scratch space
+INVOICE_PDF_CACHE_DIR = os.getenv('INVOICE_PDF_CACHE_DIR') or '/tmp/invoice_pdfs'
+
 # Default primary key
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -170,16 +173,27 @@ LOGGING = {
     },
 }
 
-# Cache configuration (minimal)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'fitness-cache',
-        'OPTIONS': {
-            'MAX_ENTRIES': 100
+# Cache configuration: shared Redis when REDIS_URL is set (required for
+# cross-instance invalidation), otherwise a small per-instance cache
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'fitmo',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fitness-cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 100
+            }
         }
     }
-}
 
 # Session configuration
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
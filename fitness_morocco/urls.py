@@ -8,7 +8,9 @@ from django.conf.urls.static import static
 from django.views.generic import TemplateView
 
 # Core views
-from core.views import HomeView, TrainerListView, TrainerDetailView, contact_view, client_progress
+from core.views import (
+    HomeView, TrainerListView, TrainerDetailView, contact_view, client_progress, trainer_facets_view
+)
 
 # Authentication views
 from authentication.views import (
@@ -18,7 +20,7 @@ from authentication.views import (
 
 # Bookings views
 from bookings.views import (
-    booking_view, booking_confirmation_view, booking_success_view,
+    booking_view, booking_slots_view, booking_confirmation_view, booking_success_view,
     booking_list_view, add_review_view
 )
 
@@ -32,7 +34,7 @@ from trainers.views import (
 )
 
 # Billing views
-from core.views_billing import pricing_view, clubs_directory_view, club_detail_view
+from core.views_billing import pricing_view, clubs_directory_view, club_detail_view, club_autocomplete_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -40,6 +42,7 @@ urlpatterns = [
     # Core URLs
     path('', HomeView.as_view(), name='home'),
     path('trainers/', TrainerListView.as_view(), name='trainers'),
+    path('trainers/facets/', trainer_facets_view, name='trainer_facets'),
     path('trainer/<int:trainer_id>/', TrainerDetailView.as_view(), name='trainer_detail'),
     path('contact/', contact_view, name='contact'),
     
@@ -58,6 +61,7 @@ urlpatterns = [
     
     # Bookings URLs
     path('booking/<int:trainer_id>/', booking_view, name='booking'),
+    path('booking/<int:trainer_id>/slots/', booking_slots_view, name='booking_slots'),
     path('booking/<int:booking_id>/confirmation/', booking_confirmation_view, name='booking_confirmation'),
     path('booking/<int:booking_id>/success/', booking_success_view, name='booking_success'),
     path('bookings/', booking_list_view, name='booking_list'),
@@ -80,6 +84,7 @@ urlpatterns = [
     # Pricing and Subscription URLs
     path('pricing/', pricing_view, name='pricing'),
     path('clubs/', clubs_directory_view, name='clubs_directory'),
+    path('clubs/autocomplete/', club_autocomplete_view, name='club_autocomplete'),
     path('club/<uuid:club_id>/', club_detail_view, name='club_detail'),
     
     # API URLs
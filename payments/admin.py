@@ -2,8 +2,9 @@ from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
     PaymentGatewayConfig, SubscriptionPlan, Organization, TrainerSubscription,
-    BillingSubscription, Invoice, OrganizationInvitation, SeatOverage
+    BillingSubscription, Invoice, OrganizationInvitation, SeatOverage, StripePrice, WebhookEvent
 )
+from .services import CommissionService
 
 
 @admin.register(PaymentGatewayConfig)
@@ -53,6 +54,11 @@ class SubscriptionPlanAdmin(admin.ModelAdmin):
         }),
     )
     readonly_fields = ('created_at', 'updated_at')
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'commission_rate' in form.changed_data:
+            CommissionService.recalculate_for_plan(obj)
 
 
 @admin.register(Organization)
@@ -246,3 +252,18 @@ class SeatOverageAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(StripePrice)
+class StripePriceAdmin(admin.ModelAdmin):
+    list_display = ('plan', 'billing_period', 'unit_amount', 'currency', 'stripe_price_id', 'is_active')
+    list_filter = ('billing_period', 'is_active', 'plan')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'event_type', 'status', 'attempts', 'next_attempt_at', 'received_at')
+    list_filter = ('status', 'event_type', 'provider')
+    search_fields = ('event_id',)
+    readonly_fields = ('received_at', 'processed_at')
@@ -0,0 +1,253 @@
+"""
+Invoice PDF rendering, on-disk caching and streaming exports
+"""
+import re
+import unicodedata
+import zipfile
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse
+
+CHUNK_SIZE = 64 * 1024
+
+# Arabic letters to Latin (simplified ISO 233) for the Latin-1 base fonts; harakat and tatweel dropped
+ARABIC_TRANSLITERATION = str.maketrans({
+    'ا': 'a', 'أ': 'a', 'إ': 'i', 'آ': 'aa', 'ٱ': 'a', 'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'j',
+    'ح': 'h', 'خ': 'kh', 'د': 'd', 'ذ': 'dh', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's',
+    'ض': 'd', 'ط': 't', 'ظ': 'z', 'ع': "'", 'غ': 'gh', 'ف': 'f', 'ق': 'q', 'ك': 'k', 'ل': 'l',
+    'م': 'm', 'ن': 'n', 'ه': 'h', 'ة': 'a', 'و': 'w', 'ي': 'y', 'ى': 'a', 'ء': "'", 'ؤ': "'",
+    'ئ': "'", 'پ': 'p', 'ڤ': 'v', 'گ': 'g', 'ک': 'k', 'ی': 'y', '،': ',', '؛': ';', '؟': '?',
+    **{chr(code): None for code in range(0x064B, 0x0653)},
+    'ـ': None,
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+
+def to_latin1(text):
+    """Text printable with the standard Type 1 fonts
+
+    Arabic is transliterated, other characters outside Latin-1 lose their
+    accents where NFKD can split them off, and anything left becomes '?'.
+    """
+    text = str(text).translate(ARABIC_TRANSLITERATION)
+    printable = []
+    for ch in text:
+        if ord(ch) > 0xFF:
+            ch = ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c)) or '?'
+        printable.append(ch)
+    return ''.join(printable).encode('latin-1', 'replace').decode('latin-1')
+
+
+class InvoicePdfService:
+    """Service for rendering invoices to PDF and caching the bytes on local storage
+
+    Rendering only depends on Invoice data (no clock, no random IDs), so the
+    same invoice version always produces identical bytes. Cached files are
+    keyed by invoice id and updated_at; saving an invoice therefore
+    invalidates its PDF without any explicit hook.
+    """
+
+    PAGE_WIDTH = 595  # A4 in points
+    PAGE_HEIGHT = 842
+
+    @staticmethod
+    def storage():
+        return FileSystemStorage(location=settings.INVOICE_PDF_CACHE_DIR)
+
+    @staticmethod
+    def _text(value):
+        """PDF string literal; the standard Type 1 fonts only cover Latin-1"""
+        text = to_latin1(value)
+        return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+    @staticmethod
+    def billed_to(invoice):
+        if invoice.organization_id:
+            return invoice.organization.name
+        if invoice.trainer_subscription_id:
+            return invoice.trainer_subscription.trainer.get_full_name() or invoice.trainer_subscription.trainer.username
+        return ''
+
+    @staticmethod
+    def lines(invoice):
+        """(font, size, text) rows printed top to bottom"""
+        rows = [
+            ('F2', 20, 'Fitness Morocco - Invoice'),
+            ('F1', 11, ''),
+            ('F1', 11, f"Invoice number: {invoice.invoice_number}"),
+            ('F1', 11, f"Issue date: {invoice.issue_date.isoformat() if invoice.issue_date else ''}"),
+            ('F1', 11, f"Due date: {invoice.due_date.isoformat()}"),
+            ('F1', 11, f"Period: {invoice.period_start.isoformat()} - {invoice.period_end.isoformat()}"),
+            ('F1', 11, f"Billed to: {InvoicePdfService.billed_to(invoice)}"),
+            ('F1', 11, f"Status: {invoice.get_status_display()}"),
+            ('F1', 11, ''),
+            ('F1', 11, f"Subtotal: {invoice.subtotal} MAD"),
+            ('F1', 11, f"Tax: {invoice.tax_amount} MAD"),
+            ('F2', 13, f"Total: {invoice.total_amount} MAD"),
+        ]
+        if invoice.paid_date:
+            rows.append(('F1', 11, f"Paid on: {invoice.paid_date.isoformat()}"))
+        if invoice.notes:
+            rows.append(('F1', 11, ''))
+            rows.extend(('F1', 10, line) for line in invoice.notes.splitlines())
+        return rows
+
+    @staticmethod
+    def render(invoice):
+        """Single-page PDF document for an invoice, as bytes"""
+        commands = ['BT', '50 790 Td']
+        for font, size, text in InvoicePdfService.lines(invoice):
+            commands.append(f'/{font} {size} Tf {InvoicePdfService._text(text)} Tj 0 -{size + 8} Td')
+        commands.append('ET')
+        content = '\n'.join(commands).encode('latin-1')
+
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+            (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {InvoicePdfService.PAGE_WIDTH} '
+             f'{InvoicePdfService.PAGE_HEIGHT}] /Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> '
+             f'/Contents 6 0 R >>').encode(),
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+            b'<< /Length ' + str(len(content)).encode() + b' >>\nstream\n' + content + b'\nendstream',
+        ]
+
+        pdf = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(pdf))
+            pdf += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+        xref = len(pdf)
+        pdf += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+        for offset in offsets:
+            pdf += f'{offset:010d} 00000 n \n'.encode()
+        pdf += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+        return bytes(pdf)
+
+    @staticmethod
+    def cache_name(invoice):
+        return f"{invoice.id}/{int(invoice.updated_at.timestamp() * 1000000)}.pdf"
+
+    @staticmethod
+    def get_cached(invoice):
+        """Storage name of the invoice's current PDF, rendering it on first use"""
+        storage = InvoicePdfService.storage()
+        name = InvoicePdfService.cache_name(invoice)
+        if not storage.exists(name):
+            # Drop renderings of older versions of this invoice
+            directory = str(invoice.id)
+            if storage.exists(directory):
+                for stale in storage.listdir(directory)[1]:
+                    storage.delete(f"{directory}/{stale}")
+            saved = storage.save(name, ContentFile(InvoicePdfService.render(invoice)))
+            if saved != name:
+                # Another worker rendered the same version concurrently; the bytes are identical
+                storage.delete(saved)
+        return name
+
+    @staticmethod
+    def file_response(request, invoice):
+        """Cached PDF as an attachment, honouring single byte-range requests"""
+        storage = InvoicePdfService.storage()
+        name = InvoicePdfService.get_cached(invoice)
+        etag = f'"{invoice.id}-{int(invoice.updated_at.timestamp() * 1000000)}"'
+        return ranged_file_response(
+            request, storage.open(name, 'rb'), storage.size(name),
+            'application/pdf', f"{invoice.invoice_number}.pdf", etag
+        )
+
+    @staticmethod
+    def iter_zip(invoices):
+        """Yield a ZIP archive of invoice PDFs chunk by chunk, holding at most one chunk in memory"""
+        storage = InvoicePdfService.storage()
+        stream = _ZipStream()
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for invoice in invoices:
+                name = InvoicePdfService.get_cached(invoice)
+                info = zipfile.ZipInfo(f"{invoice.invoice_number}.pdf", date_time=invoice.updated_at.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with storage.open(name, 'rb') as source, archive.open(info, 'w') as target:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        target.write(chunk)
+                        yield stream.pop()
+                yield stream.pop()
+        yield stream.pop()
+
+
+class _ZipStream:
+    """Write-only, non-seekable sink for zipfile that hands written bytes to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _RangeReader:
+    """File wrapper exposing only ``length`` bytes starting at ``start``"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def ranged_file_response(request, file, size, content_type, filename, etag=None):
+    """FileResponse for a whole file, or a 206 partial response for one ``Range: bytes=`` span"""
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if match and (match.group(1) or match.group(2)) and (not if_range or if_range == etag):
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start, end = max(size - int(match.group(2)), 0), size - 1
+        if start > end:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        response = FileResponse(
+            _RangeReader(file, start, end - start + 1), status=206, content_type=content_type,
+            as_attachment=True, filename=filename
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(file, content_type=content_type, as_attachment=True, filename=filename)
+        response['Content-Length'] = str(size)
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    return response
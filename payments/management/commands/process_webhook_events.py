@@ -0,0 +1,34 @@
+"""
+Django management command to drain the webhook event inbox
+Usage: python manage.py process_webhook_events [--loop] [--batch-size 50] [--sleep 2]
+"""
+import time
+from django.core.management.base import BaseCommand
+from payments.stripe_handler import WebhookInbox
+
+
+class Command(BaseCommand):
+    help = 'Process queued payment webhook events with retries and exponential backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Events claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when idle')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when no event is due')
+
+    def handle(self, *args, **options):
+        total_processed = total_failed = 0
+        try:
+            while True:
+                processed, failed = WebhookInbox.drain(batch_size=options['batch_size'])
+                total_processed += processed
+                total_failed += failed
+                if processed or failed:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Processed {total_processed} webhook events ({total_failed} failed attempts)'
+        ))
@@ -0,0 +1,17 @@
+"""
+Django management command to rebuild the organization search token table
+Usage: python manage.py rebuild_organization_search_index
+"""
+from django.core.management.base import BaseCommand
+from payments.search import OrganizationSearchService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild OrganizationSearchToken for every organization (run after bulk edits or normalization changes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        indexed = OrganizationSearchService.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {indexed} organizations'))
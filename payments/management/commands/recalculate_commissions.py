@@ -0,0 +1,27 @@
+"""
+Django management command to re-price open bookings at current commission rates
+Usage: python manage.py recalculate_commissions [--plan premium]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from payments.models import SubscriptionPlan
+from payments.services import CommissionService
+
+
+class Command(BaseCommand):
+    help = "Recompute commission and trainer earnings of open bookings from trainers' current plans"
+
+    def add_arguments(self, parser):
+        # Completed and cancelled bookings are left alone: they are already in the daily rollups
+        parser.add_argument('--plan', help='Only bookings of trainers subscribed to this plan key')
+
+    def handle(self, *args, **options):
+        statuses = CommissionService.RECALCULATED_STATUSES
+        if options['plan']:
+            try:
+                plan = SubscriptionPlan.objects.get(key=options['plan'])
+            except SubscriptionPlan.DoesNotExist:
+                raise CommandError(f"Plan {options['plan']} does not exist")
+            updated = CommissionService.recalculate_for_plan(plan, statuses)
+        else:
+            updated = CommissionService.recalculate_bookings(statuses=statuses)
+        self.stdout.write(self.style.SUCCESS(f'✓ Recalculated commission on {updated} bookings'))
@@ -0,0 +1,17 @@
+"""
+Django management command to invoice subscriptions whose billing period has ended
+Usage: python manage.py run_renewal_billing [--batch-size 500]
+"""
+from django.core.management.base import BaseCommand
+from payments.services import RenewalBillingService
+
+
+class Command(BaseCommand):
+    help = 'Create renewal invoices in bulk and advance billing periods (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Subscriptions billed per transaction')
+
+    def handle(self, *args, **options):
+        created = RenewalBillingService.run(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {created} renewal invoices'))
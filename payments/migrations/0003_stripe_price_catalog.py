@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_subscriptionplan_paymentgatewayconfig_secret_key_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('billing_period', models.CharField(choices=[('monthly', 'Monthly'), ('annual', 'Annual')], max_length=20)),
+                ('unit_amount', models.IntegerField()),
+                ('currency', models.CharField(default='mad', max_length=3)),
+                ('stripe_price_id', models.CharField(max_length=200, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stripe_prices', to='payments.subscriptionplan')),
+            ],
+            options={
+                'verbose_name': 'سعر Stripe',
+                'verbose_name_plural': 'أسعار Stripe',
+                'unique_together': {('plan', 'billing_period', 'unit_amount', 'currency')},
+            },
+        ),
+    ]
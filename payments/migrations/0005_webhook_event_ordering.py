@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingsubscription',
+            name='last_event_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event_created',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='billingsubscription',
+            index=models.Index(fields=['provider_subscription_id'], name='billing_provider_sub'),
+        ),
+    ]
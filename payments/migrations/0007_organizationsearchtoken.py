@@ -0,0 +1,74 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:17
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of payments.search as of this migration
+WORD_RE = re.compile(r'\w+')
+ARABIC_FOLDING = str.maketrans({
+    'ٱ': 'ا', 'ى': 'ي', 'ی': 'ي', 'ک': 'ك', 'ة': 'ه', 'ـ': None,
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+
+def tokenize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    tokens = []
+    for word in WORD_RE.findall(stripped.translate(ARABIC_FOLDING).casefold()):
+        word = word[:64]
+        tokens.append(word)
+        if word.startswith('ال') and len(word) > 3:
+            tokens.append(word[2:])
+    return tokens
+
+
+def token_weights(name, city, description):
+    weights = {}
+    for text, weight in ((name, 3), (city, 2), (description, 1)):
+        for token in tokenize(text):
+            if weights.get(token, 0) < weight:
+                weights[token] = weight
+    return weights
+
+
+def populate_search_tokens(apps, schema_editor):
+    Organization = apps.get_model('payments', 'Organization')
+    OrganizationSearchToken = apps.get_model('payments', 'OrganizationSearchToken')
+
+    entries = [
+        OrganizationSearchToken(organization_id=org_id, token=token, weight=weight)
+        for org_id, name, city, description in Organization.objects.values_list('id', 'name', 'city', 'description')
+        for token, weight in token_weights(name, city, description).items()
+    ]
+    OrganizationSearchToken.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='payments.organization')),
+            ],
+            options={
+                'verbose_name': 'كلمة بحث المنظمة',
+                'verbose_name_plural': 'كلمات بحث المنظمات',
+                'indexes': [models.Index(fields=['token', 'organization'], name='org_search_token')],
+                'unique_together': {('organization', 'token')},
+            },
+        ),
+        migrations.RunPython(populate_search_tokens, migrations.RunPython.noop),
+    ]
@@ -68,6 +68,9 @@ class SubscriptionPlan(models.Model):
     trial_days = models.IntegerField(default=14)
     is_trial_available = models.BooleanField(default=True)
     
+    # Stripe catalog
+    stripe_product_id = models.CharField(max_length=200, blank=True)
+    
     # Status
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -80,6 +83,29 @@ class SubscriptionPlan(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.price_monthly} MAD/month)"
+    
+    def price_for(self, billing_period):
+        """Plan price for 'monthly' or 'annual' billing, or None if not offered"""
+        return self.price_annual if billing_period == 'annual' else self.price_monthly
+
+
+class StripePrice(models.Model):
+    """Stripe price minted for a plan, billing period and amount"""
+    plan = models.ForeignKey(SubscriptionPlan, on_delete=models.CASCADE, related_name='stripe_prices')
+    billing_period = models.CharField(max_length=20, choices=SubscriptionPlan.BILLING_PERIODS)
+    unit_amount = models.IntegerField()  # Smallest currency unit (centimes)
+    currency = models.CharField(max_length=3, default='mad')
+    stripe_price_id = models.CharField(max_length=200, unique=True)
+    is_active = models.BooleanField(default=True)  # False once the plan amount moved on
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'سعر Stripe'
+        verbose_name_plural = 'أسعار Stripe'
+        unique_together = ('plan', 'billing_period', 'unit_amount', 'currency')
+    
+    def __str__(self):
+        return f"{self.plan.key} {self.billing_period} {self.unit_amount} {self.currency} - {self.stripe_price_id}"
 
 
 class Organization(models.Model):
@@ -150,6 +176,28 @@ class Organization(models.Model):
         return False
 
 
+class OrganizationSearchToken(models.Model):
+    """Normalized word of an organization's name, city or description, for prefix search"""
+    WEIGHT_NAME = 3
+    WEIGHT_CITY = 2
+    WEIGHT_DESCRIPTION = 1
+    
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)  # Output of payments.search.normalize_text, one word
+    weight = models.PositiveSmallIntegerField(default=1)  # Highest weight among the fields containing it
+    
+    class Meta:
+        verbose_name = 'كلمة بحث المنظمة'
+        verbose_name_plural = 'كلمات بحث المنظمات'
+        unique_together = ('organization', 'token')
+        indexes = [
+            models.Index(fields=['token', 'organization'], name='org_search_token'),
+        ]
+    
+    def __str__(self):
+        return f"{self.organization_id} - {self.token}"
+
+
 class TrainerSubscription(models.Model):
     """Individual trainer subscription"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -242,12 +290,16 @@ class BillingSubscription(models.Model):
     
     # Tracking
     failed_payment_count = models.IntegerField(default=0)
+    last_event_at = models.DateTimeField(null=True, blank=True)  # `created` of the newest provider event applied
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'اشتراك الفواتير'
         verbose_name_plural = 'اشتراكات الفواتير'
+        indexes = [
+            models.Index(fields=['provider_subscription_id'], name='billing_provider_sub'),
+        ]
     
     def __str__(self):
         if self.trainer_subscription:
@@ -309,6 +361,19 @@ class Invoice(models.Model):
         return f"Invoice {self.invoice_number} - {self.total_amount} MAD"
 
 
+class InvoiceSequence(models.Model):
+    """Counter backing collision-free invoice numbers, one row per prefix (e.g. INV-2026)"""
+    prefix = models.CharField(max_length=20, unique=True)
+    last_value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'تسلسل الفواتير'
+        verbose_name_plural = 'تسلسلات الفواتير'
+    
+    def __str__(self):
+        return f"{self.prefix} - {self.last_value}"
+
+
 class OrganizationInvitation(models.Model):
     """Invitations for trainers to join an organization"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -370,3 +435,37 @@ class SeatOverage(models.Model):
     
     def __str__(self):
         return f"{self.organization.name} - {self.seats_purchased} seats"
+
+
+class WebhookEvent(models.Model):
+    """Inbox of verified payment-provider webhook events awaiting processing"""
+    EVENT_STATUSES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),  # Gave up after the maximum number of attempts
+    )
+    
+    event_id = models.CharField(max_length=255, unique=True)  # Provider event ID, e.g. evt_...
+    provider = models.CharField(max_length=20, default='stripe')
+    event_type = models.CharField(max_length=100)
+    event_created = models.DateTimeField(null=True, blank=True)  # Provider's `created` timestamp
+    payload = models.JSONField()
+    
+    status = models.CharField(max_length=20, choices=EVENT_STATUSES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Also the lease expiry while processing
+    last_error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'حدث Webhook'
+        verbose_name_plural = 'أحداث Webhook'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_status_next'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} - {self.event_id} ({self.status})"
@@ -0,0 +1,165 @@
+"""
+Organization directory search
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, When, F, Max, Q, Value, IntegerField
+from .models import Organization, OrganizationSearchToken
+
+TOKEN_MAX_LENGTH = 64
+ARABIC_ARTICLE = 'ال'
+WORD_RE = re.compile(r'\w+')
+
+# Letter variants NFKD leaves alone, tatweel, and Arabic-Indic / Persian digits
+ARABIC_FOLDING = str.maketrans({
+    'ٱ': 'ا', 'ى': 'ي', 'ی': 'ي', 'ک': 'ك', 'ة': 'ه', 'ـ': None,
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+
+def normalize_text(text):
+    """Fold case, Latin accents and Arabic letter variants so spellings of a word compare equal
+
+    NFKD splits é into e + accent and أ/إ/آ/ؤ/ئ into the base letter plus a
+    hamza or madda; dropping combining marks (harakat included) keeps only
+    the base letters.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.translate(ARABIC_FOLDING).casefold()
+
+
+def tokenize(text):
+    """Normalized words of text; words carrying the Arabic article also yield the bare word"""
+    tokens = []
+    for word in WORD_RE.findall(normalize_text(text)):
+        word = word[:TOKEN_MAX_LENGTH]
+        tokens.append(word)
+        if word.startswith(ARABIC_ARTICLE) and len(word) > len(ARABIC_ARTICLE) + 1:
+            tokens.append(word[len(ARABIC_ARTICLE):])
+    return tokens
+
+
+def token_weights(name, city, description):
+    """{token: weight}, keeping the highest weight when a word appears in several fields"""
+    weights = {}
+    for text, weight in (
+        (name, OrganizationSearchToken.WEIGHT_NAME),
+        (city, OrganizationSearchToken.WEIGHT_CITY),
+        (description, OrganizationSearchToken.WEIGHT_DESCRIPTION),
+    ):
+        for token in tokenize(text):
+            if weights.get(token, 0) < weight:
+                weights[token] = weight
+    return weights
+
+
+class OrganizationSearchService:
+    """Prefix search over the OrganizationSearchToken table, ranked by relevance
+
+    Every query word must prefix-match a token of the organization. Each word
+    scores the weight of the best token it hits (name > city > description),
+    doubled for a whole-word match, and the rank is the sum over words.
+
+    Tokens and terms are both already case-folded, so the prefix test uses
+    istartswith: on MySQL that compiles to a plain ``LIKE 'term%'``, which the
+    (token, organization) index can serve as a range scan, whereas startswith
+    compiles to ``LIKE BINARY`` and falls back to scanning the index.
+    """
+
+    MAX_TERMS = 6
+    RANKED_ORDERING = ('-search_rank', '-created_at', '-id')
+    AUTOCOMPLETE_LIMIT = 8
+    AUTOCOMPLETE_TTL = 60  # seconds
+
+    @staticmethod
+    def build_tokens(organization):
+        weights = token_weights(organization.name, organization.city, organization.description)
+        return [
+            OrganizationSearchToken(organization=organization, token=token, weight=weight)
+            for token, weight in weights.items()
+        ]
+
+    @staticmethod
+    def sync_organization(organization):
+        """Rewrite an organization's tokens; a no-op (one SELECT) when its text did not change"""
+        entries = OrganizationSearchService.build_tokens(organization)
+        current = set(
+            OrganizationSearchToken.objects.filter(organization=organization).values_list('token', 'weight')
+        )
+        if current == {(entry.token, entry.weight) for entry in entries}:
+            return entries
+        with transaction.atomic():
+            OrganizationSearchToken.objects.filter(organization=organization).delete()
+            OrganizationSearchToken.objects.bulk_create(entries)
+        return entries
+
+    @staticmethod
+    def rebuild_all(batch_size=500):
+        """Rebuild the whole token table; returns the number of organizations indexed"""
+        organizations = Organization.objects.only('id', 'name', 'city', 'description')
+        entries = []
+        count = 0
+        for organization in organizations.iterator(chunk_size=batch_size):
+            entries.extend(OrganizationSearchService.build_tokens(organization))
+            count += 1
+        with transaction.atomic():
+            OrganizationSearchToken.objects.all().delete()
+            OrganizationSearchToken.objects.bulk_create(entries, batch_size=batch_size)
+        return count
+
+    @staticmethod
+    def query_terms(query):
+        return list(dict.fromkeys(WORD_RE.findall(normalize_text(query))))[:OrganizationSearchService.MAX_TERMS]
+
+    @staticmethod
+    def search(queryset, query):
+        """Narrow an Organization queryset to matches of query, annotated with search_rank
+
+        Order by RANKED_ORDERING for best matches first. A query without any
+        word leaves the queryset unfiltered, with a search_rank of 0.
+        """
+        terms = OrganizationSearchService.query_terms(query)
+        if not terms:
+            return queryset.annotate(search_rank=Value(0, output_field=IntegerField()))
+
+        any_term = Q()
+        matches = {}
+        for i, term in enumerate(terms):
+            any_term |= Q(search_tokens__token__istartswith=term)
+            matches[f'_term_{i}'] = Max(Case(
+                When(search_tokens__token=term, then=F('search_tokens__weight') * 2),
+                When(search_tokens__token__istartswith=term, then=F('search_tokens__weight')),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+
+        return queryset.filter(any_term).annotate(**matches).filter(
+            **{f'{name}__gt': 0 for name in matches}
+        ).annotate(
+            search_rank=sum((F(name) for name in matches), Value(0))
+        )
+
+    @staticmethod
+    def autocomplete(query):
+        """Best active matches as [{'id', 'name', 'city'}], cached briefly per normalized query"""
+        terms = OrganizationSearchService.query_terms(query)
+        if not terms:
+            return []
+        cache_key = 'club_autocomplete:' + hashlib.md5(json.dumps(terms).encode()).hexdigest()
+        results = cache.get(cache_key)
+        if results is None:
+            matches = OrganizationSearchService.search(Organization.objects.filter(is_active=True), query)
+            results = [
+                {'id': str(organization.id), 'name': organization.name, 'city': organization.city}
+                for organization in matches.order_by(*OrganizationSearchService.RANKED_ORDERING)[
+                    :OrganizationSearchService.AUTOCOMPLETE_LIMIT
+                ]
+            ]
+            cache.set(cache_key, results, OrganizationSearchService.AUTOCOMPLETE_TTL)
+        return results
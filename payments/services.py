@@ -1,23 +1,86 @@
 """
 Subscription and billing services
 """
-from decimal import Decimal
-from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import date, datetime, timedelta
+from django.conf import settings
 from django.utils import timezone
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Case, When, F, Value, DecimalField
+from django.db.models.functions import Round, TruncMonth
 from django.core.exceptions import ValidationError
 from .models import (
     SubscriptionPlan, Organization, TrainerSubscription, BillingSubscription, 
-    OrganizationInvitation, SeatOverage, Invoice
+    OrganizationInvitation, SeatOverage, Invoice, InvoiceSequence
 )
 from trainers.models import Trainer
 from bookings.models import Booking
+from bookings.services import EarningsService
 import uuid
 
 
+class CommissionRateCache:
+    """Shared cache of resolved commission rates, keyed by trainer user id
+    
+    Entries carry the moment they stop being valid (the end of the trial or
+    paid period they were resolved from). TrainerSubscription saves drop a
+    trainer's entry; SubscriptionPlan saves move the version stamp, which
+    retires every entry at once. Invalidation reaches other processes only
+    through a shared backend (REDIS_URL); CACHE_TTL bounds staleness otherwise.
+    """
+    
+    VERSION_KEY = 'commission_rate:version'
+    CACHE_TTL = 300  # seconds
+    
+    @staticmethod
+    def current_version():
+        version = cache.get(CommissionRateCache.VERSION_KEY)
+        if version is None:
+            cache.add(CommissionRateCache.VERSION_KEY, uuid.uuid4().hex, CommissionRateCache.CACHE_TTL)
+            version = cache.get(CommissionRateCache.VERSION_KEY)
+        return version
+    
+    @staticmethod
+    def bump():
+        """Invalidate every trainer's rate; call after bulk changes that skip signals"""
+        cache.set(CommissionRateCache.VERSION_KEY, uuid.uuid4().hex, CommissionRateCache.CACHE_TTL)
+    
+    @staticmethod
+    def key(user_id, version):
+        return f"commission_rate:{version}:{user_id}"
+    
+    @staticmethod
+    def get_many(user_ids, now):
+        """Live cached rates for the given users (a subset of them on a partial hit)"""
+        version = CommissionRateCache.current_version()
+        keys = {CommissionRateCache.key(user_id, version): user_id for user_id in user_ids}
+        rates = {}
+        for key, (rate, valid_until) in cache.get_many(list(keys)).items():
+            if valid_until is None or valid_until > now:
+                rates[keys[key]] = rate
+        return rates
+    
+    @staticmethod
+    def set_many(entries):
+        """Store {user_id: (rate, valid_until or None)}"""
+        version = CommissionRateCache.current_version()
+        cache.set_many(
+            {CommissionRateCache.key(user_id, version): entry for user_id, entry in entries.items()},
+            CommissionRateCache.CACHE_TTL
+        )
+    
+    @staticmethod
+    def invalidate(user_ids):
+        version = CommissionRateCache.current_version()
+        cache.delete_many([CommissionRateCache.key(user_id, version) for user_id in user_ids])
+
+
 class SubscriptionService:
     """Service for managing trainer subscriptions"""
     
+    DEFAULT_COMMISSION_RATE = Decimal('20')  # Trainers without an active plan
+    
     @staticmethod
     def create_trainer_subscription(user, plan_key, is_trial=True):
         """Create a new subscription for a trainer"""
@@ -62,10 +125,12 @@ class SubscriptionService:
         if current_sub.plan.id == new_plan.id:
             raise ValidationError("Already on this plan")
         
-        # Update plan
-        current_sub.plan = new_plan
-        current_sub.updated_at = timezone.now()
-        current_sub.save()
+        # Update plan and re-price the trainer's open bookings at the new rate
+        with transaction.atomic():
+            current_sub.plan = new_plan
+            current_sub.updated_at = timezone.now()
+            current_sub.save()
+            CommissionService.recalculate_for_trainers([user.pk])
         
         return current_sub
     
@@ -86,13 +151,44 @@ class SubscriptionService:
     @staticmethod
     def get_commission_rate(user):
         """Get commission rate for a trainer based on subscription"""
-        try:
-            sub = TrainerSubscription.objects.get(trainer=user)
-            if sub.is_subscription_active and sub.plan:
-                return sub.plan.commission_rate
-        except TrainerSubscription.DoesNotExist:
-            pass
-        return Decimal('20')  # Default 20%
+        return SubscriptionService.get_commission_rates([user.pk])[user.pk]
+    
+    @staticmethod
+    def get_commission_rates(user_ids, now=None):
+        """Commission rate per trainer user id; cache misses are resolved together in one query
+        
+        Trainers without an active, planned subscription get DEFAULT_COMMISSION_RATE.
+        """
+        now = now or timezone.now()
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        
+        rates = CommissionRateCache.get_many(user_ids, now)
+        missing = [user_id for user_id in user_ids if user_id not in rates]
+        if missing:
+            resolved = SubscriptionService.resolve_commission_rates(missing, now)
+            CommissionRateCache.set_many(resolved)
+            rates.update({user_id: rate for user_id, (rate, _) in resolved.items()})
+        return rates
+    
+    @staticmethod
+    def resolve_commission_rates(user_ids, now):
+        """{user_id: (rate, valid_until)} straight from the database in one query
+        
+        ``valid_until`` is when the subscription granting the rate lapses, or
+        None for the default rate, which only changes when a subscription is saved.
+        """
+        resolved = {user_id: (SubscriptionService.DEFAULT_COMMISSION_RATE, None) for user_id in user_ids}
+        rows = TrainerSubscription.objects.filter(
+            trainer_id__in=user_ids, plan__isnull=False
+        ).values_list('trainer_id', 'is_trial', 'trial_end', 'subscription_end', 'plan__commission_rate')
+        for user_id, is_trial, trial_end, subscription_end, commission_rate in rows:
+            # Same rule as TrainerSubscription.is_subscription_active
+            ends = trial_end if is_trial and trial_end else subscription_end
+            if ends and ends > now:
+                resolved[user_id] = (commission_rate, ends)
+        return resolved
 
 
 class OrganizationService:
@@ -275,6 +371,8 @@ class OrganizationService:
                 f"but you have {organization.seats_used} trainers"
             )
         
+        # Seat trainers keep their own subscriptions, so their commission rates
+        # (and the open bookings priced with them) do not change with the org plan
         organization.subscription_plan = new_plan
         organization.extra_seats_purchased = 0  # Reset extra seats on upgrade
         organization.updated_at = timezone.now()
@@ -286,15 +384,26 @@ class OrganizationService:
 class CommissionService:
     """Service for calculating commissions and trainer earnings"""
     
+    RECALCULATED_STATUSES = ('pending', 'confirmed')
+    
+    # group_by -> (grouped field, optional display-name field)
+    EARNINGS_GROUPINGS = {
+        'month': ('month', None),
+        'session_type': ('session_type', 'session_type__name'),
+        'organization': ('organization', 'organization__name'),
+    }
+    
     @staticmethod
     def calculate_booking_commission(booking):
         """Calculate commission for a booking based on trainer's plan"""
         trainer_user = booking.trainer.user
         commission_rate = SubscriptionService.get_commission_rate(trainer_user)
         
-        # Calculate amounts
+        # Calculate amounts, rounded to cents half-up like the SQL ROUND() in recalculate_bookings
         booking.commission_rate = commission_rate
-        booking.commission_amount = (booking.total_price * commission_rate) / Decimal('100')
+        booking.commission_amount = ((booking.total_price * commission_rate) / Decimal('100')).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP
+        )
         booking.trainer_earnings = booking.total_price - booking.commission_amount
         
         return booking
@@ -307,8 +416,69 @@ class CommissionService:
         return booking
     
     @staticmethod
-    def get_trainer_earnings_summary(trainer_user, start_date=None, end_date=None):
-        """Get earnings summary for a trainer"""
+    def recalculate_bookings(bookings=None, statuses=RECALCULATED_STATUSES):
+        """Re-price many bookings at their trainers' current commission rates in one UPDATE
+        
+        Rates are resolved once per trainer (two SELECTs in total) and applied
+        with a CASE on trainer_id, so the cost does not grow with the number of
+        bookings. Only open bookings are touched by default: completed and
+        cancelled ones are already folded into the daily rollups, which a
+        queryset update would bypass. Returns the number of bookings updated.
+        """
+        if bookings is None:
+            bookings = Booking.objects.all()
+        if statuses:
+            bookings = bookings.filter(status__in=statuses)
+        
+        trainers = dict(bookings.order_by().values_list('trainer_id', 'trainer__user_id').distinct())
+        if not trainers:
+            return 0
+        rates = SubscriptionService.get_commission_rates(trainers.values())
+        
+        trainers_by_rate = {}
+        for trainer_id, user_id in trainers.items():
+            trainers_by_rate.setdefault(rates[user_id], []).append(trainer_id)
+        
+        # Bookings of a trainer that appeared after the rate lookup keep their stored rate
+        rate = Case(
+            *[When(trainer_id__in=ids, then=Value(commission_rate))
+              for commission_rate, ids in trainers_by_rate.items()],
+            default=F('commission_rate'),
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        )
+        commission = Round(F('total_price') * rate / Value(Decimal('100')), 2)
+        return bookings.update(
+            commission_rate=rate,
+            commission_amount=commission,
+            trainer_earnings=F('total_price') - commission,
+        )
+    
+    @staticmethod
+    def recalculate_for_trainers(user_ids, statuses=RECALCULATED_STATUSES):
+        """Re-price the open bookings of the given trainer users"""
+        return CommissionService.recalculate_bookings(
+            Booking.objects.filter(trainer__user_id__in=list(user_ids)), statuses
+        )
+    
+    @staticmethod
+    def recalculate_for_plan(plan, statuses=RECALCULATED_STATUSES):
+        """Re-price the open bookings of every trainer subscribed to a plan"""
+        return CommissionService.recalculate_bookings(
+            Booking.objects.filter(trainer__user__trainer_subscription__plan=plan), statuses
+        )
+    
+    @staticmethod
+    def get_trainer_earnings_summary(trainer_user, start_date=None, end_date=None, group_by=None):
+        """Get earnings summary for a trainer, optionally broken down by group
+        
+        ``group_by`` is one of EARNINGS_GROUPINGS; the breakdown and the overall
+        totals then come from the same single grouped query.
+        """
+        if group_by and group_by not in CommissionService.EARNINGS_GROUPINGS:
+            raise ValidationError(
+                f"group_by must be one of: {', '.join(CommissionService.EARNINGS_GROUPINGS)}"
+            )
+        
         bookings = Booking.objects.filter(trainer__user=trainer_user, status='completed')
         
         if start_date:
@@ -316,21 +486,45 @@ class CommissionService:
         if end_date:
             bookings = bookings.filter(booking_date__lte=end_date)
         
-        total_bookings = bookings.count()
-        total_revenue = bookings.aggregate(
-            total=models.Sum('total_price')
-        )['total'] or Decimal('0')
-        total_earnings = bookings.aggregate(
-            total=models.Sum('trainer_earnings')
-        )['total'] or Decimal('0')
-        total_commission = bookings.aggregate(
-            total=models.Sum('commission_amount')
-        )['total'] or Decimal('0')
+        if not group_by:
+            return CommissionService._earnings_summary(EarningsService.get_booking_totals(bookings))
+        
+        key, label = CommissionService.EARNINGS_GROUPINGS[group_by]
+        if key == 'month':
+            bookings = bookings.annotate(month=TruncMonth('booking_date'))
+        fields = [key, label] if label else [key]
+        rows = bookings.values(*fields).annotate(
+            **EarningsService.booking_total_aggregates()
+        ).order_by(*fields)
+        
+        groups = []
+        totals = {'total_bookings': 0, 'total_revenue': Decimal('0'),
+                  'total_earnings': Decimal('0'), 'total_commission': Decimal('0')}
+        for row in rows:
+            for field in ('total_revenue', 'total_earnings', 'total_commission'):
+                row[field] = row[field] or Decimal('0')
+            for field in totals:
+                totals[field] += row[field]
+            group = {'key': row[key].strftime('%Y-%m') if key == 'month' else row[key]}
+            if label:
+                group['name'] = row[label]
+            group.update(CommissionService._earnings_summary(row))
+            groups.append(group)
+        
+        summary = CommissionService._earnings_summary(totals)
+        summary['group_by'] = group_by
+        summary['groups'] = groups
+        return summary
+    
+    @staticmethod
+    def _earnings_summary(totals):
+        total_revenue = totals['total_revenue']
+        total_commission = totals['total_commission']
         
         return {
-            'total_bookings': total_bookings,
+            'total_bookings': totals['total_bookings'],
             'total_revenue': total_revenue,
-            'total_earnings': total_earnings,
+            'total_earnings': totals['total_earnings'],
             'total_commission': total_commission,
             'average_commission_rate': (total_commission / total_revenue * 100) if total_revenue > 0 else Decimal('0')
         }
@@ -340,16 +534,32 @@ class InvoiceService:
     """Service for managing invoices"""
     
     @staticmethod
-    def generate_invoice_number(organization_or_trainer_id):
-        """Generate unique invoice number"""
-        now = timezone.now()
-        timestamp = now.strftime("%Y%m%d%H%M%S")
-        return f"INV-{timestamp}-{organization_or_trainer_id[:8]}"
+    def allocate_invoice_numbers(count, year=None):
+        """Reserve ``count`` consecutive invoice numbers (INV-<year>-<000001>)
+        
+        The sequence row is locked for the rest of the caller's transaction,
+        so numbers never collide and are not lost when the caller rolls back.
+        """
+        if count <= 0:
+            return []
+        prefix = f"INV-{year or timezone.now().year}"
+        with transaction.atomic():
+            InvoiceSequence.objects.get_or_create(prefix=prefix)
+            sequence = InvoiceSequence.objects.select_for_update().get(prefix=prefix)
+            first = sequence.last_value + 1
+            sequence.last_value += count
+            sequence.save(update_fields=['last_value'])
+        return [f"{prefix}-{value:06d}" for value in range(first, first + count)]
+    
+    @staticmethod
+    def generate_invoice_number():
+        """Next unique invoice number"""
+        return InvoiceService.allocate_invoice_numbers(1)[0]
     
     @staticmethod
     def create_invoice(billing_subscription, period_start, period_end, amount):
         """Create an invoice for a subscription period"""
-        invoice_number = InvoiceService.generate_invoice_number(str(billing_subscription.id))
+        invoice_number = InvoiceService.generate_invoice_number()
         
         invoice = Invoice(
             billing_subscription=billing_subscription,
@@ -367,5 +577,110 @@ class InvoiceService:
         return invoice
 
 
-# Import models at end to avoid circular imports
-from django.db import models
+class RenewalBillingService:
+    """Service for invoicing subscriptions whose billing period has ended"""
+    
+    RENEWABLE_STATUSES = ('active', 'past_due')
+    
+    @staticmethod
+    def add_months(value, months):
+        """Shift a datetime by whole months, clamping the day to the target month's length"""
+        month_index = value.month - 1 + months
+        year, month = value.year + month_index // 12, month_index % 12 + 1
+        next_month = date(year + month // 12, month % 12 + 1, 1)
+        last_day = (next_month - timedelta(days=1)).day
+        return value.replace(year=year, month=month, day=min(value.day, last_day))
+    
+    @staticmethod
+    def next_period_end(billing_subscription):
+        months = 12 if billing_subscription.billing_period == 'annual' else 1
+        return RenewalBillingService.add_months(billing_subscription.current_period_end, months)
+    
+    @staticmethod
+    def due_subscriptions(now):
+        """Locally billed subscriptions past their period end
+        
+        Provider-managed subscriptions are excluded: their invoices come from
+        the invoice.payment_succeeded webhook.
+        """
+        return BillingSubscription.objects.filter(
+            status__in=RenewalBillingService.RENEWABLE_STATUSES,
+            current_period_end__lte=now,
+            plan__isnull=False,
+            provider_subscription_id='',
+        )
+    
+    @staticmethod
+    def bill_batch(now=None, batch_size=500):
+        """Invoice and advance one chunk of due subscriptions atomically
+        
+        Returns (subscriptions advanced, invoices created). A period that
+        already has an invoice is advanced without a second one. A
+        subscription several periods behind stays due after one advance and
+        is picked up again by the next chunk.
+        """
+        now = now or timezone.now()
+        today = timezone.localdate(now)
+        due_days = getattr(settings, 'BILLING_SETTINGS', {}).get('INVOICE_DUE_DAYS', 30)
+        with transaction.atomic():
+            subscriptions = list(
+                RenewalBillingService.due_subscriptions(now).select_for_update(skip_locked=True)
+                .select_related('plan').order_by('current_period_end', 'id')[:batch_size]
+            )
+            if not subscriptions:
+                return 0, 0
+            
+            already_billed = set(Invoice.objects.filter(
+                billing_subscription__in=subscriptions,
+                period_start__in={timezone.localdate(sub.current_period_end) for sub in subscriptions},
+            ).values_list('billing_subscription_id', 'period_start'))
+            to_bill = [
+                sub for sub in subscriptions
+                if (sub.id, timezone.localdate(sub.current_period_end)) not in already_billed
+            ]
+            
+            invoices = []
+            numbers = iter(InvoiceService.allocate_invoice_numbers(len(to_bill), today.year))
+            for billing_sub in subscriptions:
+                period_start = billing_sub.current_period_end
+                period_end = RenewalBillingService.next_period_end(billing_sub)
+                if (billing_sub.id, timezone.localdate(period_start)) not in already_billed:
+                    amount = billing_sub.plan.price_for(billing_sub.billing_period)
+                    if amount is None:
+                        amount = billing_sub.plan.price_monthly * 12
+                    invoices.append(Invoice(
+                        billing_subscription=billing_sub,
+                        trainer_subscription_id=billing_sub.trainer_subscription_id,
+                        organization_id=billing_sub.organization_id,
+                        invoice_number=next(numbers),
+                        subtotal=amount,
+                        tax_amount=Decimal('0'),
+                        total_amount=amount,
+                        period_start=timezone.localdate(period_start),
+                        period_end=timezone.localdate(period_end),
+                        due_date=today + timedelta(days=due_days),
+                    ))
+                billing_sub.current_period_start = period_start
+                billing_sub.current_period_end = period_end
+                billing_sub.updated_at = now
+            
+            Invoice.objects.bulk_create(invoices, batch_size=batch_size)
+            BillingSubscription.objects.bulk_update(
+                subscriptions, ['current_period_start', 'current_period_end', 'updated_at'], batch_size=batch_size
+            )
+        return len(subscriptions), len(invoices)
+    
+    @staticmethod
+    def run(now=None, batch_size=500):
+        """Bill every due subscription in committed chunks; safe to interrupt and re-run
+        
+        Returns the number of invoices created.
+        """
+        now = now or timezone.now()
+        total = 0
+        while True:
+            advanced, created = RenewalBillingService.bill_batch(now, batch_size)
+            if not advanced:
+                return total
+            total += created
+
@@ -0,0 +1,34 @@
+"""
+Signal handlers keeping cached commission rates and the organization search index in step
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Organization, SubscriptionPlan, TrainerSubscription
+from .search import OrganizationSearchService
+from .services import CommissionRateCache
+
+
+@receiver(post_save, sender=TrainerSubscription)
+@receiver(post_delete, sender=TrainerSubscription)
+def invalidate_trainer_commission_rate(sender, instance, **kwargs):
+    """Drop the trainer's rate now for this transaction, and again once it commits"""
+    user_ids = [instance.trainer_id]
+    CommissionRateCache.invalidate(user_ids)
+    transaction.on_commit(lambda: CommissionRateCache.invalidate(user_ids))
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+def invalidate_plan_commission_rates(sender, **kwargs):
+    CommissionRateCache.bump()
+    transaction.on_commit(CommissionRateCache.bump)
+
+
+@receiver(post_save, sender=Organization)
+def sync_organization_search_tokens(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'name', 'city', 'description'} & set(update_fields):
+        return
+    OrganizationSearchService.sync_organization(instance)
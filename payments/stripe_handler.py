@@ -2,6 +2,7 @@
 Stripe payment integration and webhook handlers
 """
 import stripe
+import json
 import os
 from decimal import Decimal
 from django.conf import settings
@@ -10,9 +11,16 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from .models import BillingSubscription, TrainerSubscription, Organization, Invoice, SubscriptionPlan
+from django.db import transaction
+from django.db.models import F, Q
+from .models import (
+    BillingSubscription, TrainerSubscription, Organization, Invoice, SubscriptionPlan, StripePrice,
+    WebhookEvent
+)
 from .services import InvoiceService
 import logging
+import threading
+from datetime import timezone as dt_timezone
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +28,119 @@ logger = logging.getLogger(__name__)
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
+class StripePriceCache:
+    """In-process cache of Stripe price IDs per (plan, billing period, amount)
+
+    Lookups hit process memory first, then the StripePrice table; Stripe is
+    only called the first time an amount is seen. The amount is part of the
+    key, so changing a plan's price mints a new Stripe price and retires the
+    old one instead of reusing it. ``client`` may be any object exposing
+    ``Product.create``, ``Price.create`` and ``Price.modify`` like the stripe
+    module (tests pass a stub).
+    """
+    
+    CURRENCY = 'mad'
+    INTERVALS = {'monthly': 'month', 'annual': 'year'}
+    
+    _prices = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def clear():
+        with StripePriceCache._lock:
+            StripePriceCache._prices.clear()
+    
+    @staticmethod
+    def unit_amount(plan, billing_period):
+        amount = plan.price_for(billing_period)
+        if amount is None:
+            raise ValidationError(f"Plan {plan.key} has no {billing_period} price")
+        return int((amount * 100).to_integral_value())
+    
+    @staticmethod
+    def get_price_id(plan, billing_period='monthly', client=None):
+        if billing_period not in StripePriceCache.INTERVALS:
+            raise ValidationError(f"Unknown billing period: {billing_period}")
+        key = (plan.pk, billing_period, StripePriceCache.unit_amount(plan, billing_period))
+        price_id = StripePriceCache._prices.get(key)
+        if price_id is None:
+            with StripePriceCache._lock:
+                price_id = StripePriceCache._prices.get(key)
+                if price_id is None:
+                    price_id = StripePriceCache._load_or_mint(plan, *key[1:], client=client or stripe)
+                    # Prices for other amounts of this plan and period were just retired
+                    for stale in [k for k in StripePriceCache._prices if k[:2] == key[:2] and k != key]:
+                        del StripePriceCache._prices[stale]
+                    StripePriceCache._prices[key] = price_id
+        return price_id
+    
+    @staticmethod
+    def _load_or_mint(plan, billing_period, unit_amount, client):
+        """Active price ID for the amount, reactivating a retired one or minting a new one"""
+        lookup = {
+            'plan': plan, 'billing_period': billing_period,
+            'unit_amount': unit_amount, 'currency': StripePriceCache.CURRENCY,
+        }
+        existing = StripePrice.objects.filter(is_active=True, **lookup).values_list(
+            'stripe_price_id', flat=True
+        ).first()
+        if existing:
+            return existing
+        
+        try:
+            with transaction.atomic():
+                # Serialize minting per plan across processes
+                locked_plan = SubscriptionPlan.objects.select_for_update().get(pk=plan.pk)
+                stored = StripePrice.objects.filter(**lookup).first()
+                if stored is not None and stored.is_active:
+                    return stored.stripe_price_id
+                
+                if stored is not None:
+                    # The amount went back to an earlier value: revive its archived price
+                    client.Price.modify(stored.stripe_price_id, active=True)
+                    price_id = stored.stripe_price_id
+                else:
+                    if not locked_plan.stripe_product_id:
+                        product = client.Product.create(
+                            name=locked_plan.name,
+                            description=locked_plan.description,
+                            type='service',
+                            metadata={'plan_key': locked_plan.key}
+                        )
+                        locked_plan.stripe_product_id = product.id
+                        locked_plan.save(update_fields=['stripe_product_id'])
+                        plan.stripe_product_id = product.id
+                    
+                    price_id = client.Price.create(
+                        product=locked_plan.stripe_product_id,
+                        unit_amount=unit_amount,
+                        currency=StripePriceCache.CURRENCY,
+                        recurring={'interval': StripePriceCache.INTERVALS[billing_period], 'interval_count': 1},
+                        metadata={'plan_key': locked_plan.key, 'billing_period': billing_period}
+                    ).id
+                
+                retired = StripePrice.objects.filter(
+                    plan=plan, billing_period=billing_period, is_active=True
+                )
+                retired_ids = list(retired.values_list('stripe_price_id', flat=True))
+                retired.update(is_active=False)
+                if stored is not None:
+                    StripePrice.objects.filter(pk=stored.pk).update(is_active=True)
+                else:
+                    StripePrice.objects.create(stripe_price_id=price_id, **lookup)
+        except stripe.error.StripeError as e:
+            logger.error(f"Stripe price creation failed: {str(e)}")
+            raise ValidationError(f"Price creation failed: {str(e)}")
+        
+        # Archive superseded prices so they cannot be picked for new subscriptions
+        for retired_id in retired_ids:
+            try:
+                client.Price.modify(retired_id, active=False)
+            except stripe.error.StripeError as e:
+                logger.warning(f"Could not archive Stripe price {retired_id}: {str(e)}")
+        return price_id
+
+
 class StripeService:
     """Service for Stripe payment integration"""
     
@@ -84,42 +205,9 @@ class StripeService:
             raise ValidationError(f"Subscription creation failed: {str(e)}")
     
     @staticmethod
-    def get_or_create_price(plan):
-        """Get or create a Stripe price for a plan"""
-        # In production, you'd store the Stripe price ID in the model
-        # For now, create a product and price on demand
-        product_id = f"prod_fitmo_{plan.key}"
-        
-        try:
-            # Try to get existing product
-            products = stripe.Product.list(limit=100)
-            for product in products.data:
-                if product.name == plan.name:
-                    product_id = product.id
-                    break
-            else:
-                # Create new product
-                product = stripe.Product.create(
-                    name=plan.name,
-                    description=plan.description,
-                    type='service',
-                    metadata={'plan_key': plan.key}
-                )
-                product_id = product.id
-            
-            # Create price for this product
-            price = stripe.Price.create(
-                product=product_id,
-                unit_amount=int(plan.price_monthly * 100),  # Convert to cents
-                currency='mad',
-                recurring={'interval': 'month', 'interval_count': 1},
-                metadata={'plan_key': plan.key}
-            )
-            
-            return price.id
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe price creation failed: {str(e)}")
-            raise ValidationError(f"Price creation failed: {str(e)}")
+    def get_or_create_price(plan, billing_period='monthly'):
+        """Stripe price ID for a plan; served from StripePriceCache without catalog calls"""
+        return StripePriceCache.get_price_id(plan, billing_period)
     
     @staticmethod
     def cancel_subscription(stripe_subscription_id):
@@ -154,31 +242,54 @@ class StripeService:
             raise ValidationError(f"Update failed: {str(e)}")
 
 
+def event_created_at(event):
+    """Provider `created` timestamp of an event as an aware datetime (now if missing)"""
+    created = event.get('created')
+    if created is None:
+        return timezone.now()
+    return timezone.datetime.fromtimestamp(created, tz=dt_timezone.utc)
+
+
+def apply_subscription_event(provider_subscription_id, event, **changes):
+    """Apply changes unless a newer event was already applied to this subscription
+
+    The check and the write are one conditional UPDATE, so out-of-order
+    deliveries cannot regress the subscription. Returns 'applied', 'stale'
+    or 'missing'.
+    """
+    created = event_created_at(event)
+    subscriptions = BillingSubscription.objects.filter(provider_subscription_id=provider_subscription_id)
+    updated = subscriptions.filter(
+        Q(last_event_at__isnull=True) | Q(last_event_at__lte=created)
+    ).update(last_event_at=created, updated_at=timezone.now(), **changes)
+    if updated:
+        return 'applied'
+    return 'stale' if subscriptions.exists() else 'missing'
+
+
 def handle_subscription_updated(event):
     """Handle Stripe subscription.updated webhook"""
     subscription = event['data']['object']
     
-    try:
-        billing_sub = BillingSubscription.objects.get(
-            provider_subscription_id=subscription['id']
-        )
-        
-        # Update status based on Stripe subscription status
-        status_map = {
-            'active': 'active',
-            'past_due': 'past_due',
-            'cancelled': 'cancelled',
-            'trialing': 'trial'
-        }
-        
-        billing_sub.status = status_map.get(subscription['status'], 'active')
-        billing_sub.current_period_end = timezone.datetime.fromtimestamp(
-            subscription['current_period_end']
-        )
-        billing_sub.save()
-        
-        logger.info(f"Subscription {billing_sub.id} updated to {billing_sub.status}")
-    except BillingSubscription.DoesNotExist:
+    # Update status based on Stripe subscription status
+    status_map = {
+        'active': 'active',
+        'past_due': 'past_due',
+        'cancelled': 'cancelled',
+        'trialing': 'trial'
+    }
+    
+    result = apply_subscription_event(
+        subscription['id'], event,
+        status=status_map.get(subscription['status'], 'active'),
+        current_period_end=timezone.datetime.fromtimestamp(subscription['current_period_end'], tz=dt_timezone.utc),
+    )
+    
+    if result == 'applied':
+        logger.info(f"Subscription {subscription['id']} updated to {subscription['status']}")
+    elif result == 'stale':
+        logger.info(f"Ignored stale update {event['id']} for subscription {subscription['id']}")
+    else:
         logger.warning(f"BillingSubscription not found for Stripe ID {subscription['id']}")
 
 
@@ -186,20 +297,19 @@ def handle_invoice_payment_failed(event):
     """Handle Stripe invoice.payment_failed webhook"""
     invoice = event['data']['object']
     
-    try:
-        billing_sub = BillingSubscription.objects.get(
-            provider_subscription_id=invoice['subscription']
-        )
-        
-        billing_sub.failed_payment_count += 1
-        billing_sub.status = 'past_due'
-        billing_sub.save()
-        
+    result = apply_subscription_event(
+        invoice['subscription'], event,
+        failed_payment_count=F('failed_payment_count') + 1,
+        status='past_due',
+    )
+    
+    if result == 'applied':
         # Send email notification to user
         # TODO: Implement email notification
-        
-        logger.warning(f"Payment failed for subscription {billing_sub.id}")
-    except BillingSubscription.DoesNotExist:
+        logger.warning(f"Payment failed for subscription {invoice['subscription']}")
+    elif result == 'stale':
+        logger.info(f"Ignored stale payment failure {event['id']} for subscription {invoice['subscription']}")
+    else:
         logger.warning(f"BillingSubscription not found for invoice {invoice['id']}")
 
 
@@ -211,22 +321,27 @@ def handle_invoice_payment_succeeded(event):
         billing_sub = BillingSubscription.objects.get(
             provider_subscription_id=invoice['subscription']
         )
-        
-        # Create invoice record
-        if not invoice.get('paid'):
-            return
-        
-        period_start = timezone.datetime.fromtimestamp(invoice['period_start']).date()
-        period_end = timezone.datetime.fromtimestamp(invoice['period_end']).date()
-        
-        # Create or update invoice
-        inv, created = Invoice.objects.get_or_create(
+    except BillingSubscription.DoesNotExist:
+        logger.warning(f"BillingSubscription not found for invoice {invoice['id']}")
+        return
+    
+    # Create invoice record
+    if not invoice.get('paid'):
+        return
+    
+    period_start = timezone.datetime.fromtimestamp(invoice['period_start']).date()
+    period_end = timezone.datetime.fromtimestamp(invoice['period_end']).date()
+    
+    # The invoice is recorded even for late deliveries, once per provider invoice id;
+    # the existence check keeps replays from consuming invoice numbers
+    if not Invoice.objects.filter(provider_invoice_id=invoice['id']).exists():
+        Invoice.objects.get_or_create(
             provider_invoice_id=invoice['id'],
             defaults={
                 'billing_subscription': billing_sub,
                 'trainer_subscription': billing_sub.trainer_subscription,
                 'organization': billing_sub.organization,
-                'invoice_number': InvoiceService.generate_invoice_number(str(billing_sub.id)),
+                'invoice_number': InvoiceService.generate_invoice_number(),
                 'subtotal': Decimal(str(invoice['total'] / 100)),
                 'tax_amount': Decimal(str(invoice['tax'] / 100) if invoice.get('tax') else 0),
                 'total_amount': Decimal(str(invoice['total'] / 100)),
@@ -237,39 +352,136 @@ def handle_invoice_payment_succeeded(event):
                 'due_date': period_end
             }
         )
-        
-        # Reset failed payment count
-        billing_sub.failed_payment_count = 0
-        billing_sub.status = 'active'
-        billing_sub.save()
-        
+    
+    # Reset failed payment count unless a newer event already moved the subscription on
+    result = apply_subscription_event(
+        invoice['subscription'], event,
+        failed_payment_count=0,
+        status='active',
+    )
+    
+    if result == 'applied':
         logger.info(f"Payment succeeded for subscription {billing_sub.id}")
-    except BillingSubscription.DoesNotExist:
-        logger.warning(f"BillingSubscription not found for invoice {invoice['id']}")
+    else:
+        logger.info(f"Recorded late payment {event['id']} for subscription {billing_sub.id} without status change")
 
 
 def handle_customer_subscription_deleted(event):
     """Handle Stripe customer.subscription.deleted webhook"""
     subscription = event['data']['object']
     
-    try:
-        billing_sub = BillingSubscription.objects.get(
-            provider_subscription_id=subscription['id']
-        )
-        
-        billing_sub.status = 'cancelled'
-        billing_sub.cancelled_at = timezone.now()
-        billing_sub.save()
-        
-        logger.info(f"Subscription {billing_sub.id} cancelled via webhook")
-    except BillingSubscription.DoesNotExist:
+    result = apply_subscription_event(
+        subscription['id'], event,
+        status='cancelled',
+        cancelled_at=timezone.now(),
+    )
+    
+    if result == 'applied':
+        logger.info(f"Subscription {subscription['id']} cancelled via webhook")
+    elif result == 'stale':
+        logger.info(f"Ignored stale deletion {event['id']} for subscription {subscription['id']}")
+    else:
         logger.warning(f"BillingSubscription not found for Stripe ID {subscription['id']}")
 
 
+EVENT_HANDLERS = {
+    'customer.subscription.updated': handle_subscription_updated,
+    'invoice.payment_failed': handle_invoice_payment_failed,
+    'invoice.payment_succeeded': handle_invoice_payment_succeeded,
+    'customer.subscription.deleted': handle_customer_subscription_deleted,
+}
+
+
+class WebhookInbox:
+    """Durable queue and ledger of verified webhook events, drained by process_webhook_events
+
+    The unique event_id makes redeliveries a single indexed no-op, and
+    processed rows are never handled again. Claimed rows get a lease
+    through next_attempt_at, so events held by a crashed worker become due
+    again once the lease expires. Failed events are retried with
+    exponential backoff until MAX_ATTEMPTS. Ordering between events for
+    the same subscription is enforced by apply_subscription_event.
+    """
+    
+    MAX_ATTEMPTS = 8
+    BASE_DELAY = 30  # seconds, doubled per attempt
+    MAX_DELAY = 6 * 60 * 60
+    LEASE = 5 * 60
+    
+    @staticmethod
+    def enqueue(event):
+        """Store an event once per event id; returns False for duplicate deliveries"""
+        _, created = WebhookEvent.objects.get_or_create(
+            event_id=event['id'],
+            defaults={
+                'provider': 'stripe',
+                'event_type': event['type'],
+                'event_created': event_created_at(event),
+                'payload': event,
+            }
+        )
+        return created
+    
+    @staticmethod
+    def backoff(attempts):
+        return timezone.timedelta(seconds=min(WebhookInbox.BASE_DELAY * 2 ** (attempts - 1), WebhookInbox.MAX_DELAY))
+    
+    @staticmethod
+    def claim(batch_size):
+        """Lease up to batch_size due events to this worker"""
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(WebhookEvent.objects.select_for_update(skip_locked=True).filter(
+                status__in=('pending', 'processing'),
+                next_attempt_at__lte=now
+            ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+            WebhookEvent.objects.filter(id__in=ids).update(
+                status='processing',
+                next_attempt_at=now + timezone.timedelta(seconds=WebhookInbox.LEASE)
+            )
+        # Oldest provider events first so a batch applies them in the order they happened
+        return list(WebhookEvent.objects.filter(id__in=ids).order_by('event_created', 'received_at', 'id'))
+    
+    @staticmethod
+    def process(webhook_event, handlers=None):
+        """Run the handler for one claimed event and record the outcome"""
+        handler = (handlers or EVENT_HANDLERS).get(webhook_event.event_type)
+        webhook_event.attempts += 1
+        try:
+            if handler:
+                with transaction.atomic():
+                    handler(webhook_event.payload)
+        except Exception as e:
+            logger.error(f"Error handling webhook {webhook_event.event_type} ({webhook_event.event_id}): {str(e)}")
+            webhook_event.last_error = str(e)
+            if webhook_event.attempts >= WebhookInbox.MAX_ATTEMPTS:
+                webhook_event.status = 'failed'
+            else:
+                webhook_event.status = 'pending'
+                webhook_event.next_attempt_at = timezone.now() + WebhookInbox.backoff(webhook_event.attempts)
+        else:
+            webhook_event.status = 'processed'
+            webhook_event.processed_at = timezone.now()
+            webhook_event.last_error = ''
+        webhook_event.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'processed_at'])
+        return webhook_event.status == 'processed'
+    
+    @staticmethod
+    def drain(batch_size=50, handlers=None):
+        """Process one batch of due events; returns (processed, failed) counts"""
+        processed = failed = 0
+        for webhook_event in WebhookInbox.claim(batch_size):
+            if WebhookInbox.process(webhook_event, handlers):
+                processed += 1
+            else:
+                failed += 1
+        return processed, failed
+
+
 @csrf_exempt
 @require_http_methods(['POST'])
 def stripe_webhook(request):
-    """Handle Stripe webhooks"""
+    """Verify a Stripe webhook and queue it; the work happens in process_webhook_events"""
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     
@@ -286,20 +498,7 @@ def stripe_webhook(request):
         logger.error("Invalid webhook signature")
         return JsonResponse({'error': 'Invalid signature'}, status=400)
     
-    # Handle different event types
-    event_handlers = {
-        'customer.subscription.updated': handle_subscription_updated,
-        'invoice.payment_failed': handle_invoice_payment_failed,
-        'invoice.payment_succeeded': handle_invoice_payment_succeeded,
-        'customer.subscription.deleted': handle_customer_subscription_deleted,
-    }
-    
-    handler = event_handlers.get(event['type'])
-    if handler:
-        try:
-            handler(event)
-        except Exception as e:
-            logger.error(f"Error handling webhook {event['type']}: {str(e)}")
-            return JsonResponse({'error': 'Webhook processing failed'}, status=500)
+    if event['type'] in EVENT_HANDLERS:
+        WebhookInbox.enqueue(json.loads(payload))
     
     return JsonResponse({'success': True}, status=200)
@@ -1,3 +1,561 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import time as dt_time, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from bookings.models import Booking
+from trainers.models import Trainer
+from .invoice_pdf import InvoicePdfService
+from .search import OrganizationSearchService, normalize_text
+from .models import (
+    BillingSubscription, Invoice, Organization, StripePrice, SubscriptionPlan, TrainerSubscription, WebhookEvent
+)
+from .services import (
+    CommissionService, InvoiceService, OrganizationService, RenewalBillingService, SubscriptionService
+)
+from .stripe_handler import (
+    StripePriceCache, WebhookInbox, handle_subscription_updated, handle_invoice_payment_failed
+)
 
-# Create your tests here.
+
+class StubStripe:
+    """Records catalog calls instead of talking to Stripe"""
+
+    def __init__(self):
+        self.calls = []
+        stub = self
+
+        class Product:
+            @staticmethod
+            def create(**kwargs):
+                stub.calls.append(('Product.create', kwargs))
+                return SimpleNamespace(id=f'prod_{len(stub.calls)}')
+
+        class Price:
+            @staticmethod
+            def create(**kwargs):
+                stub.calls.append(('Price.create', kwargs))
+                return SimpleNamespace(id=f'price_{len(stub.calls)}')
+
+            @staticmethod
+            def modify(price_id, **kwargs):
+                stub.calls.append(('Price.modify', price_id, kwargs))
+
+        self.Product = Product
+        self.Price = Price
+
+
+class StripePriceCacheTests(TestCase):
+
+    def setUp(self):
+        StripePriceCache.clear()
+        self.stripe = StubStripe()
+        self.plan = SubscriptionPlan.objects.create(
+            key='premium', name='Premium', price_monthly=Decimal('199.00'), price_annual=Decimal('1990.00')
+        )
+
+    def test_price_minted_once_then_cached(self):
+        price_id = StripePriceCache.get_price_id(self.plan, client=self.stripe)
+        self.assertEqual([call[0] for call in self.stripe.calls], ['Product.create', 'Price.create'])
+        self.assertEqual(self.stripe.calls[1][1]['unit_amount'], 19900)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(StripePriceCache.get_price_id(self.plan, client=self.stripe), price_id)
+        self.assertEqual(len(self.stripe.calls), 2)
+
+    def test_other_processes_reuse_stored_price(self):
+        price_id = StripePriceCache.get_price_id(self.plan, client=self.stripe)
+        StripePriceCache.clear()
+        self.assertEqual(StripePriceCache.get_price_id(self.plan, client=self.stripe), price_id)
+        self.assertEqual(len(self.stripe.calls), 2)
+
+    def test_amount_change_mints_new_price_and_retires_old(self):
+        old_id = StripePriceCache.get_price_id(self.plan, client=self.stripe)
+        self.plan.price_monthly = Decimal('249.00')
+        self.plan.save()
+
+        new_id = StripePriceCache.get_price_id(self.plan, client=self.stripe)
+        self.assertNotEqual(new_id, old_id)
+        self.assertEqual([call[0] for call in self.stripe.calls[2:]], ['Price.create', 'Price.modify'])
+        self.assertEqual(self.stripe.calls[3][1], old_id)
+        self.assertEqual(
+            list(StripePrice.objects.filter(is_active=True).values_list('stripe_price_id', flat=True)), [new_id]
+        )
+
+    def test_amount_reverting_reactivates_archived_price(self):
+        first_id = StripePriceCache.get_price_id(self.plan, client=self.stripe)
+        self.plan.price_monthly = Decimal('249.00')
+        self.plan.save()
+        second_id = StripePriceCache.get_price_id(self.plan, client=self.stripe)
+        self.plan.price_monthly = Decimal('199.00')
+        self.plan.save()
+        del self.stripe.calls[:]
+
+        self.assertEqual(StripePriceCache.get_price_id(self.plan, client=self.stripe), first_id)
+        self.assertEqual(self.stripe.calls, [
+            ('Price.modify', first_id, {'active': True}),
+            ('Price.modify', second_id, {'active': False}),
+        ])
+        self.assertEqual(
+            list(StripePrice.objects.filter(is_active=True).values_list('stripe_price_id', flat=True)), [first_id]
+        )
+        self.assertNotIn((self.plan.pk, 'monthly', 24900), StripePriceCache._prices)
+
+        # Another process that never saw the change reads the active row, not the retired one
+        StripePriceCache.clear()
+        self.assertEqual(StripePriceCache.get_price_id(self.plan, client=self.stripe), first_id)
+
+    def test_annual_price_uses_yearly_interval(self):
+        StripePriceCache.get_price_id(self.plan, 'monthly', client=self.stripe)
+        StripePriceCache.get_price_id(self.plan, 'annual', client=self.stripe)
+        price_call = self.stripe.calls[-1][1]
+        self.assertEqual(price_call['recurring']['interval'], 'year')
+        self.assertEqual(price_call['unit_amount'], 199000)
+        # The product is shared across billing periods
+        self.assertEqual(sum(1 for call in self.stripe.calls if call[0] == 'Product.create'), 1)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class WebhookInboxTests(TestCase):
+
+    def post_event(self, event_id, event_type='invoice.payment_failed'):
+        payload = json.dumps({
+            'id': event_id, 'type': event_type, 'object': 'event',
+            'data': {'object': {'id': 'in_1', 'subscription': 'sub_1'}},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(b'whsec_test', f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('payments:stripe-webhook'), payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}'
+        )
+
+    def test_webhook_only_queues_event_once(self):
+        self.assertEqual(self.post_event('evt_1').status_code, 200)
+        self.assertEqual(self.post_event('evt_1').status_code, 200)
+        self.assertEqual(WebhookEvent.objects.filter(status='pending').count(), 1)
+
+    def test_drain_retries_with_backoff_then_gives_up(self):
+        self.post_event('evt_2')
+        calls = []
+
+        def failing_handler(event):
+            calls.append(event['id'])
+            raise RuntimeError('database unavailable')
+
+        handlers = {'invoice.payment_failed': failing_handler}
+        self.assertEqual(WebhookInbox.drain(handlers=handlers), (0, 1))
+        event = WebhookEvent.objects.get(event_id='evt_2')
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertGreater(event.next_attempt_at, timezone.now() + timedelta(seconds=20))
+
+        # Not due yet
+        self.assertEqual(WebhookInbox.drain(handlers=handlers), (0, 0))
+
+        for _ in range(WebhookInbox.MAX_ATTEMPTS - 1):
+            WebhookEvent.objects.update(next_attempt_at=timezone.now())
+            WebhookInbox.drain(handlers=handlers)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('failed', WebhookInbox.MAX_ATTEMPTS))
+        self.assertEqual(len(calls), WebhookInbox.MAX_ATTEMPTS)
+
+    def test_drain_marks_event_processed(self):
+        self.post_event('evt_3')
+        self.assertEqual(WebhookInbox.drain(handlers={'invoice.payment_failed': lambda event: None}), (1, 0))
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt_3').status, 'processed')
+
+
+class WebhookOrderingTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.billing = BillingSubscription.objects.create(
+            provider_subscription_id='sub_1', status='active',
+            current_period_start=now, current_period_end=now + timedelta(days=30),
+        )
+
+    def subscription_event(self, event_id, created, status):
+        return {
+            'id': event_id, 'type': 'customer.subscription.updated', 'created': created,
+            'data': {'object': {'id': 'sub_1', 'status': status, 'current_period_end': created + 86400}},
+        }
+
+    def test_stale_event_does_not_regress_status(self):
+        handle_subscription_updated(self.subscription_event('evt_new', 2000, 'past_due'))
+        handle_subscription_updated(self.subscription_event('evt_old', 1000, 'active'))
+        self.billing.refresh_from_db()
+        self.assertEqual(self.billing.status, 'past_due')
+        self.assertEqual(int(self.billing.last_event_at.timestamp()), 2000)
+
+    def test_stale_payment_failure_is_ignored(self):
+        handle_subscription_updated(self.subscription_event('evt_new', 2000, 'active'))
+        handle_invoice_payment_failed({
+            'id': 'evt_fail', 'type': 'invoice.payment_failed', 'created': 1500,
+            'data': {'object': {'id': 'in_1', 'subscription': 'sub_1'}},
+        })
+        self.billing.refresh_from_db()
+        self.assertEqual((self.billing.status, self.billing.failed_payment_count), ('active', 0))
+
+    def test_batch_applies_events_in_created_order(self):
+        WebhookInbox.enqueue(self.subscription_event('evt_b', 2000, 'past_due'))
+        WebhookInbox.enqueue(self.subscription_event('evt_a', 1000, 'trialing'))
+        self.assertEqual(WebhookInbox.drain(), (2, 0))
+        self.billing.refresh_from_db()
+        self.assertEqual(self.billing.status, 'past_due')
+
+
+class RenewalBillingTests(TestCase):
+
+    def setUp(self):
+        self.plan = SubscriptionPlan.objects.create(
+            key='premium', name='Premium', price_monthly=Decimal('99.00'), price_annual=Decimal('990.00')
+        )
+        self.now = timezone.now()
+
+    def billing(self, period_end, billing_period='monthly', status='active'):
+        return BillingSubscription.objects.create(
+            plan=self.plan, status=status, billing_period=billing_period,
+            current_period_start=period_end - timedelta(days=30), current_period_end=period_end,
+        )
+
+    def test_invoice_numbers_are_consecutive_and_unique(self):
+        first = InvoiceService.allocate_invoice_numbers(3, year=2026)
+        second = InvoiceService.allocate_invoice_numbers(2, year=2026)
+        self.assertEqual(first + second, [f'INV-2026-{i:06d}' for i in range(1, 6)])
+
+    def test_run_bills_due_subscriptions_in_chunks(self):
+        due = [self.billing(self.now - timedelta(days=1)) for _ in range(5)]
+        annual = self.billing(self.now - timedelta(hours=1), billing_period='annual')
+        self.billing(self.now + timedelta(days=3))
+        self.billing(self.now - timedelta(days=1), status='cancelled')
+
+        self.assertEqual(RenewalBillingService.run(now=self.now, batch_size=2), 6)
+        self.assertEqual(Invoice.objects.count(), 6)
+        self.assertEqual(len(set(Invoice.objects.values_list('invoice_number', flat=True))), 6)
+        self.assertEqual(Invoice.objects.get(billing_subscription=annual).total_amount, Decimal('990.00'))
+
+        due[0].refresh_from_db()
+        self.assertGreater(due[0].current_period_end, self.now)
+
+        # Nothing left to bill on a re-run
+        self.assertEqual(RenewalBillingService.run(now=self.now), 0)
+
+    def test_command_run_twice_bills_each_period_once(self):
+        local = self.billing(self.now - timedelta(days=1))
+        stripe_managed = self.billing(self.now - timedelta(days=1))
+        stripe_managed.provider_subscription_id = 'sub_123'
+        stripe_managed.save()
+        # A period already invoiced elsewhere is advanced without a second invoice
+        billed = self.billing(self.now - timedelta(days=2))
+        Invoice.objects.create(
+            billing_subscription=billed, invoice_number='INV-X-1', subtotal=Decimal('99.00'),
+            total_amount=Decimal('99.00'), period_start=timezone.localdate(billed.current_period_end),
+            period_end=timezone.localdate(self.now + timedelta(days=28)), due_date=timezone.localdate(self.now),
+        )
+
+        call_command('run_renewal_billing', stdout=io.StringIO())
+        call_command('run_renewal_billing', stdout=io.StringIO())
+
+        self.assertEqual(Invoice.objects.filter(billing_subscription=local).count(), 1)
+        self.assertEqual(Invoice.objects.filter(billing_subscription=billed).count(), 1)
+        self.assertFalse(Invoice.objects.filter(billing_subscription=stripe_managed).exists())
+        billed.refresh_from_db()
+        self.assertGreater(billed.current_period_end, self.now)
+
+    def test_subscription_several_periods_behind_catches_up(self):
+        billing = self.billing(self.now - timedelta(days=65))
+        self.assertEqual(RenewalBillingService.run(now=self.now), 3)
+        periods = list(Invoice.objects.filter(billing_subscription=billing).order_by('period_start')
+                       .values_list('period_start', 'period_end'))
+        self.assertEqual([start for start, _ in periods[1:]], [end for _, end in periods[:-1]])
+
+    @override_settings(BILLING_SETTINGS={'INVOICE_DUE_DAYS': 10})
+    def test_due_date_follows_billing_settings(self):
+        self.billing(self.now - timedelta(days=1))
+        RenewalBillingService.run(now=self.now)
+        self.assertEqual(Invoice.objects.get().due_date, timezone.localdate(self.now) + timedelta(days=10))
+
+
+class CommissionRecalculationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.basic = SubscriptionPlan.objects.create(
+            key='basic', name='Basic', price_monthly=Decimal('49.00'), commission_rate=Decimal('15')
+        )
+        self.premium = SubscriptionPlan.objects.create(
+            key='premium', name='Premium', price_monthly=Decimal('99.00'), commission_rate=Decimal('10')
+        )
+        client = get_user_model().objects.create_user(username='client', password='pass12345', user_type='client')
+        self.trainers = []
+        for i in range(3):
+            user = get_user_model().objects.create_user(username=f'coach{i}', password='pass12345', user_type='trainer')
+            self.trainers.append(Trainer.objects.create(user=user, price_per_hour=Decimal('200')))
+            for j, status in enumerate(('pending', 'confirmed', 'completed')):
+                Booking.objects.create(
+                    client=client, trainer=self.trainers[-1], booking_date=timezone.now().date(),
+                    start_time=dt_time(8 + j), duration_minutes=60, status=status, total_price=Decimal('100.05'),
+                )
+        ends = timezone.now() + timedelta(days=30)
+        TrainerSubscription.objects.create(trainer=self.trainers[0].user, plan=self.basic, subscription_end=ends)
+        TrainerSubscription.objects.create(trainer=self.trainers[1].user, plan=self.premium, subscription_end=ends)
+
+    def test_rates_resolved_in_one_query(self):
+        users = [trainer.user_id for trainer in self.trainers]
+        with self.assertNumQueries(1):
+            rates = SubscriptionService.get_commission_rates(users)
+        self.assertEqual(rates, dict(zip(users, [Decimal('15'), Decimal('10'), Decimal('20')])))
+
+    def test_rates_cached_until_subscription_or_plan_changes(self):
+        users = [trainer.user_id for trainer in self.trainers]
+        SubscriptionService.get_commission_rates(users)
+        with self.assertNumQueries(0):
+            self.assertEqual(SubscriptionService.get_commission_rate(self.trainers[0].user), Decimal('15'))
+
+        self.basic.commission_rate = Decimal('12')
+        self.basic.save()
+        self.assertEqual(SubscriptionService.get_commission_rates(users)[users[0]], Decimal('12'))
+
+        subscription = TrainerSubscription.objects.get(trainer_id=users[1])
+        subscription.subscription_end = timezone.now() - timedelta(days=1)
+        subscription.save()
+        with self.assertNumQueries(1):
+            rates = SubscriptionService.get_commission_rates(users)
+        self.assertEqual(rates[users[1]], Decimal('20'))
+
+    def test_open_bookings_repriced_in_one_update(self):
+        with self.assertNumQueries(3):
+            updated = CommissionService.recalculate_bookings()
+        self.assertEqual(updated, 6)
+
+        booking = Booking.objects.get(trainer=self.trainers[0], status='pending')
+        self.assertEqual(booking.commission_rate, Decimal('15'))
+        self.assertEqual(booking.commission_amount, Decimal('15.01'))
+        self.assertEqual(booking.trainer_earnings, Decimal('85.04'))
+        completed = Booking.objects.get(trainer=self.trainers[0], status='completed')
+        self.assertEqual(completed.commission_amount, Decimal('0'))
+
+    def test_bulk_and_single_recalculation_round_alike(self):
+        booking = Booking.objects.filter(trainer=self.trainers[0], status='pending').first()
+        single = CommissionService.calculate_booking_commission(Booking.objects.get(pk=booking.pk))
+        CommissionService.recalculate_bookings(Booking.objects.filter(pk=booking.pk))
+        booking.refresh_from_db()
+        self.assertEqual(single.commission_amount, Decimal('15.01'))  # 100.05 * 15% = 15.0075
+        self.assertEqual((booking.commission_amount, booking.trainer_earnings),
+                         (single.commission_amount, single.trainer_earnings))
+
+    def test_plan_upgrade_reprices_trainer_bookings(self):
+        SubscriptionService.upgrade_trainer_plan(self.trainers[0].user, 'premium')
+        rates = set(Booking.objects.filter(trainer=self.trainers[0], status__in=('pending', 'confirmed'))
+                    .values_list('commission_rate', flat=True))
+        self.assertEqual(rates, {Decimal('10')})
+        self.assertFalse(Booking.objects.filter(trainer=self.trainers[1], commission_amount__gt=0).exists())
+
+    def test_org_plan_upgrade_leaves_trainer_plans_and_bookings(self):
+        owner = get_user_model().objects.create_user(username='owner', password='pass12345')
+        org_basic = SubscriptionPlan.objects.create(
+            key='org_basic', name='Org Basic', price_monthly=Decimal('299.00'), is_org_plan=True, included_seats=5
+        )
+        SubscriptionPlan.objects.create(
+            key='org_pro', name='Org Pro', price_monthly=Decimal('599.00'), is_org_plan=True, included_seats=10
+        )
+        organization = Organization.objects.create(name='Atlas Gym', owner=owner, subscription_plan=org_basic)
+        subscription = self.trainers[0].user.trainer_subscription
+        subscription.organization = organization
+        subscription.save()
+        before = list(Booking.objects.order_by('id').values_list('commission_rate', 'commission_amount'))
+
+        OrganizationService.upgrade_organization_plan(organization, 'org_pro')
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.plan, self.basic)
+        self.assertEqual(list(Booking.objects.order_by('id').values_list('commission_rate', 'commission_amount')), before)
+
+    def test_grouped_earnings_summary_single_query(self):
+        user = self.trainers[0].user
+        Booking.objects.filter(trainer=self.trainers[0]).update(
+            status='completed', commission_amount=Decimal('15.00'), trainer_earnings=Decimal('85.05')
+        )
+        with self.assertNumQueries(1):
+            summary = CommissionService.get_trainer_earnings_summary(user, group_by='month')
+        self.assertEqual(summary['total_bookings'], 3)
+        self.assertEqual(summary['total_commission'], Decimal('45.00'))
+        self.assertEqual([group['key'] for group in summary['groups']], [timezone.now().strftime('%Y-%m')])
+
+        self.client.force_login(user)
+        url = reverse('payments:trainer-earnings-summary')
+        response = self.client.get(url, {'group_by': 'organization'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['groups'][0]['total_bookings'], 3)
+        self.assertEqual(self.client.get(url, {'group_by': 'client'}).status_code, 400)
+
+
+class InvoicePdfTests(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        settings_override = override_settings(INVOICE_PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = get_user_model().objects.create(username='owner')
+        self.organization = Organization.objects.create(name='Atlas Gym', owner=self.owner)
+        now = timezone.now()
+        billing = BillingSubscription.objects.create(
+            organization=self.organization, current_period_start=now, current_period_end=now
+        )
+        self.invoices = [
+            InvoiceService.create_invoice(billing, now.date(), now.date() + timedelta(days=30), Decimal('500'))
+            for _ in range(3)
+        ]
+        self.client.force_login(self.owner)
+
+    def test_rendering_is_deterministic_and_cached(self):
+        invoice = self.invoices[0]
+        self.assertEqual(InvoicePdfService.render(invoice), InvoicePdfService.render(invoice))
+        self.assertTrue(InvoicePdfService.render(invoice).startswith(b'%PDF-1.4'))
+
+        name = InvoicePdfService.get_cached(invoice)
+        invoice.notes = 'Updated'
+        invoice.save()
+        self.assertNotEqual(InvoicePdfService.get_cached(invoice), name)
+        self.assertEqual(len(InvoicePdfService.storage().listdir(str(invoice.id))[1]), 1)
+
+    def test_arabic_names_are_transliterated(self):
+        self.organization.name = 'نادي الأطلس'
+        self.organization.save()
+        pdf = InvoicePdfService.render(self.invoices[0])
+        self.assertIn(b'(Billed to: nady alatls)', pdf)
+
+    def test_download_supports_ranges(self):
+        url = reverse('payments:invoice-download', args=[self.invoices[0].id])
+        full = b''.join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_RANGE='bytes=0-99')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-99/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[:100])
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(full)}-').status_code, 416)
+
+    def test_month_export_streams_zip(self):
+        month = timezone.now().date().strftime('%Y-%m')
+        response = self.client.get(
+            reverse('payments:invoice-export'), {'organization': str(self.organization.id), 'month': month}
+        )
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), sorted(f'{i.invoice_number}.pdf' for i in self.invoices))
+        self.assertTrue(archive.read(archive.namelist()[0]).startswith(b'%PDF'))
+
+
+class InvoiceApiPaginationTests(TestCase):
+    """Page-number responses by default; keyset pages only when a cursor is passed"""
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create(username='owner')
+        organization = Organization.objects.create(name='Atlas Gym', owner=self.owner)
+        now = timezone.now()
+        billing = BillingSubscription.objects.create(
+            organization=organization, current_period_start=now, current_period_end=now
+        )
+        for _ in range(25):
+            InvoiceService.create_invoice(billing, now.date(), now.date() + timedelta(days=30), Decimal('500'))
+        self.url = reverse('payments:invoice-list')
+        self.client.force_login(self.owner)
+
+    def test_default_shape_is_page_number(self):
+        first = self.client.get(self.url).json()
+        self.assertEqual(set(first), {'count', 'next', 'previous', 'results'})
+        self.assertEqual(first['count'], 25)
+        self.assertIsNone(first['previous'])
+        self.assertEqual(len(first['results']), 20)
+
+        second = self.client.get(first['next']).json()
+        self.assertIsNotNone(second['previous'])
+        self.assertEqual(len(second['results']), 5)
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 25)
+
+    def test_cursor_opts_in_to_keyset_pages(self):
+        first = self.client.get(self.url, {'cursor': ''}).json()
+        self.assertEqual(set(first), {'next', 'results'})
+        self.assertEqual(len(first['results']), 20)
+
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 25)
+
+        counted = self.client.get(self.url, {'cursor': '', 'count': '1'}).json()
+        self.assertEqual(counted['count'], 25)
+
+
+class OrganizationSearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        owner = get_user_model().objects.create_user(username='owner', password='pass12345')
+        clubs = [
+            ('نادي الأطلس الرياضي', 'مراكش', 'قاعة حديثة'),
+            ('Atlas Fitness Club', 'Marrakech', 'Cross training'),
+            ('Café Élan Gym', 'Rabat', 'Near the Atlas cinema'),
+            ('Ocean Gym', 'Agadir', ''),
+        ]
+        self.clubs = [
+            Organization.objects.create(name=name, city=city, description=description, owner=owner,
+                                        email='club@example.com')
+            for name, city, description in clubs
+        ]
+
+    def search(self, query):
+        return list(OrganizationSearchService.search(Organization.objects.all(), query).order_by(
+            *OrganizationSearchService.RANKED_ORDERING
+        ))
+
+    def test_arabic_and_latin_variants_normalize_together(self):
+        self.assertEqual(normalize_text('الأطلس'), normalize_text('الاطلس'))
+        self.assertEqual(normalize_text('Élan'), 'elan')
+        self.assertEqual(self.search('اطلس'), [self.clubs[0]])
+        self.assertEqual(self.search('cafe elan'), [self.clubs[2]])
+
+    def test_prefix_match_ranked_by_field_weight(self):
+        # Name match beats a description match; every word must match
+        self.assertEqual(self.search('atl'), [self.clubs[1], self.clubs[2]])
+        self.assertEqual(self.search('atlas gym'), [self.clubs[2]])
+        self.assertEqual(self.search('zzz'), [])
+
+    def test_index_follows_edits(self):
+        ocean = self.clubs[3]
+        ocean.name = 'Atlas Ocean'
+        ocean.save()
+        self.assertEqual(self.search('atlas')[0], ocean)
+
+    def test_directory_pages_ranked_results(self):
+        for i in range(13):
+            Organization.objects.create(name=f'Gym {i}', owner=self.clubs[0].owner, email='gym@example.com')
+        url = reverse('clubs_directory')
+        first = self.client.get(url, {'search': 'gym'})
+        self.assertEqual(len(first.context['clubs']), 12)
+        self.assertIsNotNone(first.context['next_cursor'])
+        second = self.client.get(url, {'search': 'gym', 'cursor': first.context['next_cursor']})
+        names = [club.name for club in list(first.context['clubs']) + list(second.context['clubs'])]
+        self.assertEqual(len(names), 15)
+        self.assertEqual(len(set(names)), 15)
+
+    def test_autocomplete_cached(self):
+        url = reverse('club_autocomplete')
+        response = self.client.get(url, {'q': 'Atl'})
+        self.assertEqual([row['name'] for row in response.json()['results']][0], 'Atlas Fitness Club')
+        with self.assertNumQueries(0):
+            self.client.get(url, {'q': 'atl'})
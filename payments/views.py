@@ -6,13 +6,16 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from core.pagination import KeysetPagination
 from .models import (
     SubscriptionPlan, Organization, TrainerSubscription, BillingSubscription,
     OrganizationInvitation, Invoice
 )
 from .services import SubscriptionService, OrganizationService, CommissionService
+from .invoice_pdf import InvoicePdfService
 from .serializers import (
     SubscriptionPlanSerializer, OrganizationSerializer, TrainerSubscriptionSerializer,
     OrganizationInvitationSerializer, InvoiceSerializer
@@ -95,11 +98,15 @@ class TrainerSubscriptionViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def earnings_summary(self, request):
-        """Get trainer earnings summary"""
+        """Get trainer earnings summary, optionally grouped (?group_by=month|session_type|organization)"""
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
+        group_by = request.query_params.get('group_by')
         
-        summary = CommissionService.get_trainer_earnings_summary(request.user, start_date, end_date)
+        try:
+            summary = CommissionService.get_trainer_earnings_summary(request.user, start_date, end_date, group_by)
+        except ValidationError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(summary)
 
 
@@ -228,6 +235,8 @@ class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
     """Invoice management"""
     permission_classes = [IsAuthenticated]
     serializer_class = InvoiceSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-issue_date', '-id')
     
     def get_queryset(self):
         """Users see only their invoices"""
@@ -239,7 +248,33 @@ class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
-        """Download invoice as PDF"""
+        """Download invoice as PDF (cached, supports Range requests)"""
         invoice = self.get_object()
-        # TODO: Implement PDF generation
-        return Response({'detail': 'PDF generation coming soon'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        return InvoicePdfService.file_response(request, invoice)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream a ZIP of an organization's invoices issued in one month: ?organization=<id>&month=YYYY-MM"""
+        try:
+            year, month = (int(part) for part in request.query_params.get('month', '').split('-'))
+            if not 1 <= month <= 12:
+                raise ValueError
+        except ValueError:
+            return Response({'detail': 'month must be YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            organization = Organization.objects.get(
+                id=request.query_params.get('organization'), owner=request.user
+            )
+        except (Organization.DoesNotExist, ValidationError):
+            return Response({'detail': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        invoices = Invoice.objects.filter(
+            organization=organization, issue_date__year=year, issue_date__month=month
+        ).select_related('organization').order_by('issue_date', 'invoice_number')
+        
+        response = StreamingHttpResponse(
+            InvoicePdfService.iter_zip(invoices.iterator()), content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="invoices-{year}-{month:02d}.zip"'
+        return response
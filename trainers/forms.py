@@ -1,5 +1,6 @@
 from django import forms
 from .models import Trainer, TrainerAvailability, Certificate
+from .reference import ReferenceData
 from trainers.models import SessionType
 
 class TrainerProfileUpdateForm(forms.ModelForm):
@@ -17,6 +18,11 @@ class TrainerProfileUpdateForm(forms.ModelForm):
             'price_per_hour': 'السعر بالساعة (درهم)',
             'bio': 'نبذة عنك',
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Render the checkboxes from the reference registry; the queryset is only hit on submit
+        self.fields['specialties'].choices = ReferenceData.session_type_choices()
 
 
 class TrainerAvailabilityForm(forms.ModelForm):
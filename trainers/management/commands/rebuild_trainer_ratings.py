@@ -0,0 +1,19 @@
+"""
+Django management command to reconcile trainer ratings with their reviews
+Usage: python manage.py rebuild_trainer_ratings
+"""
+from django.core.management.base import BaseCommand
+from bookings.services import RatingService
+from core.services import LandingPageCache
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Trainer.rating, rating_sum, total_reviews and rating histograms from one grouped query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk update')
+
+    def handle(self, *args, **options):
+        updated = RatingService.rebuild_all(batch_size=options['batch_size'])
+        LandingPageCache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt ratings for {updated} reviewed trainers'))
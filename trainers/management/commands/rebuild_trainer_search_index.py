@@ -0,0 +1,17 @@
+"""
+Django management command to rebuild the trainer search index
+Usage: python manage.py rebuild_trainer_search_index
+"""
+from django.core.management.base import BaseCommand
+from trainers.services import TrainerSearchService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild TrainerSearchIndex for all approved trainers (run after editing City rows)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        indexed = TrainerSearchService.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {indexed} approved trainers'))
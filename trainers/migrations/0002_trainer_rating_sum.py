@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:54
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rating_sum(apps, schema_editor):
+    Trainer = apps.get_model('trainers', 'Trainer')
+    Review = apps.get_model('bookings', 'Review')
+
+    rows = Review.objects.values('trainer').annotate(total=Sum('rating'), count=Count('id')).order_by()
+    for row in rows:
+        Trainer.objects.filter(pk=row['trainer']).update(
+            rating_sum=row['total'],
+            total_reviews=row['count'],
+            rating=row['total'] / row['count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0001_initial'),
+        ('bookings', '0003_booking_trainer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainer',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_histograms(apps, schema_editor):
+    TrainerRatingHistogram = apps.get_model('trainers', 'TrainerRatingHistogram')
+    Review = apps.get_model('bookings', 'Review')
+
+    histograms = {}
+    rows = Review.objects.values('trainer', 'rating').annotate(count=Count('id')).order_by()
+    for row in rows:
+        histogram = histograms.setdefault(row['trainer'], TrainerRatingHistogram(trainer_id=row['trainer']))
+        setattr(histogram, f"stars_{row['rating']}", row['count'])
+    TrainerRatingHistogram.objects.bulk_create(histograms.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0002_trainer_rating_sum'),
+        ('bookings', '0003_booking_trainer_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainerRatingHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stars_1', models.IntegerField(default=0)),
+                ('stars_2', models.IntegerField(default=0)),
+                ('stars_3', models.IntegerField(default=0)),
+                ('stars_4', models.IntegerField(default=0)),
+                ('stars_5', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trainer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rating_histogram', to='trainers.trainer')),
+            ],
+            options={
+                'verbose_name': 'توزيع تقييمات المدرب',
+                'verbose_name_plural': 'توزيعات تقييمات المدربين',
+            },
+        ),
+        migrations.RunPython(populate_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:57
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normalize_city(value, cities):
+    # Frozen copy of TrainerSearchService.normalize_city as of this migration
+    text = re.sub(r'\s+', ' ', (value or '').strip()).casefold()
+    if not text:
+        return ''
+    for name, code in cities:
+        if text in (name.casefold(), code.casefold()):
+            return code.casefold()
+    return text[:100]
+
+
+def populate_search_index(apps, schema_editor):
+    City = apps.get_model('trainers', 'City')
+    Trainer = apps.get_model('trainers', 'Trainer')
+    TrainerSearchIndex = apps.get_model('trainers', 'TrainerSearchIndex')
+
+    cities = list(City.objects.values_list('name', 'code'))
+    specialties = {}
+    for trainer_id, specialty_id in Trainer.specialties.through.objects.values_list('trainer_id', 'sessiontype_id'):
+        specialties.setdefault(trainer_id, []).append(specialty_id)
+
+    entries = []
+    for trainer in Trainer.objects.filter(is_approved=True).select_related('user'):
+        ids = sorted(specialties.get(trainer.id, []))
+        entries.append(TrainerSearchIndex(
+            trainer=trainer,
+            city_code=normalize_city(trainer.user.city, cities),
+            specialty_ids=f",{','.join(str(i) for i in ids)}," if ids else '',
+            price_per_hour=trainer.price_per_hour,
+            rating=trainer.rating,
+            experience_years=trainer.experience_years,
+            total_reviews=trainer.total_reviews,
+        ))
+    TrainerSearchIndex.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0003_trainerratinghistogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainerSearchIndex',
+            fields=[
+                ('trainer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='trainers.trainer')),
+                ('city_code', models.CharField(blank=True, max_length=100)),
+                ('specialty_ids', models.CharField(blank=True, max_length=500)),
+                ('price_per_hour', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('rating', models.FloatField(default=0.0)),
+                ('experience_years', models.IntegerField(default=0)),
+                ('total_reviews', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'فهرس بحث المدربين',
+                'verbose_name_plural': 'فهارس بحث المدربين',
+                'indexes': [models.Index(fields=['-rating', 'trainer'], name='tsi_rating'), models.Index(fields=['price_per_hour', 'trainer'], name='tsi_price'), models.Index(fields=['-experience_years', 'trainer'], name='tsi_experience'), models.Index(fields=['city_code', '-rating', 'trainer'], name='tsi_city_rating'), models.Index(fields=['city_code', 'price_per_hour', 'trainer'], name='tsi_city_price'), models.Index(fields=['city_code', '-experience_years', 'trainer'], name='tsi_city_experience')],
+            },
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
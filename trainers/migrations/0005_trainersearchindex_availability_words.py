@@ -0,0 +1,119 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+# Frozen copy of the bitmap layout as of this migration: one bit per 15 minutes from
+# Monday 00:00, 48 bits (half a day) per availability_w<i> column
+SLOTS_PER_DAY = 96
+WORDS = 14
+WORD_SLOTS = 48
+
+
+def windows_bitmap(windows):
+    bitmap = 0
+    for day, start, end in windows:
+        first = -(-(start.hour * 60 + start.minute) // 15)
+        last = (end.hour * 60 + end.minute) // 15 or SLOTS_PER_DAY  # 00:00 ends the day
+        if last > first:
+            bitmap |= ((1 << (last - first)) - 1) << (int(day) * SLOTS_PER_DAY + first)
+    return bitmap
+
+
+def populate_availability_words(apps, schema_editor):
+    TrainerAvailability = apps.get_model('trainers', 'TrainerAvailability')
+    TrainerSearchIndex = apps.get_model('trainers', 'TrainerSearchIndex')
+
+    windows = {}
+    for trainer_id, day, start, end in TrainerAvailability.objects.values_list(
+        'trainer_id', 'day_of_week', 'start_time', 'end_time'
+    ):
+        windows.setdefault(trainer_id, []).append((day, start, end))
+
+    fields = [f'availability_w{i}' for i in range(WORDS)]
+    entries = list(TrainerSearchIndex.objects.all())
+    for entry in entries:
+        bitmap = windows_bitmap(windows.get(entry.trainer_id, []))
+        for i, field in enumerate(fields):
+            setattr(entry, field, (bitmap >> (i * WORD_SLOTS)) & ((1 << WORD_SLOTS) - 1))
+    TrainerSearchIndex.objects.bulk_update(entries, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0004_trainersearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w0',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w1',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w2',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w3',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w4',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w5',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w6',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w7',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w8',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w9',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w10',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w11',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w12',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainersearchindex',
+            name='availability_w13',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_availability_words, migrations.RunPython.noop),
+    ]
@@ -63,6 +63,7 @@ class Trainer(models.Model):
     is_approved = models.BooleanField(default=False)
     rating = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
     total_reviews = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)  # Running sum of review stars, rating = rating_sum / total_reviews
     total_sessions = models.IntegerField(default=0)
     earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
@@ -81,11 +82,86 @@ class Trainer(models.Model):
         return f"{self.user.get_full_name()} - {self.experience_years} سنوات"
     
     def average_rating(self):
-        from bookings.models import Review
-        reviews = Review.objects.filter(trainer=self)
-        if not reviews.exists():
-            return 0
-        return sum(r.rating for r in reviews) / reviews.count()
+        """Average review rating, maintained incrementally by bookings.services.RatingService"""
+        return self.rating
+
+
+class TrainerRatingHistogram(models.Model):
+    """Materialized star distribution of a trainer's reviews"""
+    trainer = models.OneToOneField(Trainer, on_delete=models.CASCADE, related_name='rating_histogram')
+    stars_1 = models.IntegerField(default=0)
+    stars_2 = models.IntegerField(default=0)
+    stars_3 = models.IntegerField(default=0)
+    stars_4 = models.IntegerField(default=0)
+    stars_5 = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'توزيع تقييمات المدرب'
+        verbose_name_plural = 'توزيعات تقييمات المدربين'
+    
+    def __str__(self):
+        return f"{self.trainer_id} - {self.counts()}"
+    
+    @staticmethod
+    def field_for(stars):
+        return f"stars_{stars}"
+    
+    def counts(self):
+        """Review counts keyed by star value, 5 first"""
+        return {stars: getattr(self, self.field_for(stars)) for stars in range(5, 0, -1)}
+    
+    def distribution(self):
+        """Rows of (stars, count, percent) for rendering, 5 stars first"""
+        counts = self.counts()
+        total = sum(counts.values())
+        return [
+            {'stars': stars, 'count': count, 'percent': round(count * 100 / total) if total else 0}
+            for stars, count in counts.items()
+        ]
+
+
+class TrainerSearchIndex(models.Model):
+    """Denormalized, indexed search row for each approved trainer"""
+    trainer = models.OneToOneField(Trainer, on_delete=models.CASCADE, primary_key=True, related_name='search_index')
+    city_code = models.CharField(max_length=100, blank=True)  # City.code when known, else normalized city text
+    specialty_ids = models.CharField(max_length=500, blank=True)  # ",1,4,7,", read by the facet counts
+    price_per_hour = models.DecimalField(max_digits=8, decimal_places=2)
+    rating = models.FloatField(default=0.0)
+    experience_years = models.IntegerField(default=0)
+    total_reviews = models.IntegerField(default=0)
+    # Weekly availability, one bit per 15 minutes from Monday 00:00, 48 bits (half a day) per
+    # column: bit n of availability_w<i> is slot 48 * i + n (see services.AvailabilityBitmap)
+    availability_w0 = models.BigIntegerField(default=0)
+    availability_w1 = models.BigIntegerField(default=0)
+    availability_w2 = models.BigIntegerField(default=0)
+    availability_w3 = models.BigIntegerField(default=0)
+    availability_w4 = models.BigIntegerField(default=0)
+    availability_w5 = models.BigIntegerField(default=0)
+    availability_w6 = models.BigIntegerField(default=0)
+    availability_w7 = models.BigIntegerField(default=0)
+    availability_w8 = models.BigIntegerField(default=0)
+    availability_w9 = models.BigIntegerField(default=0)
+    availability_w10 = models.BigIntegerField(default=0)
+    availability_w11 = models.BigIntegerField(default=0)
+    availability_w12 = models.BigIntegerField(default=0)
+    availability_w13 = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'فهرس بحث المدربين'
+        verbose_name_plural = 'فهارس بحث المدربين'
+        indexes = [
+            models.Index(fields=['-rating', 'trainer'], name='tsi_rating'),
+            models.Index(fields=['price_per_hour', 'trainer'], name='tsi_price'),
+            models.Index(fields=['-experience_years', 'trainer'], name='tsi_experience'),
+            models.Index(fields=['city_code', '-rating', 'trainer'], name='tsi_city_rating'),
+            models.Index(fields=['city_code', 'price_per_hour', 'trainer'], name='tsi_city_price'),
+            models.Index(fields=['city_code', '-experience_years', 'trainer'], name='tsi_city_experience'),
+        ]
+    
+    def __str__(self):
+        return f"{self.trainer_id} - {self.city_code}"
 
 
 class TrainerAvailability(models.Model):
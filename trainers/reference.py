@@ -0,0 +1,100 @@
+"""
+Process-local registry for rarely-changing reference data (cities and session types)
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+from types import MappingProxyType
+from django.core.cache import cache
+
+ReferenceSnapshot = namedtuple('ReferenceSnapshot', [
+    'version', 'loaded_at', 'cities', 'cities_by_id', 'cities_by_code', 'session_types', 'session_types_by_id',
+])
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class ReferenceData:
+    """Immutable City/SessionType tables loaded once per process
+
+    Each access compares the local snapshot with a version stamp kept in
+    the default cache; the stamp is bumped by signal handlers whenever a
+    City or SessionType row changes, so every process reloads on its next
+    access instead of querying on every request. The stamp only reaches
+    other processes through a shared backend (REDIS_URL); both the stamp
+    and each snapshot also expire after MAX_AGE, which bounds staleness
+    when the cache is per-process.
+    """
+
+    VERSION_KEY = 'reference_data:version'
+    MAX_AGE = 300  # seconds
+
+    @staticmethod
+    def current_version():
+        version = cache.get(ReferenceData.VERSION_KEY)
+        if version is None:
+            # Evicted or never set: publish one so processes agree from here on
+            cache.add(ReferenceData.VERSION_KEY, uuid.uuid4().hex, ReferenceData.MAX_AGE)
+            version = cache.get(ReferenceData.VERSION_KEY)
+        return version
+
+    @staticmethod
+    def bump():
+        """Invalidate every process's snapshot; call after bulk changes that skip signals"""
+        global _snapshot
+        cache.set(ReferenceData.VERSION_KEY, uuid.uuid4().hex, ReferenceData.MAX_AGE)
+        _snapshot = None
+
+    @staticmethod
+    def load(version):
+        from .models import City, SessionType
+
+        cities = tuple(City.objects.order_by('id'))
+        session_types = tuple(SessionType.objects.order_by('id'))
+        return ReferenceSnapshot(
+            version=version,
+            loaded_at=time.monotonic(),
+            cities=cities,
+            cities_by_id=MappingProxyType({city.id: city for city in cities}),
+            cities_by_code=MappingProxyType({city.code.casefold(): city for city in cities}),
+            session_types=session_types,
+            session_types_by_id=MappingProxyType({st.id: st for st in session_types}),
+        )
+
+    @staticmethod
+    def snapshot():
+        """Current snapshot, reloaded when the version stamp moved or the snapshot is MAX_AGE old"""
+        global _snapshot
+        version = ReferenceData.current_version()
+        snapshot = _snapshot
+        if ReferenceData._is_current(snapshot, version):
+            return snapshot
+        with _lock:
+            if not ReferenceData._is_current(_snapshot, version):
+                _snapshot = ReferenceData.load(version)
+            return _snapshot
+
+    @staticmethod
+    def _is_current(snapshot, version):
+        return (
+            snapshot is not None and snapshot.version == version
+            and time.monotonic() - snapshot.loaded_at < ReferenceData.MAX_AGE
+        )
+
+    @staticmethod
+    def cities():
+        return ReferenceData.snapshot().cities
+
+    @staticmethod
+    def session_types():
+        return ReferenceData.snapshot().session_types
+
+    @staticmethod
+    def city_by_code(code):
+        return ReferenceData.snapshot().cities_by_code.get((code or '').casefold())
+
+    @staticmethod
+    def session_type_choices():
+        return [(st.id, st.name) for st in ReferenceData.session_types()]
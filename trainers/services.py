@@ -0,0 +1,351 @@
+"""
+Trainer search services
+"""
+import hashlib
+import json
+import re
+import uuid
+from collections import Counter
+from datetime import time
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Case, When, Value, CharField, F
+from .models import Trainer, TrainerAvailability, TrainerSearchIndex
+from .reference import ReferenceData
+
+
+class AvailabilityBitmap:
+    """Weekly availability as 672 bits, one per 15-minute slot from Monday 00:00
+
+    The bits are stored in fourteen 48-bit integer columns (half a day each)
+    so availability can be tested with a bitwise AND in SQL.
+    """
+
+    SLOT_MINUTES = 15
+    SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+    WEEK_SLOTS = 7 * SLOTS_PER_DAY
+    WORD_SLOTS = 48  # bits per column; stays clear of the BIGINT sign bit
+    WORD_MASK = (1 << WORD_SLOTS) - 1
+    WORD_FIELDS = tuple(f'availability_w{i}' for i in range(WEEK_SLOTS // WORD_SLOTS))
+
+    @staticmethod
+    def _minutes(value):
+        return value.hour * 60 + value.minute
+
+    @staticmethod
+    def range_mask(day, first_slot, last_slot):
+        """Bits [first_slot, last_slot) of the given weekday"""
+        if last_slot <= first_slot:
+            return 0
+        offset = int(day) * AvailabilityBitmap.SLOTS_PER_DAY + first_slot
+        return ((1 << (last_slot - first_slot)) - 1) << offset
+
+    @staticmethod
+    def _end_minutes(value):
+        """Minutes since midnight for an end time; 00:00 closes the day rather than opening it"""
+        return AvailabilityBitmap._minutes(value) or 24 * 60
+
+    @staticmethod
+    def from_windows(windows):
+        """Bitmap int of the slots fully inside any (day_of_week, start_time, end_time) window"""
+        step = AvailabilityBitmap.SLOT_MINUTES
+        bitmap = 0
+        for day, start, end in windows:
+            first = -(-AvailabilityBitmap._minutes(start) // step)  # round up
+            last = AvailabilityBitmap._end_minutes(end) // step  # round down
+            bitmap |= AvailabilityBitmap.range_mask(day, first, last)
+        return bitmap
+
+    @staticmethod
+    def query_mask(day, start, end):
+        """Slots a trainer must have free to cover [start, end) on a weekday"""
+        step = AvailabilityBitmap.SLOT_MINUTES
+        first = AvailabilityBitmap._minutes(start) // step  # round down
+        last = -(-AvailabilityBitmap._end_minutes(end) // step)  # round up
+        return AvailabilityBitmap.range_mask(day, first, last)
+
+    @staticmethod
+    def to_words(bitmap):
+        """{column name: 48-bit word} for a bitmap int"""
+        return {
+            field: (bitmap >> (i * AvailabilityBitmap.WORD_SLOTS)) & AvailabilityBitmap.WORD_MASK
+            for i, field in enumerate(AvailabilityBitmap.WORD_FIELDS)
+        }
+
+    @staticmethod
+    def from_words(words):
+        """Bitmap int from {column name: word}"""
+        bitmap = 0
+        for i, field in enumerate(AvailabilityBitmap.WORD_FIELDS):
+            bitmap |= (words.get(field) or 0) << (i * AvailabilityBitmap.WORD_SLOTS)
+        return bitmap
+
+
+class TrainerSearchService:
+    """Service for maintaining and querying the TrainerSearchIndex table"""
+
+    SORT_FIELDS = {
+        '-rating': ('-rating', 'trainer_id'),
+        'price_per_hour': ('price_per_hour', 'trainer_id'),
+        '-price_per_hour': ('-price_per_hour', 'trainer_id'),
+        '-experience_years': ('-experience_years', 'trainer_id'),
+    }
+    DEFAULT_SORT = '-rating'
+
+    @staticmethod
+    def normalize_city(value, cities=None):
+        """Map free-text city input to City.code when it names a known city"""
+        text = re.sub(r'\s+', ' ', (value or '').strip()).casefold()
+        if not text:
+            return ''
+        if cities is None:
+            cities = [(city.name, city.code) for city in ReferenceData.cities()]
+        for name, code in cities:
+            if text in (name.casefold(), code.casefold()):
+                return code.casefold()
+        return text[:100]
+
+    @staticmethod
+    def build_entry(trainer, cities=None, specialty_ids=None, availability=None):
+        """Unsaved index row for a trainer (expects user to be loaded or loadable)
+
+        ``availability`` is a list of (day_of_week, start_time, end_time) rows.
+        """
+        if specialty_ids is None:
+            specialty_ids = trainer.specialties.values_list('id', flat=True)
+        if availability is None:
+            availability = trainer.availability_slots.values_list('day_of_week', 'start_time', 'end_time')
+        ids = sorted(specialty_ids)
+        return TrainerSearchIndex(
+            trainer=trainer,
+            city_code=TrainerSearchService.normalize_city(trainer.user.city, cities),
+            specialty_ids=f",{','.join(str(i) for i in ids)}," if ids else '',
+            price_per_hour=trainer.price_per_hour,
+            rating=trainer.rating,
+            experience_years=trainer.experience_years,
+            total_reviews=trainer.total_reviews,
+            **AvailabilityBitmap.to_words(AvailabilityBitmap.from_windows(availability)),
+        )
+
+    @staticmethod
+    def sync_trainer(trainer_id):
+        """Insert, refresh or drop the index row for one trainer"""
+        trainer = Trainer.objects.select_related('user').filter(pk=trainer_id).first()
+        if trainer is None or not trainer.is_approved:
+            if TrainerSearchIndex.objects.filter(trainer_id=trainer_id).delete()[0]:
+                TrainerFacetService.index_changed()
+            return None
+
+        entry = TrainerSearchService.build_entry(trainer)
+        facets = TrainerFacetService.FACET_FIELDS
+        stored = TrainerSearchIndex.objects.filter(trainer=trainer).values_list(*facets).first()
+        TrainerSearchIndex.objects.update_or_create(
+            trainer=trainer,
+            defaults={
+                field: getattr(entry, field)
+                for field in ('city_code', 'specialty_ids', 'price_per_hour', 'rating',
+                              'experience_years', 'total_reviews', *AvailabilityBitmap.WORD_FIELDS)
+            }
+        )
+        if stored != tuple(getattr(entry, field) for field in facets):
+            TrainerFacetService.index_changed()
+        return entry
+
+    @staticmethod
+    def rebuild_all(batch_size=500):
+        """Rebuild the whole index with a fixed number of queries"""
+        cities = [(city.name, city.code) for city in ReferenceData.cities()]
+        trainers = Trainer.objects.filter(is_approved=True).select_related('user')
+
+        specialties = {}
+        through = Trainer.specialties.through.objects.filter(trainer__is_approved=True)
+        for trainer_id, specialty_id in through.values_list('trainer_id', 'sessiontype_id'):
+            specialties.setdefault(trainer_id, []).append(specialty_id)
+
+        availability = {}
+        windows = TrainerAvailability.objects.filter(trainer__is_approved=True).values_list(
+            'trainer_id', 'day_of_week', 'start_time', 'end_time'
+        )
+        for trainer_id, day, start, end in windows:
+            availability.setdefault(trainer_id, []).append((day, start, end))
+
+        entries = [
+            TrainerSearchService.build_entry(
+                trainer, cities, specialties.get(trainer.id, []), availability.get(trainer.id, [])
+            )
+            for trainer in trainers.iterator(chunk_size=batch_size)
+        ]
+        with transaction.atomic():
+            TrainerSearchIndex.objects.all().delete()
+            TrainerSearchIndex.objects.bulk_create(entries, batch_size=batch_size)
+            TrainerFacetService.index_changed()
+        return len(entries)
+
+    @staticmethod
+    def search(city=None, specialty=None, min_price=None, max_price=None, sort=None,
+               day=None, start_time=None, end_time=None):
+        """Filtered, ordered TrainerSearchIndex queryset; invalid filters are ignored
+
+        ``day`` (0 = Monday) with ``start_time``/``end_time`` ("HH:MM") keeps only
+        trainers whose weekly availability covers the whole window.
+        """
+        entries = TrainerSearchIndex.objects.all()
+
+        if city:
+            entries = entries.filter(city_code=TrainerSearchService.normalize_city(city))
+
+        if specialty:
+            try:
+                specialty_id = int(specialty)
+            except (ValueError, TypeError):
+                specialty_id = None
+            if specialty_id is not None:
+                # Served by the sessiontype_id index of the M2M table; LIKE on specialty_ids cannot be
+                trainers = Trainer.specialties.through.objects.filter(sessiontype_id=specialty_id)
+                entries = entries.filter(trainer_id__in=trainers.values('trainer_id'))
+
+        for value, lookup in ((min_price, 'price_per_hour__gte'), (max_price, 'price_per_hour__lte')):
+            if value:
+                try:
+                    entries = entries.filter(**{lookup: float(value)})
+                except (ValueError, TypeError):
+                    pass
+
+        if day not in (None, '') and start_time and end_time:
+            entries = TrainerSearchService.filter_available(entries, day, start_time, end_time)
+
+        return entries.order_by(*TrainerSearchService.ordering_for(sort))
+
+    @staticmethod
+    def filter_available(entries, day, start_time, end_time):
+        """Narrow entries to trainers free for the window: (word & mask) = mask in SQL"""
+        try:
+            day = int(day)
+            start = time.fromisoformat(start_time)
+            end = time.fromisoformat(end_time)
+        except (ValueError, TypeError):
+            return entries
+        if not 0 <= day < 7:
+            return entries
+        mask = AvailabilityBitmap.query_mask(day, start, end)
+        if not mask:
+            return entries
+
+        # A window touches one or two words; the other columns are left out of the query
+        words = {field: word for field, word in AvailabilityBitmap.to_words(mask).items() if word}
+        return entries.alias(
+            **{f'{field}_free': F(field).bitand(word) for field, word in words.items()}
+        ).filter(
+            **{f'{field}_free': word for field, word in words.items()}
+        )
+
+    @staticmethod
+    def ordering_for(sort):
+        """Index ordering for a sort key, always ending with the unique trainer_id"""
+        return TrainerSearchService.SORT_FIELDS.get(sort) or TrainerSearchService.SORT_FIELDS[
+            TrainerSearchService.DEFAULT_SORT
+        ]
+
+
+class TrainerFacetService:
+    """Service for city, specialty and price-bucket counts over the trainer search index
+
+    Counts come from one GROUP BY (city_code, specialty_ids, price bucket)
+    query. City and specialty facets are disjunctive: each one is counted
+    with every filter applied except its own, so the other options stay
+    visible after a selection. Results are cached briefly per filter set,
+    under a version stamp moved whenever an index write changes one of
+    FACET_FIELDS (the grouped columns and those the filters read).
+    """
+
+    PRICE_BUCKETS = (
+        ('0-100', 0, 100),
+        ('100-200', 100, 200),
+        ('200-300', 200, 300),
+        ('300-500', 300, 500),
+        ('500+', 500, None),
+    )
+    CACHE_TTL = 60  # seconds
+    VERSION_KEY = 'trainer_facets:version'
+    FACET_FIELDS = ('city_code', 'specialty_ids', 'price_per_hour', 'rating', *AvailabilityBitmap.WORD_FIELDS)
+
+    @staticmethod
+    def current_version():
+        version = cache.get(TrainerFacetService.VERSION_KEY)
+        if version is None:
+            cache.add(TrainerFacetService.VERSION_KEY, uuid.uuid4().hex, TrainerFacetService.CACHE_TTL)
+            version = cache.get(TrainerFacetService.VERSION_KEY)
+        return version
+
+    @staticmethod
+    def bump():
+        cache.set(TrainerFacetService.VERSION_KEY, uuid.uuid4().hex, TrainerFacetService.CACHE_TTL)
+
+    @staticmethod
+    def index_changed():
+        """Retire cached facets now and again on commit, so a read racing the write cannot re-cache old counts"""
+        TrainerFacetService.bump()
+        transaction.on_commit(TrainerFacetService.bump)
+
+    @staticmethod
+    def _price_bucket():
+        whens = [
+            When(price_per_hour__gte=low, price_per_hour__lt=high, then=Value(key))
+            for key, low, high in TrainerFacetService.PRICE_BUCKETS if high is not None
+        ]
+        return Case(*whens, default=Value(TrainerFacetService.PRICE_BUCKETS[-1][0]), output_field=CharField())
+
+    @staticmethod
+    def get_facets(city=None, specialty=None, min_price=None, max_price=None,
+                   day=None, start_time=None, end_time=None):
+        """Facet counts for the given filters as a JSON-serializable dict"""
+        params = {'city': city or '', 'specialty': specialty or '',
+                  'min_price': min_price or '', 'max_price': max_price or '',
+                  'day': day or '', 'start_time': start_time or '', 'end_time': end_time or ''}
+        cache_key = f'trainer_facets:{TrainerFacetService.current_version()}:' + hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        facets = cache.get(cache_key)
+        if facets is None:
+            facets = TrainerFacetService._compute(city, specialty, min_price, max_price, day, start_time, end_time)
+            cache.set(cache_key, facets, TrainerFacetService.CACHE_TTL)
+        return facets
+
+    @staticmethod
+    def _compute(city, specialty, min_price, max_price, day=None, start_time=None, end_time=None):
+        city_code = TrainerSearchService.normalize_city(city) if city else None
+        try:
+            specialty_id = int(specialty) if specialty else None
+        except (ValueError, TypeError):
+            specialty_id = None
+
+        rows = TrainerSearchService.search(
+            min_price=min_price, max_price=max_price, day=day, start_time=start_time, end_time=end_time
+        ).order_by().annotate(
+            price_bucket=TrainerFacetService._price_bucket()
+        ).values('city_code', 'specialty_ids', 'price_bucket').annotate(count=Count('trainer'))
+
+        cities, specialties, prices = Counter(), Counter(), Counter()
+        total = 0
+        for row in rows:
+            count = row['count']
+            ids = [int(i) for i in row['specialty_ids'].strip(',').split(',') if i]
+            in_city = city_code is None or row['city_code'] == city_code
+            in_specialty = specialty_id is None or specialty_id in ids
+
+            if in_specialty and row['city_code']:
+                cities[row['city_code']] += count
+            if in_city:
+                for i in ids:
+                    specialties[str(i)] += count
+            if in_city and in_specialty:
+                prices[row['price_bucket']] += count
+                total += count
+
+        return {
+            'total': total,
+            'cities': dict(cities),
+            'specialties': dict(specialties),
+            'price_buckets': [
+                {'key': key, 'min': low, 'max': high, 'count': prices.get(key, 0)}
+                for key, low, high in TrainerFacetService.PRICE_BUCKETS
+            ],
+        }
@@ -0,0 +1,65 @@
+"""
+Signal handlers keeping the trainer search index and reference data in sync
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import City, SessionType, Trainer, TrainerAvailability, TrainerSearchIndex
+from .reference import ReferenceData
+from .services import TrainerFacetService, TrainerSearchService
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Trainer)
+def sync_trainer_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    TrainerSearchService.sync_trainer(instance.pk)
+
+
+@receiver(post_delete, sender=Trainer)
+def drop_trainer_facets(sender, instance, **kwargs):
+    """The index row goes with the trainer (CASCADE), without passing through sync_trainer"""
+    if instance.is_approved:
+        TrainerFacetService.index_changed()
+
+
+@receiver(post_save, sender=User)
+def sync_trainer_city(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    """A trainer's city lives on the user row; other user saves (e.g. last_login) are skipped"""
+    if raw or created or instance.user_type != 'trainer':
+        return
+    if update_fields is not None and 'city' not in update_fields:
+        return
+    entry = TrainerSearchIndex.objects.filter(trainer__user=instance).values_list('trainer_id', 'city_code').first()
+    if entry and entry[1] != TrainerSearchService.normalize_city(instance.city):
+        TrainerSearchService.sync_trainer(entry[0])
+
+
+@receiver(m2m_changed, sender=Trainer.specialties.through)
+def sync_trainer_specialties(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        TrainerSearchService.sync_trainer(instance.pk)
+    elif pk_set:
+        for trainer_id in pk_set:
+            TrainerSearchService.sync_trainer(trainer_id)
+
+
+@receiver(post_save, sender=TrainerAvailability)
+@receiver(post_delete, sender=TrainerAvailability)
+def sync_trainer_availability(sender, instance, raw=False, **kwargs):
+    """Recompute the weekly availability bitmap"""
+    if raw:
+        return
+    TrainerSearchService.sync_trainer(instance.trainer_id)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=SessionType)
+@receiver(post_delete, sender=SessionType)
+def bump_reference_data(sender, **kwargs):
+    ReferenceData.bump()
@@ -1,3 +1,313 @@
+from datetime import time, timedelta
+from decimal import Decimal
+import io
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from bookings.models import Booking
+from bookings.services import EarningsService
+from .models import City, SessionType, Trainer, TrainerAvailability, TrainerSearchIndex
+from .reference import ReferenceData
+from .services import AvailabilityBitmap, TrainerFacetService, TrainerSearchService
 
-# Create your tests here.
+User = get_user_model()
+
+
+class TrainerEarningsQueryTests(TestCase):
+    """Query-count benchmarks for the trainer earnings page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer_user = User.objects.create_user(
+            username='coach', password='pass12345', user_type='trainer'
+        )
+        cls.trainer = Trainer.objects.create(user=cls.trainer_user, price_per_hour=Decimal('200'))
+        client = User.objects.create_user(username='client', password='pass12345', user_type='client')
+
+        today = timezone.now().date()
+        for i in range(40):
+            Booking.objects.create(
+                client=client,
+                trainer=cls.trainer,
+                booking_date=today - timedelta(days=i),
+                start_time=time(10, 0),
+                duration_minutes=60,
+                status='completed' if i % 4 else 'cancelled',
+                total_price=Decimal('200'),
+            )
+
+    def test_trainer_stats_single_query(self):
+        with self.assertNumQueries(1):
+            stats = EarningsService.get_trainer_stats(self.trainer)
+        self.assertEqual(stats['total_sessions'], 30)
+        self.assertEqual(stats['total_earnings'], Decimal('6000'))
+
+    def test_monthly_breakdown_single_query(self):
+        with self.assertNumQueries(1):
+            monthly_data = EarningsService.get_monthly_breakdown(self.trainer, months=6)
+        self.assertEqual(len(monthly_data), 6)
+        self.assertEqual(sum(m['sessions'] for m in monthly_data), 30)
+
+    def test_earnings_page_query_count(self):
+        self.client.force_login(self.trainer_user)
+        # session + user + trainer + stats + monthly breakdown
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('trainer_earnings'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_sessions'], 30)
+
+
+class TrainerMyClientsQueryTests(TestCase):
+    """The clients page cost must not grow with the number of clients"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer_user = User.objects.create_user(
+            username='coach', password='pass12345', user_type='trainer'
+        )
+        cls.trainer = Trainer.objects.create(user=cls.trainer_user, price_per_hour=Decimal('200'))
+
+        today = timezone.now().date()
+        for i in range(30):
+            client = User.objects.create(username=f'client{i}', user_type='client')
+            for j in range(2):
+                Booking.objects.create(
+                    client=client,
+                    trainer=cls.trainer,
+                    booking_date=today - timedelta(days=i),
+                    start_time=time(8 + j, 0),
+                    duration_minutes=60,
+                    status='completed' if j else 'pending',
+                    total_price=Decimal('200'),
+                )
+
+    def test_my_clients_query_count(self):
+        self.client.force_login(self.trainer_user)
+        # session + user + trainer + page count + grouped page + users on page
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('trainer_my_clients'))
+        client_data = response.context['client_data']
+        self.assertEqual(len(client_data), 24)
+        self.assertEqual(client_data[0]['user'].username, 'client0')
+        self.assertEqual(client_data[0]['total_bookings'], 2)
+        self.assertEqual(client_data[0]['completed_sessions'], 1)
+
+
+class ReferenceDataTests(TestCase):
+    """The process-local snapshot reloads only when the shared version stamp moves or it ages out"""
+
+    def setUp(self):
+        cache.clear()
+        ReferenceData.bump()
+        City.objects.create(name='Rabat', code='RBA')
+
+    def test_snapshot_reused_without_queries(self):
+        self.assertEqual([city.code for city in ReferenceData.cities()], ['RBA'])
+        with self.assertNumQueries(0):
+            ReferenceData.cities()
+            ReferenceData.city_by_code('rba')
+
+    def test_city_save_and_delete_invalidate(self):
+        ReferenceData.cities()
+        casa = City.objects.create(name='Casablanca', code='CAS')
+        self.assertEqual(ReferenceData.city_by_code('cas'), casa)
+        casa.delete()
+        self.assertIsNone(ReferenceData.city_by_code('cas'))
+
+    def test_stamp_moved_by_another_process_reloads(self):
+        ReferenceData.cities()
+        # Another worker's signal only touches the shared stamp, not this process's snapshot
+        City.objects.bulk_create([City(name='Fes', code='FES')])
+        cache.set(ReferenceData.VERSION_KEY, 'bumped-elsewhere', ReferenceData.MAX_AGE)
+        self.assertIsNotNone(ReferenceData.city_by_code('fes'))
+
+    def test_evicted_stamp_reloads(self):
+        ReferenceData.cities()
+        City.objects.bulk_create([City(name='Fes', code='FES')])
+        cache.delete(ReferenceData.VERSION_KEY)
+        self.assertIsNotNone(ReferenceData.city_by_code('fes'))
+
+    def test_snapshot_expires_after_max_age(self):
+        ReferenceData.cities()
+        City.objects.bulk_create([City(name='Fes', code='FES')])
+        later = ReferenceData.snapshot().loaded_at + ReferenceData.MAX_AGE + 1
+        with mock.patch('trainers.reference.time.monotonic', return_value=later):
+            self.assertIsNotNone(ReferenceData.city_by_code('fes'))
+
+
+class TrainerAvailabilitySearchTests(TestCase):
+    """Availability filtering runs as a bitwise AND on the index words, in SQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.morning = cls.make_trainer('morning', [('0', time(9, 0), time(12, 0))])
+        # Spans the noon boundary between the two words of Monday
+        cls.midday = cls.make_trainer('midday', [('0', time(11, 45), time(13, 0))])
+        cls.sunday = cls.make_trainer('sunday', [('6', time(20, 0), time(23, 45))])
+
+    @staticmethod
+    def make_trainer(username, windows):
+        user = User.objects.create_user(username=username, password='pass12345', user_type='trainer')
+        trainer = Trainer.objects.create(user=user, price_per_hour=Decimal('200'), is_approved=True)
+        for day, start, end in windows:
+            TrainerAvailability.objects.create(trainer=trainer, day_of_week=day, start_time=start, end_time=end)
+        return trainer
+
+    def search(self, day, start, end):
+        return set(TrainerSearchService.search(day=day, start_time=start, end_time=end).values_list(
+            'trainer_id', flat=True
+        ))
+
+    def test_words_round_trip(self):
+        bitmap = AvailabilityBitmap.from_windows([('0', time(11, 45), time(13, 0)), ('6', time(23, 0), time(0, 0))])
+        words = AvailabilityBitmap.to_words(bitmap)
+        self.assertEqual(len(words), 14)
+        self.assertTrue(all(0 <= word <= AvailabilityBitmap.WORD_MASK for word in words.values()))
+        self.assertEqual(AvailabilityBitmap.from_words(words), bitmap)
+
+    def test_window_filter(self):
+        self.assertEqual(self.search(0, '09:30', '11:00'), {self.morning.id})
+        self.assertEqual(self.search(0, '11:45', '12:00'), {self.morning.id, self.midday.id})
+        self.assertEqual(self.search(0, '11:50', '12:30'), {self.midday.id})
+        self.assertEqual(self.search(0, '08:45', '10:00'), set())
+        self.assertEqual(self.search(6, '22:00', '23:30'), {self.sunday.id})
+        self.assertEqual(self.search(1, '10:00', '11:00'), set())
+
+    def test_window_ending_at_midnight(self):
+        late = self.make_trainer('late', [('4', time(22, 0), time(0, 0))])
+        self.assertEqual(self.search(4, '23:00', '00:00'), {late.id})
+        self.assertEqual(self.search(4, '22:00', '23:45'), {late.id})
+        self.assertEqual(AvailabilityBitmap.from_windows([('4', time(22, 0), time(0, 0))]),
+                         AvailabilityBitmap.query_mask(4, time(22, 0), time(0, 0)))
+
+    def test_filter_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.search(0, '11:50', '12:30')
+
+    def test_rebuild_matches_signals(self):
+        before = self.search(0, '11:45', '12:00')
+        TrainerSearchService.rebuild_all()
+        self.assertEqual(self.search(0, '11:45', '12:00'), before)
+
+
+class TrainerFacetCacheTests(TestCase):
+    """Cached facet counts are retired by every write to the search index"""
+
+    def setUp(self):
+        cache.clear()
+        self.trainer = self.make_trainer('coach1', '150')
+
+    @staticmethod
+    def make_trainer(username, price):
+        user = User.objects.create_user(username=username, password='pass12345', user_type='trainer', city='Rabat')
+        return Trainer.objects.create(user=user, price_per_hour=Decimal(price), is_approved=True)
+
+    def buckets(self):
+        return {bucket['key']: bucket['count'] for bucket in TrainerFacetService.get_facets()['price_buckets']}
+
+    def test_cached_between_writes(self):
+        self.assertEqual(TrainerFacetService.get_facets()['total'], 1)
+        with self.assertNumQueries(0):
+            TrainerFacetService.get_facets()
+
+    def test_trainer_changes_invalidate(self):
+        self.assertEqual(self.buckets()['100-200'], 1)
+        self.trainer.price_per_hour = Decimal('350')
+        self.trainer.save()
+        self.assertEqual(self.buckets()['300-500'], 1)
+
+        other = self.make_trainer('coach2', '80')
+        self.assertEqual(TrainerFacetService.get_facets()['total'], 2)
+        other.delete()
+        self.assertEqual(TrainerFacetService.get_facets()['total'], 1)
+        self.trainer.is_approved = False
+        self.trainer.save()
+        self.assertEqual(TrainerFacetService.get_facets()['total'], 0)
+
+    def test_saves_not_touching_facets_keep_the_cache(self):
+        version = TrainerFacetService.current_version()
+        self.trainer.bio = 'Updated bio'
+        self.trainer.save()
+        self.assertEqual(TrainerFacetService.current_version(), version)
+        self.trainer.price_per_hour = Decimal('160')
+        self.trainer.save()
+        self.assertNotEqual(TrainerFacetService.current_version(), version)
+
+    def test_rebuild_invalidates(self):
+        self.assertEqual(self.buckets()['100-200'], 1)
+        Trainer.objects.filter(pk=self.trainer.pk).update(price_per_hour=Decimal('600'))  # skips signals
+        self.assertEqual(self.buckets()['100-200'], 1)
+        TrainerSearchService.rebuild_all()
+        self.assertEqual(self.buckets()['500+'], 1)
+
+
+class TrainerSearchIndexTests(TestCase):
+    """Index rows follow trainer, user and specialty changes and can be rebuilt wholesale"""
+
+    def setUp(self):
+        cache.clear()
+        ReferenceData.bump()
+        City.objects.create(name='Casablanca', code='CAS')
+        self.yoga = SessionType.objects.create(name='Yoga')
+        self.boxing = SessionType.objects.create(name='Boxing')
+        self.trainers = []
+        for i, (city, price) in enumerate((('  casablanca ', '150'), ('CAS', '300'), ('Fès', '200'))):
+            user = User.objects.create_user(username=f'coach{i}', password='pass12345', user_type='trainer', city=city)
+            self.trainers.append(Trainer.objects.create(user=user, price_per_hour=Decimal(price), is_approved=True))
+        self.trainers[0].specialties.add(self.yoga)
+        self.trainers[1].specialties.add(self.yoga, self.boxing)
+
+    def ids(self, **filters):
+        return list(TrainerSearchService.search(**filters).values_list('trainer_id', flat=True))
+
+    def test_city_specialty_and_price_filters(self):
+        self.assertEqual(self.ids(city='Casablanca', sort='price_per_hour'), [self.trainers[0].id, self.trainers[1].id])
+        self.assertEqual(self.ids(city='fès'), [self.trainers[2].id])
+        self.assertEqual(self.ids(specialty=self.boxing.id), [self.trainers[1].id])
+        self.assertEqual(self.ids(min_price='180', max_price='250'), [self.trainers[2].id])
+        self.assertEqual(len(self.ids(specialty='not-a-number', min_price='abc')), 3)
+
+    def test_signals_keep_rows_current(self):
+        user = self.trainers[2].user
+        user.city = 'casablanca'
+        user.save()
+        self.trainers[2].specialties.add(self.boxing)
+        self.assertEqual(set(self.ids(city='CAS', specialty=self.boxing.id)), {self.trainers[1].id, self.trainers[2].id})
+
+        self.trainers[1].is_approved = False
+        self.trainers[1].save()
+        self.assertEqual(self.ids(specialty=self.boxing.id), [self.trainers[2].id])
+
+    def test_user_saves_without_city_change_skip_the_index(self):
+        user = self.trainers[0].user
+        with mock.patch.object(TrainerSearchService, 'sync_trainer') as sync:
+            user.last_login = timezone.now()
+            user.save(update_fields=['last_login'])
+            user.first_name = 'Sara'
+            user.save()
+            user.city = 'Casablanca'  # normalizes to the indexed code
+            user.save()
+            self.assertFalse(sync.called)
+            user.city = 'Rabat'
+            user.save(update_fields=['city'])
+            sync.assert_called_once_with(self.trainers[0].id)
+
+    def test_rebuild_command(self):
+        expected = sorted(TrainerSearchIndex.objects.values_list('trainer_id', 'city_code', 'specialty_ids'))
+        TrainerSearchIndex.objects.all().delete()
+        Trainer.objects.filter(pk=self.trainers[2].pk).update(is_approved=False)  # skips the signals
+
+        out = io.StringIO()
+        call_command('rebuild_trainer_search_index', stdout=out)
+        self.assertIn('2', out.getvalue())
+        self.assertEqual(sorted(TrainerSearchIndex.objects.values_list('trainer_id', 'city_code', 'specialty_ids')),
+                         expected[:2])
+
+    def test_trainer_list_view(self):
+        response = self.client.get(reverse('trainers'), {'city': 'Casablanca', 'sort': '-price_per_hour'})
+        self.assertEqual([trainer.id for trainer in response.context['trainers']],
+                         [self.trainers[1].id, self.trainers[0].id])
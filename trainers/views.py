@@ -1,13 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.generic import UpdateView
 from django.urls import reverse_lazy
-from django.db.models import Sum, Q, Count
-from django.utils import timezone
-from datetime import timedelta
+from django.db.models import Q, Count, Max
+from django.core.paginator import Paginator
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from .models import Trainer, TrainerAvailability, Certificate
 from .forms import TrainerProfileUpdateForm, TrainerAvailabilityForm, CertificateForm
-from bookings.models import Booking, Review
+from bookings.models import Booking
+from bookings.services import EarningsService, BookingStatusService, BookingConflictService
+from core.pagination import KeysetPaginator
+
+User = get_user_model()
 
 
 @login_required
@@ -75,30 +81,43 @@ def trainer_my_clients(request):
     
     trainer = get_object_or_404(Trainer, user=request.user)
     
-    # Get unique clients who booked sessions
-    clients = set()
-    bookings = Booking.objects.filter(trainer=trainer).select_related('client')
-    
-    for booking in bookings:
-        clients.add(booking.client)
-    
-    clients = list(clients)
-    
-    # Get client details with booking counts
-    client_data = []
-    for client in clients:
-        booking_count = Booking.objects.filter(trainer=trainer, client=client).count()
-        completed_count = Booking.objects.filter(trainer=trainer, client=client, status='completed').count()
-        
-        client_data.append({
-            'user': client,
-            'total_bookings': booking_count,
-            'completed_sessions': completed_count,
-        })
+    # One grouped query for per-client counts, sorted by most recent session
+    sort_options = {
+        'recent': ('-last_session', 'client'),
+        'completed': ('-completed_sessions', '-last_session', 'client'),
+        'total': ('-total_bookings', '-last_session', 'client'),
+    }
+    sort_by = request.GET.get('sort', 'recent')
+    if sort_by not in sort_options:
+        sort_by = 'recent'
+    
+    summaries = Booking.objects.filter(trainer=trainer).values('client').annotate(
+        total_bookings=Count('id'),
+        completed_sessions=Count('id', filter=Q(status='completed')),
+        last_session=Max('booking_date'),
+    ).order_by(*sort_options[sort_by])
+    
+    paginator = Paginator(summaries, 24)
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+    
+    # One query for the users on this page
+    users = User.objects.in_bulk([row['client'] for row in page_obj])
+    client_data = [
+        {
+            'user': users[row['client']],
+            'total_bookings': row['total_bookings'],
+            'completed_sessions': row['completed_sessions'],
+            'last_session': row['last_session'],
+        }
+        for row in page_obj if row['client'] in users
+    ]
     
     return render(request, 'trainer_my_clients.html', {
         'trainer': trainer,
-        'client_data': sorted(client_data, key=lambda x: x['completed_sessions'], reverse=True)
+        'client_data': client_data,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'sort_by': sort_by,
     })
 
 
@@ -110,74 +129,18 @@ def trainer_earnings(request):
     
     trainer = get_object_or_404(Trainer, user=request.user)
     
-    # Total earnings
-    total_earnings = Booking.objects.filter(
-        trainer=trainer,
-        status='completed'
-    ).aggregate(total=Sum('total_price'))['total'] or 0
-    
-    # Monthly earnings
-    thirty_days_ago = timezone.now().date() - timedelta(days=30)
-    monthly_earnings = Booking.objects.filter(
-        trainer=trainer,
-        status='completed',
-        updated_at__date__gte=thirty_days_ago
-    ).aggregate(total=Sum('total_price'))['total'] or 0
-    
-    # Weekly earnings
-    seven_days_ago = timezone.now().date() - timedelta(days=7)
-    weekly_earnings = Booking.objects.filter(
-        trainer=trainer,
-        status='completed',
-        updated_at__date__gte=seven_days_ago
-    ).aggregate(total=Sum('total_price'))['total'] or 0
-    
-    # Sessions count
-    total_sessions = Booking.objects.filter(trainer=trainer, status='completed').count()
-    monthly_sessions = Booking.objects.filter(
-        trainer=trainer,
-        status='completed',
-        updated_at__date__gte=thirty_days_ago
-    ).count()
-    
-    # Average rating
-    reviews = Review.objects.filter(trainer=trainer)
-    avg_rating = reviews.aggregate(avg=Sum('rating') / Count('id'))['avg'] or 0 if reviews.exists() else 0
-    
-    # Monthly breakdown (last 6 months)
-    monthly_data = []
-    for i in range(5, -1, -1):
-        month_start = timezone.now().date() - timedelta(days=30*i+30)
-        month_end = timezone.now().date() - timedelta(days=30*i)
-        
-        month_earnings = Booking.objects.filter(
-            trainer=trainer,
-            status='completed',
-            updated_at__date__gte=month_start,
-            updated_at__date__lte=month_end
-        ).aggregate(total=Sum('total_price'))['total'] or 0
-        
-        month_sessions = Booking.objects.filter(
-            trainer=trainer,
-            status='completed',
-            updated_at__date__gte=month_start,
-            updated_at__date__lte=month_end
-        ).count()
-        
-        monthly_data.append({
-            'month': month_end.strftime('%B'),
-            'earnings': float(month_earnings),
-            'sessions': month_sessions,
-        })
+    # Headline figures and the monthly breakdown in two grouped queries
+    stats = EarningsService.get_trainer_stats(trainer)
+    monthly_data = EarningsService.get_monthly_breakdown(trainer, months=6)
     
     return render(request, 'trainer_earnings.html', {
         'trainer': trainer,
-        'total_earnings': float(total_earnings),
-        'monthly_earnings': float(monthly_earnings),
-        'weekly_earnings': float(weekly_earnings),
-        'total_sessions': total_sessions,
-        'monthly_sessions': monthly_sessions,
-        'avg_rating': round(avg_rating, 1),
+        'total_earnings': float(stats['total_earnings']),
+        'monthly_earnings': float(stats['monthly_earnings']),
+        'weekly_earnings': float(stats['weekly_earnings']),
+        'total_sessions': stats['total_sessions'],
+        'monthly_sessions': stats['monthly_sessions'],
+        'avg_rating': round(trainer.rating, 1),
         'monthly_data': monthly_data,
     })
 
@@ -193,31 +156,36 @@ def trainer_bookings(request):
     # Filter by status
     status_filter = request.GET.get('status', 'all')
     
-    if status_filter == 'pending':
-        bookings = Booking.objects.filter(trainer=trainer, status='pending').order_by('booking_date')
-    elif status_filter == 'confirmed':
-        bookings = Booking.objects.filter(trainer=trainer, status='confirmed').order_by('booking_date')
-    elif status_filter == 'completed':
-        bookings = Booking.objects.filter(trainer=trainer, status='completed').order_by('-updated_at')
-    elif status_filter == 'cancelled':
-        bookings = Booking.objects.filter(trainer=trainer, status='cancelled').order_by('-updated_at')
+    orderings = {
+        'pending': ('booking_date', 'id'),
+        'confirmed': ('booking_date', 'id'),
+        'completed': ('-updated_at', '-id'),
+        'cancelled': ('-updated_at', '-id'),
+    }
+    
+    bookings = Booking.objects.filter(trainer=trainer).select_related('client')
+    if status_filter in orderings:
+        bookings = bookings.filter(status=status_filter)
+        ordering = orderings[status_filter]
     else:
-        bookings = Booking.objects.filter(trainer=trainer).order_by('-created_at')
+        status_filter = 'all'
+        ordering = ('-created_at', '-id')
+    
+    # Keyset pagination so deep history never renders in full
+    page = KeysetPaginator(bookings, ordering, per_page=20).get_page(request.GET.get('cursor'))
     
-    # Statistics
-    pending_count = Booking.objects.filter(trainer=trainer, status='pending').count()
-    confirmed_count = Booking.objects.filter(trainer=trainer, status='confirmed').count()
-    completed_count = Booking.objects.filter(trainer=trainer, status='completed').count()
-    cancelled_count = Booking.objects.filter(trainer=trainer, status='cancelled').count()
+    # Statistics (single GROUP BY status)
+    status_counts = BookingStatusService.get_status_counts(trainer)
     
     return render(request, 'trainer_bookings.html', {
         'trainer': trainer,
-        'bookings': bookings,
+        'bookings': page,
+        'next_cursor': page.next_cursor,
         'status_filter': status_filter,
-        'pending_count': pending_count,
-        'confirmed_count': confirmed_count,
-        'completed_count': completed_count,
-        'cancelled_count': cancelled_count,
+        'pending_count': status_counts['pending'],
+        'confirmed_count': status_counts['confirmed'],
+        'completed_count': status_counts['completed'],
+        'cancelled_count': status_counts['cancelled'],
     })
 
 
@@ -231,7 +199,17 @@ def update_booking_status(request, booking_id):
     new_status = request.POST.get('status')
     
     if new_status in ['pending', 'confirmed', 'completed', 'cancelled']:
-        booking.status = new_status
-        booking.save()
+        with transaction.atomic():
+            if booking.status == 'cancelled' and new_status != 'cancelled':
+                # Reviving a cancelled booking must not collide with one made in its slot since
+                BookingConflictService.lock_trainer(booking.trainer_id)
+                if BookingConflictService.find_conflicts(
+                    booking.trainer_id, booking.booking_date, booking.start_time,
+                    booking.duration_minutes, exclude_id=booking.id
+                ):
+                    messages.error(request, 'لا يمكن إعادة تفعيل الحجز لأن الوقت محجوز لعميل آخر')
+                    return redirect('trainer_bookings')
+            booking.status = new_status
+            booking.save()
     
     return redirect('trainer_bookings')